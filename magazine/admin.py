@@ -1,5 +1,9 @@
+import operator
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.db.models import Q
 from magazine.models import Author, Article, Issue, BookReview
+from magazine.search import objects_with_prefix, tokenize
 from tinymce.widgets import TinyMCE
 from sorl.thumbnail.admin import AdminImageMixin
 
@@ -8,6 +12,7 @@ class AuthorAdmin(admin.ModelAdmin):
     list_display = ('surname_forename', 'get_num_articles', 'indexable',)
     search_fields = ('forename', 'surname',)
     list_filter = ('indexable',)
+    exclude = ('num_articles', 'num_book_reviews',)
     actions = ['make_nonindexable', 'make_indexable', ]
 
     def make_nonindexable(modeladmin, request, queryset):
@@ -22,12 +27,66 @@ class AuthorAdmin(admin.ModelAdmin):
 admin.site.register(Author, AuthorAdmin)
 
 
-class ArticleAdmin(AdminImageMixin, admin.ModelAdmin):
-    list_display = ('title', 'admin_thumbnail', 'hits', 'issue', 'updated',)
-    search_fields = ('title', 'subheading', 'description', 'text',)
+class IndexedSearchChangeList(ChangeList):
+    """
+    A changelist which searches with its ``ModelAdmin``'s
+    ``get_search_results``, for versions of Django without that hook.
+    """
+    def get_query_set(self, request):
+        search_fields, self.search_fields = self.search_fields, ()
+
+        try:
+            qs = super(IndexedSearchChangeList, self).get_query_set(request)
+        finally:
+            self.search_fields = search_fields
+
+        if self.query:
+            qs, use_distinct = self.model_admin.get_search_results(
+                request, qs, self.query)
+
+            if use_distinct:
+                qs = qs.distinct()
+
+        return qs
+
+
+class IndexedSearchMixin(object):
+    """
+    Searches articles or book reviews using the search index, rather
+    than scanning their text.
+
+    Each word searched for must either be found in one of the (short)
+    ``search_fields``, as usual, or be the start of a word in the search
+    index, which covers the text as well.
+    """
+    def get_search_results(self, request, queryset, search_term):
+        for bit in search_term.split():
+            or_queries = [Q(**{field + '__icontains': bit})
+                          for field in self.search_fields]
+
+            terms = tokenize(bit)
+            if terms:
+                or_queries.append(reduce(operator.and_, [
+                    Q(pk__in=objects_with_prefix(self.model, term))
+                    for term in terms]))
+
+            queryset = queryset.filter(reduce(operator.or_, or_queries))
+
+        return queryset, False
+
+    if not hasattr(admin.ModelAdmin, 'get_search_results'):
+        def get_changelist(self, request, **kwargs):
+            return IndexedSearchChangeList
+
+
+class ArticleAdmin(AdminImageMixin, IndexedSearchMixin, admin.ModelAdmin):
+    list_display = ('title', 'admin_thumbnail', 'get_hits', 'issue',
+                    'updated',)
+    search_fields = ('title', 'subheading',)
     readonly_fields = ('hits',)
     filter_horizontal = ('authors',)
-    exclude = ('cleaned_text',)
+    exclude = ('cleaned_text', 'text_hash', 'sanitization_pending',
+               'demoted_cleaned_text', 'teaser_text',)
     ordering = ('issue',)
 
     def formfield_for_dbfield(self, db_field, **kwargs):
@@ -42,17 +101,21 @@ admin.site.register(Article, ArticleAdmin)
 
 
 class IssueAdmin(admin.ModelAdmin):
-    list_display = ('number', 'month_year', 'published',)
+    list_display = ('number', 'month_year', 'published', 'num_articles',
+                    'num_book_reviews',)
     list_filter = ('published',)
+    exclude = ('num_articles', 'num_book_reviews',)
 admin.site.register(Issue, IssueAdmin)
 
 
-class BookReviewAdmin(admin.ModelAdmin):
-    list_display = ('title', 'hits', 'issue', 'book_author', 'updated',)
-    search_fields = ('title', 'book_author', 'text',)
+class BookReviewAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    list_display = ('title', 'get_hits', 'issue', 'book_author',
+                    'updated',)
+    search_fields = ('title', 'book_author',)
     readonly_fields = ('hits',)
     filter_horizontal = ('authors',)
-    exclude = ('cleaned_text',)
+    exclude = ('cleaned_text', 'text_hash', 'sanitization_pending',
+               'demoted_cleaned_text', 'teaser_text',)
     ordering = ('issue',)
 
     def formfield_for_dbfield(self, db_field, **kwargs):
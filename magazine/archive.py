@@ -0,0 +1,106 @@
+"""
+The issue archive, grouped by year.
+
+The archive lists every issue, newest first, under the year it was
+published in, and is paginated by year. Each year's issues are cached
+separately, under a cache key including a version token for that year,
+which is replaced when one of its issues is saved or deleted, or has an
+article or book review added or removed. Changing one issue only means
+fetching its year again.
+
+Cache keys also include today's date, since issues are published (and
+their embargoes end) at the start of a day.
+"""
+from datetime import date
+from django.core.cache import cache
+from magazine.models import Issue
+from magazine.utils.cache_versions import (VERSION_TIMEOUT, bump_versions,
+                                           get_versions)
+from magazine.utils.dates import seconds_until_midnight
+
+
+def __get_version_key(year):
+    return u'magazine_archive_version_{0}'.format(year)
+
+
+def get_issues(include_unpublished=False):
+    if include_unpublished:
+        return Issue.objects.all()
+
+    return Issue.published_objects.all()
+
+
+def get_archive_years(include_unpublished=False):
+    """
+    Returns the years with issues in them, newest first.
+    """
+    return [day.year for day in
+            get_issues(include_unpublished).dates('issue_date', 'year',
+                                                  order='DESC')]
+
+
+def get_archive(years, include_unpublished=False):
+    """
+    Returns a list of ``(year, issues)`` tuples for each of ``years``,
+    with each year's issues (annotated with their embargo status) newest
+    first, from the cache if possible.
+    """
+    today = date.today()
+    versions = get_versions([__get_version_key(year) for year in years])
+    keys = dict((year, u'magazine_archive_{0}_{1}_{2}_{3}'.format(
+        versions[__get_version_key(year)], year, int(include_unpublished),
+        today.isoformat())) for year in years)
+    cached = cache.get_many(keys.values())
+    to_cache = {}
+    archive = []
+
+    for year in years:
+        issues = cached.get(keys[year])
+
+        if issues is None:
+            issues = list(get_issues(include_unpublished)
+                          .with_embargo_status(today)
+                          .filter(issue_date__year=year))
+            to_cache[keys[year]] = issues
+
+        archive.append((year, issues))
+
+    if to_cache:
+        cache.set_many(to_cache, min(seconds_until_midnight(),
+                                     VERSION_TIMEOUT))
+
+    return archive
+
+
+def invalidate_archive_years(years):
+    bump_versions([__get_version_key(year) for year in set(years)])
+
+
+def invalidate_archive_for_issues(issue_pks=None):
+    """
+    Invalidates the cached years containing the issues with primary keys
+    ``issue_pks`` (or every year).
+    """
+    issues = Issue._base_manager.all()
+
+    if issue_pks is not None:
+        if not issue_pks:
+            return
+        issues = issues.filter(pk__in=list(issue_pks))
+
+    invalidate_archive_years(day.year for day in
+                             issues.dates('issue_date', 'year'))
+
+
+def invalidate_archive_for_issue_change(sender, instance, **kwargs):
+    years = set([instance.issue_date.year])
+
+    # An issue's articles are deleted before the issue itself, so
+    # invalidate_archive_for_issues can't find the year of a deleted
+    # issue - and when an issue moves year, the year it moved from
+    # needs invalidating too.
+    previous = getattr(instance, '_magazine_saved_issue_date', None)
+    if previous is not None:
+        years.add(previous.year)
+
+    invalidate_archive_years(years)
@@ -0,0 +1,78 @@
+"""
+Summaries of what each author has published, for their author page.
+
+An author's page shows how many articles and book reviews they have in
+published issues, and the most recent few of each. Working that out
+takes four queries joining on issues, so the counts and the most recent
+articles and book reviews themselves (without their text) are cached
+for each author instead.
+
+Cached summaries are never stale: their cache keys include a version
+token, which is replaced whenever an article, book review or issue is
+saved or deleted, or an article's or book review's authors change; and
+today's date, since issues are published at the start of their issue
+date. The version is kept in the summary too, so that author pages can
+use it in their ``ETag`` without any queries.
+"""
+from datetime import date
+from django.core.cache import cache
+from magazine.utils.cache_versions import bump_version, get_version
+from magazine.utils.dates import seconds_until_midnight
+
+
+GENERATION_KEY = 'magazine_author_summary_generation'
+
+# How many of the most recent articles and book reviews to include.
+SUMMARY_ARTICLES = 4
+SUMMARY_BOOK_REVIEWS = 10
+
+
+def build_author_summary(author, today=None):
+    """
+    Returns a dictionary of the number of articles and book reviews by
+    ``author`` in published issues, and the most recent ones (with their
+    issues, but not their text).
+    """
+    if today is None:
+        today = date.today()
+
+    summary = {}
+
+    for name, queryset, limit in (
+            ('articles', author.article_set, SUMMARY_ARTICLES),
+            ('book_reviews', author.bookreview_set, SUMMARY_BOOK_REVIEWS)):
+        queryset = queryset.for_listing()\
+            .filter(issue__published=True, issue__issue_date__lte=today)\
+            .order_by('issue')
+
+        summary['num_' + name] = queryset.count()
+        summary[name] = list(queryset[:limit])
+
+    return summary
+
+
+def get_author_summary(author):
+    """
+    Returns ``build_author_summary(author)``, from the cache if
+    possible.
+    """
+    today = date.today()
+    version = get_version(GENERATION_KEY)
+    key = u'magazine_author_summary_{0}_{1}_{2}'.format(
+        version, author.pk, today.isoformat())
+    summary = cache.get(key)
+
+    if summary is None:
+        summary = build_author_summary(author, today)
+        summary['version'] = version
+        cache.set(key, summary, seconds_until_midnight())
+
+    return summary
+
+
+def invalidate_author_summaries(sender, **kwargs):
+    # m2m_changed is sent before and after each change.
+    if kwargs.get('action', '').startswith('pre_'):
+        return
+
+    bump_version(GENERATION_KEY)
@@ -0,0 +1,244 @@
+"""
+Benchmarks for the HTML sanitizer.
+
+Each benchmark runs one text-processing function over a synthetic
+document which looks like HTML saved from Microsoft Word (big
+``<style>`` blocks, ``mso-`` styles everywhere, deeply nested
+``<span>`` elements, conditional comments, lists and tables), and
+measures its throughput and peak memory use. Run them with the
+``magazine_benchmark_sanitizer`` management command.
+
+Every measurement runs in a fresh process, which generates its own
+document, so that peak memory use isn't hidden by earlier
+measurements.
+"""
+import multiprocessing
+import random
+import sys
+import time
+import bleach
+from magazine.models import Article
+from magazine.utils.lru import LRUCache
+from magazine.utils.style_stripper import strip_styles
+from magazine.utils.word_cleaner import (allowed_attributes, allowed_tags,
+                                         clean_word_text_uncached, hash_text)
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+WORDS = (u'lorem ipsum dolor sit amet consectetur adipiscing elit sed do '
+         u'eiusmod tempor incididunt ut labore et dolore magna aliqua '
+         u'caf\xe9 \u201cquoted\u201d na\xefve &amp; &nbsp;').split()
+
+FONTS = (u'Calibri', u'Times New Roman', u'Arial', u'Symbol', u'Cambria')
+
+
+def __sentence(rng, num_words):
+    return u' '.join(rng.choice(WORDS) for i in xrange(num_words))
+
+
+def __mso_style(rng):
+    return u';'.join([
+        u'mso-bidi-font-family:"{0}"'.format(rng.choice(FONTS)),
+        u'font-size:{0}.0pt'.format(rng.randint(8, 14)),
+        u'mso-ansi-language:EN-GB',
+        u'mso-fareast-font-family:"{0}"'.format(rng.choice(FONTS)),
+        u'mso-bidi-theme-font:minor-bidi',
+    ])
+
+
+def __style_block(rng, num_rules):
+    rules = []
+
+    for i in xrange(num_rules):
+        rules.append(u'p.MsoStyle{0}, li.MsoStyle{0}, div.MsoStyle{0}\n'
+                     u'\t{{mso-style-priority:{1};\n\tmso-style-unhide:no;'
+                     u'\n\tmargin:0cm;\n\t{2};}}'.format(i, rng.randint(1, 99),
+                                                         __mso_style(rng)))
+
+    return u'<style>\n<!--\n{0}\n-->\n</style>'.format(u'\n'.join(rules))
+
+
+def __nested_spans(rng, text, depth):
+    for i in xrange(depth):
+        text = u'<span style=\'{0}\'>{1}</span>'.format(__mso_style(rng),
+                                                        text)
+    return text
+
+
+def __paragraph(rng):
+    kind = rng.randint(0, 9)
+
+    if kind == 0:
+        level = rng.randint(1, 3)
+        return u'<h{0}><a name="_Toc{1}"></a>{2}</h{0}>'.format(
+            level, rng.randint(1000, 9999), __sentence(rng, 5))
+
+    if kind == 1:
+        return (u'<p class=MsoListParagraphCxSpMiddle style="text-indent:'
+                u'-18.0pt;mso-list:l0 level1 lfo1"><![if !supportLists]>'
+                u'<span style=\'font-family:Symbol\'>\xb7<span style=\'font:'
+                u'7.0pt "Times New Roman"\'>&nbsp;&nbsp;&nbsp; </span></span>'
+                u'<![endif]>{0}<o:p></o:p></p>'.format(__sentence(rng, 12)))
+
+    if kind == 2:
+        cells = u''.join(
+            u'<td width=307 valign=top style=\'border:solid windowtext '
+            u'1.0pt;mso-border-alt:solid windowtext .5pt\'><p class=MsoNormal>'
+            u'{0}<o:p></o:p></p></td>'.format(__sentence(rng, 3))
+            for i in xrange(3))
+        return (u'<table class=MsoTableGrid border=1 cellspacing=0 '
+                u'cellpadding=0><tr style=\'mso-yfti-irow:0\'>{0}</tr>'
+                u'</table>'.format(cells))
+
+    text = u'{0} <b style=\'mso-bidi-font-weight:normal\'>{1}</b> ' \
+        u'<i>{2}</i> <a href="http://example.com/{3}">{4}</a>'.format(
+            __sentence(rng, 20), __sentence(rng, 3), __sentence(rng, 4),
+            rng.randint(1, 1000), __sentence(rng, 2))
+
+    return u'<p class=MsoNormal style=\'{0}\'>{1}<o:p></o:p></p>'.format(
+        __mso_style(rng), __nested_spans(rng, text, rng.randint(1, 5)))
+
+
+def generate_word_document(size, seed=0):
+    """
+    Returns a Word-style HTML document of roughly ``size`` characters.
+    The same ``size`` and ``seed`` always give the same document.
+    """
+    rng = random.Random(seed)
+
+    # Word's style blocks are often a large part of small documents.
+    style_block = __style_block(rng, max(1, size // 4000))
+
+    parts = [u'<html xmlns:o="urn:schemas-microsoft-com:office:office">'
+             u'<head><!--[if gte mso 9]><xml><w:WordDocument><w:View>Normal'
+             u'</w:View></w:WordDocument></xml><![endif]-->',
+             style_block,
+             u'</head><body lang=EN-GB><div class=WordSection1>']
+    length = sum(len(part) for part in parts)
+
+    while length < size:
+        paragraph = __paragraph(rng) + u'\n'
+        parts.append(paragraph)
+        length += len(paragraph)
+
+    parts.append(u'</div></body></html>')
+    return u''.join(parts)
+
+
+def legacy_clean_word_text(text):
+    """
+    How ``clean_word_text`` used to work: a full parse to strip styles,
+    then another in bleach. Kept for comparison.
+    """
+    return bleach.clean(strip_styles(text), tags=allowed_tags, strip=True,
+                        attributes=allowed_attributes)
+
+
+# For clean_word_text_cached, regardless of MAGAZINE_SANITIZER_CACHE_SIZE.
+__cleaned_text_cache = LRUCache(1)
+
+
+def clean_word_text_cached(text):
+    """
+    ``clean_word_text`` with its cache of cleaned text enabled. Every run
+    after the first is a cache hit, so this measures hashing the text
+    rather than cleaning it.
+    """
+    key = hash_text(text)
+    cleaned = __cleaned_text_cache.get(key)
+
+    if cleaned is None:
+        cleaned = clean_word_text_uncached(text)
+        __cleaned_text_cache.set(key, cleaned)
+
+    return cleaned
+
+
+def demoted_text(text):
+    return Article(cleaned_text=text).demoted_text()
+
+
+# clean_word_text itself may be cached (see MAGAZINE_SANITIZER_CACHE_SIZE),
+# which would turn repeated runs into cache hits.
+BENCHMARKS = (
+    ('clean_word_text', clean_word_text_uncached),
+    ('clean_word_text_cached', clean_word_text_cached),
+    ('legacy_clean_word_text', legacy_clean_word_text),
+    ('strip_styles', strip_styles),
+    ('demoted_text', demoted_text),
+)
+
+
+def get_peak_memory():
+    """
+    Returns the peak resident set size of this process in bytes, or
+    None if it can't be measured on this platform.
+    """
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports kilobytes, OS X bytes.
+    if sys.platform != 'darwin':
+        peak *= 1024
+
+    return peak
+
+
+def measure(name, size, repeat=3, seed=0):
+    """
+    Runs the benchmark ``name`` over a document of ``size`` characters
+    ``repeat`` times, and returns a dictionary of the fastest time (in
+    seconds), the throughput (in bytes per second), and how much the
+    process's peak memory use grew (in bytes, or None).
+    """
+    function = dict(BENCHMARKS)[name]
+    document = generate_word_document(size, seed)
+    document_bytes = len(document.encode('utf-8'))
+
+    baseline = get_peak_memory()
+    times = []
+
+    for i in xrange(repeat):
+        started = time.time()
+        function(document)
+        times.append(time.time() - started)
+
+    peak = get_peak_memory()
+    best = min(times)
+
+    return {
+        'name': name,
+        'size': size,
+        'bytes': document_bytes,
+        'seconds': best,
+        'throughput': document_bytes / max(best, 1e-9),
+        'peak_memory': peak - baseline if peak is not None else None,
+    }
+
+
+def __measure_in_child(connection, *args):
+    try:
+        connection.send(measure(*args))
+    finally:
+        connection.close()
+
+
+def measure_in_process(name, size, repeat=3, seed=0):
+    """
+    Like ``measure``, but in a new process.
+    """
+    parent_connection, child_connection = multiprocessing.Pipe()
+    process = multiprocessing.Process(
+        target=__measure_in_child,
+        args=(child_connection, name, size, repeat, seed))
+    process.start()
+    result = parent_connection.recv()
+    process.join()
+
+    return result
@@ -0,0 +1,223 @@
+"""
+Bylines ("By Paul Beasley-Murray and Dominic Rodger").
+
+Bylines are shown for every article and book review on listing pages, so
+the rendered HTML is cached for each object, and can be fetched for a
+whole page of objects at once with ``prefetch_bylines``.
+
+Cached bylines never go stale, since their cache keys include two
+version tokens: one for the object, which is replaced when its authors
+change, and one for all bylines, which is replaced when any author is
+saved or deleted.
+
+Authors are changed in a transaction (in the admin, for example), and
+until it commits, other requests still see the old authors - and would
+cache bylines rendered from them under the new version. So versions
+replaced inside a transaction are replaced again at the end of the
+request, once it has committed.
+"""
+import threading
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import request_finished, request_started
+from django.db import models, transaction
+from django.db.models.query import prefetch_related_objects
+from django.template import Context
+from django.template.loader import get_template
+from django.test.signals import setting_changed
+from django.utils.html import conditional_escape
+from django.utils.safestring import mark_safe
+from magazine.utils.cache_versions import (VERSION_TIMEOUT, get_versions,
+                                           bump_versions)
+
+
+GENERATION_KEY = 'magazine_byline_generation'
+AUTHOR_TEMPLATE = 'magazine/_individual_author.html'
+
+# Compiled templates, loaded once per process.
+__templates = {}
+
+# Version keys to replace again at the end of the request.
+__pending = threading.local()
+
+
+def __get_label(obj):
+    # Instances with deferred fields are of a subclass of their model.
+    if getattr(obj, '_deferred', False):
+        return obj.__class__.__base__.__name__
+
+    return obj.__class__.__name__
+
+
+def __get_version_key(label, pk):
+    return u'magazine_byline_version_{0}_{1}'.format(label, pk)
+
+
+def get_author_template():
+    if AUTHOR_TEMPLATE not in __templates:
+        __templates[AUTHOR_TEMPLATE] = get_template(AUTHOR_TEMPLATE)
+
+    return __templates[AUTHOR_TEMPLATE]
+
+
+def reset_author_template(sender, setting, **kwargs):
+    if setting.startswith('TEMPLATE'):
+        __templates.clear()
+
+
+setting_changed.connect(reset_author_template)
+
+
+def render_author_fast(author):
+    """
+    Equivalent to rendering the default ``_individual_author.html``
+    template, but much quicker.
+    """
+    name = conditional_escape(author)
+
+    if not author.indexable:
+        return name
+
+    return u'<a href="{0}" title="View other articles by {1}">{1}</a>'\
+        .format(conditional_escape(author.get_absolute_url()), name)
+
+
+def render_byline(authors):
+    """
+    Renders a list of authors as "A, B and C", using the
+    ``_individual_author.html`` template for each author - or, if
+    ``MAGAZINE_FAST_BYLINES`` is ``True``, ``render_author_fast``.
+    """
+    if not authors:
+        return u''
+
+    if getattr(settings, 'MAGAZINE_FAST_BYLINES', False):
+        rendered = [render_author_fast(author) for author in authors]
+    else:
+        template = get_author_template()
+        context = Context()
+        rendered = []
+
+        for author in authors:
+            context.update({'author': author})
+            rendered.append(template.render(context))
+            context.pop()
+
+    if len(rendered) == 1:
+        return rendered[0]
+
+    return u', '.join(rendered[:-1]) + u' and ' + rendered[-1]
+
+
+def prefetch_bylines(objects):
+    """
+    Sets ``_magazine_byline`` on each of ``objects`` (typically a page of
+    articles or book reviews), using two cache lookups, and a single
+    query per model for the authors of any which weren't cached.
+    """
+    objects = [obj for obj in objects
+               if not hasattr(obj, '_magazine_byline')]
+
+    if not objects:
+        return
+
+    version_keys = dict((obj, __get_version_key(__get_label(obj), obj.pk))
+                        for obj in objects)
+    versions = get_versions([GENERATION_KEY] + version_keys.values())
+
+    keys = dict((obj, u'magazine_byline_{0}_{1}_{2}_{3}'.format(
+        versions[GENERATION_KEY], __get_label(obj), obj.pk,
+        versions[version_keys[obj]])) for obj in objects)
+    cached = cache.get_many(keys.values())
+    missing = {}
+
+    for obj, key in keys.items():
+        if key in cached:
+            obj._magazine_byline = mark_safe(cached[key])
+        else:
+            missing.setdefault(obj.__class__, []).append(obj)
+
+    to_cache = {}
+
+    for model_objects in missing.values():
+        if isinstance(model_objects[0], models.Model):
+            # Django doesn't skip objects whose authors were already
+            # prefetched (e.g. by a detail view), so we have to.
+            unfetched = [obj for obj in model_objects if 'authors' not in
+                         getattr(obj, '_prefetched_objects_cache', {})]
+            if unfetched:
+                prefetch_related_objects(unfetched, ['authors'])
+
+        for obj in model_objects:
+            byline = render_byline(list(obj.all_authors()))
+            obj._magazine_byline = mark_safe(byline)
+            to_cache[keys[obj]] = byline
+
+    if to_cache:
+        cache.set_many(to_cache, VERSION_TIMEOUT)
+
+
+def get_byline_versions(model, pks):
+    """
+    Returns the versions of the cached bylines of the ``model`` objects
+    with primary keys ``pks`` (and of all bylines), which change whenever
+    the bylines do - for ETags.
+    """
+    keys = [GENERATION_KEY] + [__get_version_key(model.__name__, pk)
+                               for pk in pks]
+    versions = get_versions(keys)
+
+    return [versions[key] for key in keys]
+
+
+def get_byline(obj):
+    prefetch_bylines([obj])
+    return obj._magazine_byline
+
+
+def __bump_versions(keys):
+    bump_versions(keys)
+
+    if transaction.is_managed():
+        if not hasattr(__pending, 'keys'):
+            __pending.keys = set()
+
+        __pending.keys.update(keys)
+
+
+def bump_pending_versions(sender, **kwargs):
+    keys = getattr(__pending, 'keys', None)
+
+    if keys:
+        __pending.keys = set()
+        bump_versions(list(keys))
+
+
+request_finished.connect(bump_pending_versions,
+                         dispatch_uid='magazine_bylines_pending')
+# Versions replaced outside of a request (in a shell, say) are replaced
+# again when the next one starts, rather than part way through it.
+request_started.connect(bump_pending_versions,
+                        dispatch_uid='magazine_bylines_pending_started')
+
+
+def invalidate_all_bylines(sender, **kwargs):
+    __bump_versions([GENERATION_KEY])
+
+
+def invalidate_bylines_for_authors_change(sender, instance, action, reverse,
+                                          model, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        __bump_versions([__get_version_key(__get_label(instance),
+                                           instance.pk)])
+    elif pk_set:
+        # Authors added to (or removed from) articles via the author.
+        __bump_versions([__get_version_key(model.__name__, pk)
+                         for pk in pk_set])
+    else:
+        # All of an author's articles were cleared, and we don't know
+        # which they were.
+        __bump_versions([GENERATION_KEY])
@@ -0,0 +1,143 @@
+"""
+Embargo policies.
+
+An embargoed issue is one whose articles are only shown in full to
+staff - everyone else sees a teaser. Which published issues are
+embargoed is decided by a policy, which can answer both for a single
+issue (``is_embargoed``) and in bulk, as a query filter
+(``unembargoed_filter``), so that listings can filter and sort issues by
+embargo status in the database.
+
+The policy is taken from the ``MAGAZINE_EMBARGO_POLICY`` setting if it
+is set. Otherwise, if ``MAGAZINE_IS_EMBARGOED_FUNCTION`` is set, that
+function is used, and failing that, issues are embargoed for
+``MAGAZINE_EMBARGO_TIME_IN_MONTHS`` months after their issue date.
+"""
+from datetime import date
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from magazine.utils.cache_versions import bump_version, get_version
+from magazine.utils.dates import seconds_until_midnight, subtract_n_months
+
+
+# Replaced whenever an issue is saved or deleted.
+UNEMBARGOED_VERSION_KEY = 'magazine_unembargoed_issues_version'
+
+
+__cutoffs = {}
+
+
+def embargo_cutoff(today, num_months):
+    """
+    Returns the date on or before which issues are old enough not to be
+    embargoed. Memoised, since it's needed for every issue rendered.
+    """
+    key = (today, num_months)
+
+    if key not in __cutoffs:
+        if len(__cutoffs) > 32:
+            __cutoffs.clear()
+        __cutoffs[key] = subtract_n_months(today, num_months)
+
+    return __cutoffs[key]
+
+
+class EmbargoPolicy(object):
+    """
+    Base class for embargo policies. Policies are only consulted for
+    published issues - unpublished issues are always embargoed.
+    """
+    def is_embargoed(self, issue):
+        raise NotImplementedError
+
+    def get_cache_name(self):
+        """
+        Returns a name for this policy which is the same in every
+        process, for cache keys.
+        """
+        return u'{0}.{1}'.format(self.__class__.__module__,
+                                 self.__class__.__name__)
+
+    def unembargoed_filter(self, today):
+        """
+        Returns a ``Q`` object matching the published issues which are
+        not embargoed on ``today``.
+
+        This implementation calls ``is_embargoed`` for every published
+        issue, which is correct but slow - so the primary keys of the
+        unembargoed issues are cached until midnight, or until an issue
+        is saved or deleted. Override it if your policy can be expressed
+        as a query.
+        """
+        key = u'magazine_unembargoed_issues_{0}_{1}_{2}'.format(
+            get_version(UNEMBARGOED_VERSION_KEY), today.isoformat(),
+            self.get_cache_name())
+        pks = cache.get(key)
+
+        if pks is None:
+            from magazine.models import Issue
+
+            published = Issue._base_manager.filter(published=True,
+                                                   issue_date__lte=today)
+            pks = [issue.pk for issue in published
+                   if not self.is_embargoed(issue)]
+            cache.set(key, pks, seconds_until_midnight())
+
+        return Q(pk__in=pks)
+
+
+class DateEmbargoPolicy(EmbargoPolicy):
+    """
+    Embargoes issues until they are ``num_months`` months old
+    (``MAGAZINE_EMBARGO_TIME_IN_MONTHS`` by default).
+    """
+    def __init__(self, num_months=None):
+        self.num_months = num_months
+
+    def get_num_months(self):
+        if self.num_months is not None:
+            return self.num_months
+
+        return int(getattr(settings, 'MAGAZINE_EMBARGO_TIME_IN_MONTHS', 2))
+
+    def is_embargoed(self, issue):
+        cutoff = embargo_cutoff(date.today(), self.get_num_months())
+        return cutoff < issue.issue_date
+
+    def unembargoed_filter(self, today):
+        return Q(issue_date__lte=embargo_cutoff(today, self.get_num_months()))
+
+
+class FunctionEmbargoPolicy(EmbargoPolicy):
+    """
+    Wraps a function which takes an ``Issue`` and returns ``True`` if it
+    is embargoed (as set by ``MAGAZINE_IS_EMBARGOED_FUNCTION``).
+    """
+    def __init__(self, function):
+        self.function = function
+
+    def get_cache_name(self):
+        return u'{0}.{1}'.format(self.function.__module__,
+                                 self.function.__name__)
+
+    def is_embargoed(self, issue):
+        return self.function(issue)
+
+
+def invalidate_unembargoed_issues(sender, **kwargs):
+    bump_version(UNEMBARGOED_VERSION_KEY)
+
+
+def get_embargo_policy():
+    policy = getattr(settings, 'MAGAZINE_EMBARGO_POLICY', None)
+
+    if policy is not None:
+        return policy
+
+    function = getattr(settings, 'MAGAZINE_IS_EMBARGOED_FUNCTION', None)
+
+    if function is not None:
+        return FunctionEmbargoPolicy(function)
+
+    return DateEmbargoPolicy()
@@ -0,0 +1,221 @@
+"""
+Hit counting for articles and book reviews.
+
+By default every page view issues its own ``UPDATE`` to increment the
+``hits`` column. If ``MAGAZINE_BUFFER_HITS`` is ``True``, hits are
+instead accumulated in Django's cache and written back in batches (one
+``UPDATE`` per object per flush), either by the ``magazine_flush_hits``
+management command or, at most once every
+``MAGAZINE_HIT_FLUSH_INTERVAL`` seconds, by whichever request happens to
+record a hit once the interval has passed.
+
+The buffer lives in the cache, so you'll need a cache backend which is
+shared between processes (e.g. memcached) for the management command to
+see hits recorded by your web server.
+"""
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, get_model
+
+
+FLUSH_LOCK_KEY = 'magazine_hits_flush_lock'
+FLUSHING_KEY = 'magazine_hits_flushing'
+POSITION_KEY = 'magazine_hits_flush_position'
+
+# Objects with buffered hits are registered in numbered slots of a
+# bucket per BUCKET_SECONDS, rather than in one shared set, so that
+# concurrent hits never overwrite each other's registrations.
+BUCKET_SECONDS = 60
+
+# Buffered hits should comfortably outlive any sensible flush interval.
+BUFFER_TIMEOUT = 60 * 60 * 24 * 7
+
+# How long a flush can hold FLUSHING_KEY before another may start.
+FLUSH_TIMEOUT = 60 * 5
+
+
+def buffering_enabled():
+    return getattr(settings, 'MAGAZINE_BUFFER_HITS', False)
+
+
+def get_flush_interval():
+    return int(getattr(settings, 'MAGAZINE_HIT_FLUSH_INTERVAL', 60))
+
+
+def __get_hit_key(label, pk):
+    return u'magazine_hits_{0}_{1}'.format(label, pk)
+
+
+def __get_registered_key(label, pk):
+    return u'magazine_hits_registered_{0}_{1}'.format(label, pk)
+
+
+def __get_bucket_key(bucket):
+    return u'magazine_hits_bucket_{0}'.format(bucket)
+
+
+def __get_slot_key(bucket, slot):
+    return u'magazine_hits_bucket_{0}_{1}'.format(bucket, slot)
+
+
+def __get_label(obj):
+    return obj._meta.object_name.lower()
+
+
+def current_bucket():
+    return int(time.time()) // BUCKET_SECONDS
+
+
+def __increment(key):
+    """
+    Atomically increments the counter ``key`` (creating it if needed),
+    and returns its new value.
+    """
+    if cache.add(key, 1, BUFFER_TIMEOUT):
+        return 1
+
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # The counter expired between add() and incr().
+        cache.set(key, 1, BUFFER_TIMEOUT)
+        return 1
+
+
+def __register(label, pk):
+    """
+    Records that ``(label, pk)`` has buffered hits, in the next slot of
+    the current bucket.
+    """
+    bucket = current_bucket()
+
+    # Flushing starts from the first bucket ever used.
+    cache.add(POSITION_KEY, (bucket, 0), BUFFER_TIMEOUT)
+
+    slot = __increment(__get_bucket_key(bucket))
+    cache.set(__get_slot_key(bucket, slot), (label, pk), BUFFER_TIMEOUT)
+
+
+def record_hit(obj):
+    """
+    Counts a visit to ``obj`` (an ``Article`` or ``BookReview``).
+    """
+    if not buffering_enabled():
+        obj.__class__._default_manager.filter(pk=obj.pk)\
+            .update(hits=F('hits') + 1)
+        return
+
+    label = __get_label(obj)
+    __increment(__get_hit_key(label, obj.pk))
+
+    # Only the first hit since the object was last flushed registers
+    # it, so most hits don't touch the index at all.
+    if cache.add(__get_registered_key(label, obj.pk), True, BUFFER_TIMEOUT):
+        __register(label, obj.pk)
+
+    interval = get_flush_interval()
+    if interval > 0 and cache.add(FLUSH_LOCK_KEY, True, interval):
+        flush_hits()
+
+
+def get_pending_hits(obj):
+    """
+    Returns the number of hits for ``obj`` which have been recorded, but
+    not yet written to the database.
+    """
+    if not buffering_enabled():
+        return 0
+
+    return cache.get(__get_hit_key(__get_label(obj), obj.pk)) or 0
+
+
+def __get_registrations(position):
+    """
+    Returns the ``(label, pk)`` pairs registered since ``position`` (a
+    ``(bucket, slot)`` pair), and the position to carry on from next
+    time.
+    """
+    first_bucket, first_slot = position
+    bucket = current_bucket()
+    buckets = range(first_bucket, bucket + 1)
+
+    sizes = cache.get_many([__get_bucket_key(b) for b in buckets])
+    slots = []
+
+    for b in buckets:
+        start = first_slot if b == first_bucket else 0
+        size = sizes.get(__get_bucket_key(b)) or 0
+        slots.extend((b, slot) for slot in xrange(start + 1, size + 1))
+
+    entries = cache.get_many([__get_slot_key(b, slot) for b, slot in slots])
+    registrations = []
+    position = (bucket, sizes.get(__get_bucket_key(bucket)) or 0)
+
+    for b, slot in slots:
+        entry = entries.get(__get_slot_key(b, slot))
+
+        if entry is None:
+            # A hit in this bucket or the last may have taken the slot
+            # and not filled it in yet, so come back to it next time.
+            # Older slots must have been evicted from the cache.
+            if b >= bucket - 1:
+                position = (b, slot - 1)
+                break
+            continue
+
+        registrations.append(entry)
+
+    return registrations, position
+
+
+def flush_hits():
+    """
+    Writes all buffered hits to the database, and returns the number of
+    objects which were updated.
+    """
+    position = cache.get(POSITION_KEY)
+
+    if position is None or not cache.add(FLUSHING_KEY, True, FLUSH_TIMEOUT):
+        return 0
+
+    try:
+        registrations, position = __get_registrations(position)
+        # Deduplicated, since an object can be registered again while
+        # (or after) it's flushed.
+        registrations = set(registrations)
+
+        # Unregister before reading the counts, so that a hit recorded
+        # after we've read them registers the object again.
+        cache.delete_many([__get_registered_key(label, pk)
+                           for label, pk in registrations])
+
+        keys = dict((__get_hit_key(label, pk), (label, pk))
+                    for label, pk in registrations)
+        counts = cache.get_many(keys.keys())
+
+        flushed = 0
+
+        for key, (label, pk) in keys.items():
+            count = counts.get(key)
+
+            if not count:
+                continue
+
+            # Decrement rather than delete, so that hits recorded while
+            # we're flushing are kept for next time.
+            try:
+                cache.decr(key, count)
+            except ValueError:
+                pass
+
+            model = get_model('magazine', label)
+            model._default_manager.filter(pk=pk)\
+                .update(hits=F('hits') + count)
+            flushed += 1
+
+        cache.set(POSITION_KEY, position, BUFFER_TIMEOUT)
+    finally:
+        cache.delete(FLUSHING_KEY)
+
+    return flushed
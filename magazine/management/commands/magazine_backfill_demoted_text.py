@@ -0,0 +1,50 @@
+from optparse import make_option
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+from magazine.models import Article, BookReview
+from magazine.utils.headings import demote_headings
+from magazine.utils.querysets import queryset_in_chunks
+
+
+class Command(NoArgsCommand):
+    help = ('Populates the stored, heading-demoted copy of the text of '
+            'articles and book reviews saved before it was introduced.')
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--chunk-size', type='int', dest='chunk_size',
+                    default=200,
+                    help='Number of rows to process per query.'),
+        make_option('--all', action='store_true', dest='all', default=False,
+                    help='Regenerate every row, not just missing ones.'),
+    )
+
+    def handle_noargs(self, **options):
+        verbosity = int(options.get('verbosity', 1))
+
+        for model in (Article, BookReview):
+            # Go via the base manager, and only fetch what we need - the
+            # text columns can be large.
+            queryset = model._base_manager.only('pk', 'cleaned_text')
+
+            if not options['all']:
+                queryset = queryset.filter(demoted_cleaned_text__isnull=True)
+
+            updated = 0
+
+            for chunk in queryset_in_chunks(queryset, options['chunk_size']):
+                with transaction.commit_on_success():
+                    for obj in chunk:
+                        # update() rather than save(), so that we don't
+                        # touch the auto_now "updated" timestamp.
+                        model._base_manager.filter(pk=obj.pk).update(
+                            demoted_cleaned_text=demote_headings(
+                                obj.cleaned_text or u''))
+                updated += len(chunk)
+
+                if verbosity > 1:
+                    self.stdout.write(u'{0}: {1} rows done\n'.format(
+                        model._meta.verbose_name_plural, updated))
+
+            if verbosity > 0:
+                self.stdout.write(u'Backfilled {0} {1}.\n'.format(
+                    updated, model._meta.verbose_name_plural))
@@ -0,0 +1,131 @@
+import json
+import math
+from optparse import make_option
+from django.core.management.base import NoArgsCommand, CommandError
+from magazine.benchmarks import BENCHMARKS, measure, measure_in_process
+
+
+DEFAULT_SIZES = '1K,10K,100K,1M,5M'
+
+SIZE_SUFFIXES = {'K': 1024, 'M': 1024 * 1024}
+
+
+def parse_size(size):
+    size = size.strip().upper()
+
+    if size and size[-1] in SIZE_SUFFIXES:
+        return int(float(size[:-1]) * SIZE_SUFFIXES[size[-1]])
+
+    return int(size)
+
+
+def format_bytes(num_bytes):
+    if num_bytes is None:
+        return u'-'
+
+    for suffix, multiplier in (('M', 1024 * 1024), ('K', 1024)):
+        if num_bytes >= multiplier:
+            return u'{0:.1f}{1}'.format(num_bytes / float(multiplier), suffix)
+
+    return u'{0}'.format(num_bytes)
+
+
+class Command(NoArgsCommand):
+    help = ('Measures the throughput and peak memory use of the HTML '
+            'sanitizer on synthetic Word documents.')
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--sizes', dest='sizes', default=DEFAULT_SIZES,
+                    help='Comma-separated document sizes, e.g. "1K,5M".'),
+        make_option('--benchmarks', dest='benchmarks',
+                    default=','.join(name for name, function in BENCHMARKS),
+                    help='Comma-separated benchmarks to run.'),
+        make_option('--repeat', type='int', dest='repeat', default=3,
+                    help='Runs per measurement (the fastest is used).'),
+        make_option('--no-isolate', action='store_false', dest='isolate',
+                    default=True,
+                    help='Run measurements in this process (peak memory '
+                         'figures will be unreliable).'),
+        make_option('--save', dest='save',
+                    help='Save the results as JSON to this file.'),
+        make_option('--compare', dest='compare',
+                    help='Compare against results saved with --save, and '
+                         'fail if anything got slower.'),
+        make_option('--threshold', type='float', dest='threshold',
+                    default=20.0,
+                    help='How many percent slower counts as slower '
+                         '(with --compare).'),
+    )
+
+    def handle_noargs(self, **options):
+        names = [name.strip() for name in options['benchmarks'].split(',')]
+        unknown = set(names) - set(name for name, function in BENCHMARKS)
+
+        if unknown:
+            raise CommandError(u'Unknown benchmarks: {0}'.format(
+                u', '.join(sorted(unknown))))
+
+        sizes = [parse_size(size) for size in options['sizes'].split(',')]
+        run = measure_in_process if options['isolate'] else measure
+
+        results = []
+
+        self.stdout.write(
+            u'{0:<24}{1:>10}{2:>12}{3:>14}{4:>12}{5:>10}\n'.format(
+                u'benchmark', u'size', u'seconds', u'throughput',
+                u'peak mem', u'scaling'))
+
+        for name in names:
+            previous = None
+
+            for size in sizes:
+                result = run(name, size, options['repeat'])
+                results.append(result)
+
+                # How time grows with size: 1.0 is linear, 2.0 quadratic.
+                scaling = u'-'
+                if previous is not None and previous['seconds'] > 0 and \
+                        result['bytes'] != previous['bytes']:
+                    scaling = u'{0:.2f}'.format(
+                        math.log(result['seconds'] / previous['seconds']) /
+                        math.log(float(result['bytes']) / previous['bytes']))
+                previous = result
+
+                self.stdout.write(
+                    u'{0:<24}{1:>10}{2:>12.4f}{3:>12}/s{4:>12}{5:>10}\n'
+                    .format(name, format_bytes(result['bytes']),
+                            result['seconds'],
+                            format_bytes(result['throughput']),
+                            format_bytes(result['peak_memory']), scaling))
+
+        if options['save']:
+            with open(options['save'], 'w') as f:
+                json.dump(results, f, indent=1)
+
+        if options['compare']:
+            self.compare(results, options['compare'], options['threshold'])
+
+    def compare(self, results, filename, threshold):
+        with open(filename) as f:
+            baseline = dict(((result['name'], result['size']), result)
+                            for result in json.load(f))
+
+        slower = []
+
+        for result in results:
+            old = baseline.get((result['name'], result['size']))
+
+            if old is None or not old['seconds']:
+                continue
+
+            change = (result['seconds'] / old['seconds'] - 1) * 100
+            self.stdout.write(u'{0} ({1}): {2:+.1f}%\n'.format(
+                result['name'], format_bytes(result['bytes']), change))
+
+            if change > threshold:
+                slower.append(result)
+
+        if slower:
+            raise CommandError(u'{0} benchmarks are more than {1}% slower '
+                               u'than in {2}.'.format(len(slower), threshold,
+                                                      filename))
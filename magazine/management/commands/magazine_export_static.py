@@ -0,0 +1,88 @@
+import multiprocessing
+import os
+from optparse import make_option
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from magazine.static_export import (get_export_paths, read_manifest,
+                                    write_manifest, export_page, remove_page)
+
+
+class Command(BaseCommand):
+    args = '<output_dir>'
+    help = ('Exports the published issues, articles, book reviews and '
+            'authors as static HTML, re-rendering only pages which have '
+            'changed since the last export. The issue list is exported as '
+            'a single page, and paginated listings (the author index, and '
+            'each author\'s articles and book reviews) aren\'t exported.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--processes', type='int', dest='processes',
+                    default=multiprocessing.cpu_count(),
+                    help='Number of processes to render pages with.'),
+        make_option('--full', action='store_true', dest='full',
+                    default=False,
+                    help='Re-render every page, ignoring the manifest.'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError('Usage: magazine_export_static <output_dir>')
+
+        output_dir = os.path.abspath(args[0])
+        verbosity = int(options.get('verbosity', 1))
+
+        if not os.path.isdir(output_dir):
+            os.makedirs(output_dir)
+
+        old_manifest = {}
+        if not options['full']:
+            old_manifest = read_manifest(output_dir)
+
+        paths = get_export_paths()
+        tasks = [(output_dir, path, old_manifest.get(path))
+                 for path in paths]
+
+        if options['processes'] > 1:
+            # Each process needs its own database connection, so don't
+            # let them inherit ours.
+            for connection in connections.all():
+                connection.close()
+
+            pool = multiprocessing.Pool(options['processes'])
+            results = pool.imap_unordered(export_page, tasks)
+        else:
+            pool = None
+            results = (export_page(task) for task in tasks)
+
+        manifest = {}
+        written = unchanged = 0
+
+        try:
+            for path, status_code, etag in results:
+                if status_code == 304:
+                    manifest[path] = old_manifest[path]
+                    unchanged += 1
+                elif status_code == 200:
+                    manifest[path] = etag
+                    written += 1
+
+                    if verbosity > 1:
+                        self.stdout.write(u'Wrote {0}\n'.format(path))
+                else:
+                    remove_page(output_dir, path)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        # Pages which are no longer published.
+        removed = set(read_manifest(output_dir)) - set(manifest)
+        for path in removed:
+            remove_page(output_dir, path)
+
+        write_manifest(output_dir, manifest)
+
+        if verbosity > 0:
+            self.stdout.write(
+                u'Wrote {0} pages ({1} unchanged, {2} removed).\n'.format(
+                    written, unchanged, len(removed)))
@@ -0,0 +1,14 @@
+from django.core.management.base import NoArgsCommand
+from magazine.hits import flush_hits
+
+
+class Command(NoArgsCommand):
+    help = ('Writes article and book review hits buffered in the cache '
+            '(see MAGAZINE_BUFFER_HITS) to the database.')
+
+    def handle_noargs(self, **options):
+        flushed = flush_hits()
+
+        if int(options.get('verbosity', 1)) > 0:
+            self.stdout.write(u'Flushed hits for {0} object(s).\n'
+                              .format(flushed))
@@ -0,0 +1,262 @@
+import json
+import multiprocessing
+import os
+import time
+from optparse import make_option
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction
+from django.db.models import Max
+from magazine.author_summaries import invalidate_author_summaries
+from magazine.models import (Article, Author, Issue,
+                             invalidate_current_issue, update_author_counts,
+                             update_issue_counts)
+from magazine.search import index_objects
+from magazine.utils.headings import demote_headings
+from magazine.utils.word_cleaner import clean_word_text, hash_text
+
+
+def read_records(source):
+    """
+    Yields the article records in ``source``: either a JSON lines file
+    with one article per line, or a directory of ``.json`` files with
+    one article each. ``text_file`` paths are relative to the directory
+    (or the JSON lines file's directory).
+    """
+    if os.path.isdir(source):
+        base_dir = source
+        filenames = sorted(name for name in os.listdir(source)
+                           if name.endswith('.json'))
+
+        def records():
+            for name in filenames:
+                with open(os.path.join(source, name)) as f:
+                    yield name, json.load(f)
+    else:
+        base_dir = os.path.dirname(os.path.abspath(source))
+
+        def records():
+            with open(source) as f:
+                for line_number, line in enumerate(f):
+                    if line.strip():
+                        yield u'line {0}'.format(line_number + 1), \
+                            json.loads(line)
+
+    for location, record in records():
+        if not record.get('title') or record.get('issue') is None:
+            raise CommandError(
+                u'{0}: articles need a title and an issue'.format(location))
+
+        if record.get('text_file'):
+            with open(os.path.join(base_dir, record['text_file'])) as f:
+                record['text'] = f.read().decode('utf-8')
+
+        yield record
+
+
+def parse_author(author):
+    """
+    Returns the ``(forename, surname)`` of an author given either as a
+    dictionary, or as a name like "Dominic Rodger".
+    """
+    if isinstance(author, dict):
+        return author['forename'], author.get('surname') or None
+
+    names = author.strip().rsplit(None, 1)
+
+    if len(names) == 1:
+        return names[0], None
+
+    return names[0], names[1]
+
+
+def clean_record(record):
+    """
+    Populates the cleaned (and derived) text of an article record. Runs
+    in the worker processes, so takes and returns a plain dictionary.
+    """
+    if record.get('text'):
+        record['cleaned_text'] = clean_word_text(record['text'])
+        record['text_hash'] = hash_text(record['text'])
+
+    record['demoted_cleaned_text'] = demote_headings(
+        record.get('cleaned_text') or u'')
+    record['teaser_text'] = Article(
+        description=record.get('description'),
+        cleaned_text=record.get('cleaned_text')).build_teaser()
+
+    return record
+
+
+def get_authors(records):
+    """
+    Returns a dictionary mapping ``(forename, surname)`` to author
+    primary keys for every author in ``records``, creating any which
+    don't exist yet.
+    """
+    names = set()
+    for record in records:
+        names.update(parse_author(author)
+                     for author in record.get('authors', []))
+
+    def existing_authors():
+        forenames = set(forename for forename, surname in names)
+        return dict(((forename, surname or None), pk)
+                    for pk, forename, surname in Author.plain_objects
+                    .filter(forename__in=forenames)
+                    .values_list('pk', 'forename', 'surname'))
+
+    authors = existing_authors()
+    missing = [name for name in names if name not in authors]
+
+    if missing:
+        Author.plain_objects.bulk_create([
+            Author(forename=forename, surname=surname)
+            for forename, surname in missing])
+        authors = existing_authors()
+
+    return authors
+
+
+def batches(iterable, size):
+    batch = []
+
+    for item in iterable:
+        batch.append(item)
+
+        if len(batch) == size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+class Command(BaseCommand):
+    args = '<directory or JSON lines file>'
+    help = ('Imports articles in bulk, cleaning their text in parallel. '
+            'Each article is a JSON object with a title, issue (number), '
+            'and optionally subheading, description, text (or text_file), '
+            'order_in_issue and a list of authors.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--processes', type='int', dest='processes',
+                    default=multiprocessing.cpu_count(),
+                    help='Number of processes to clean text with.'),
+        make_option('--batch-size', type='int', dest='batch_size',
+                    default=500,
+                    help='Number of articles to insert per transaction.'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError(
+                'Usage: magazine_import_articles <directory or file>')
+
+        verbosity = int(options.get('verbosity', 1))
+        records = list(read_records(args[0]))
+
+        issues = dict(Issue._base_manager
+                      .filter(number__in=set(record['issue']
+                                             for record in records))
+                      .values_list('number', 'pk'))
+        missing = sorted(set(record['issue'] for record in records) -
+                         set(issues))
+
+        if missing:
+            raise CommandError(u'No such issues: {0}'.format(
+                u', '.join(unicode(number) for number in missing)))
+
+        authors = get_authors(records)
+
+        if options['processes'] > 1:
+            # Each process needs its own database connection, so don't
+            # let them inherit ours.
+            for conn in connections.all():
+                conn.close()
+
+            pool = multiprocessing.Pool(options['processes'])
+            cleaned = pool.imap(clean_record, records, chunksize=10)
+        else:
+            pool = None
+            cleaned = (clean_record(record) for record in records)
+
+        started = time.time()
+        imported = 0
+
+        try:
+            for batch in batches(cleaned, options['batch_size']):
+                self.import_batch(batch, issues, authors)
+                imported += len(batch)
+
+                if verbosity > 0:
+                    elapsed = time.time() - started
+                    self.stdout.write(
+                        u'Imported {0}/{1} articles '
+                        u'({2:.1f} articles/second)\n'.format(
+                            imported, len(records),
+                            imported / max(elapsed, 0.001)))
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        invalidate_current_issue(sender=Article)
+        invalidate_author_summaries(sender=Article)
+
+        if verbosity > 0:
+            self.stdout.write(u'Imported {0} articles in {1:.1f} '
+                              u'seconds.\n'.format(imported,
+                                                   time.time() - started))
+
+    @transaction.commit_on_success
+    def import_batch(self, records, issues, authors):
+        cursor = connection.cursor()
+
+        # bulk_create() can't tell us the primary keys of the rows it
+        # inserts, and we need them for the authors, so choose them -
+        # with the table locked against writes until the batch commits,
+        # so that nothing else can take them first.
+        if connection.vendor == 'postgresql':
+            cursor.execute('LOCK TABLE {0} IN EXCLUSIVE MODE'.format(
+                connection.ops.quote_name(Article._meta.db_table)))
+
+        next_pk = (Article._base_manager.aggregate(pk=Max('pk'))['pk'] or
+                   0) + 1
+
+        articles = []
+        through = []
+
+        for pk, record in enumerate(records, next_pk):
+            articles.append(Article(
+                pk=pk,
+                title=record['title'],
+                subheading=record.get('subheading'),
+                description=record.get('description'),
+                text=record.get('text'),
+                cleaned_text=record.get('cleaned_text'),
+                text_hash=record.get('text_hash'),
+                demoted_cleaned_text=record['demoted_cleaned_text'],
+                teaser_text=record['teaser_text'],
+                issue_id=issues[record['issue']],
+                order_in_issue=record.get('order_in_issue', 0)))
+
+            author_pks = set(authors[parse_author(author)]
+                             for author in record.get('authors', []))
+
+            for author_pk in author_pks:
+                through.append(Article.authors.through(
+                    article_id=pk, author_id=author_pk))
+
+        Article.objects.bulk_create(articles)
+        Article.authors.through.objects.bulk_create(through)
+
+        # The database's sequence (if it has one) needs to catch up before
+        # the lock is released, or the next article saved elsewhere would
+        # be given one of these primary keys.
+        for sql in connection.ops.sequence_reset_sql(no_style(), [Article]):
+            cursor.execute(sql)
+
+        update_author_counts(set(row.author_id for row in through))
+        update_issue_counts(set(article.issue_id for article in articles))
+        index_objects(articles)
@@ -0,0 +1,32 @@
+import time
+from optparse import make_option
+from django.core.management.base import NoArgsCommand
+from magazine.sanitization import process_queue
+
+
+class Command(NoArgsCommand):
+    help = ('Cleans the text of articles and book reviews queued for '
+            'cleaning (see MAGAZINE_DEFER_SANITIZATION).')
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--limit', type='int', dest='limit', default=None,
+                    help='Maximum number of jobs to process.'),
+        make_option('--poll', type='int', dest='poll', default=None,
+                    help='Keep running, checking the queue every POLL '
+                         'seconds once it is empty.'),
+    )
+
+    def handle_noargs(self, **options):
+        verbosity = int(options.get('verbosity', 1))
+
+        while True:
+            processed = process_queue(limit=options['limit'])
+
+            if verbosity > 0 and (processed or not options['poll']):
+                self.stdout.write(u'Processed {0} job(s).\n'
+                                  .format(processed))
+
+            if not options['poll']:
+                break
+
+            time.sleep(options['poll'])
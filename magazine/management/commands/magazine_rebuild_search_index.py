@@ -0,0 +1,45 @@
+from optparse import make_option
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+from magazine.search import SEARCH_FIELDS, index_objects
+from magazine.utils.querysets import queryset_in_chunks
+
+
+class Command(NoArgsCommand):
+    help = ('Indexes articles and book reviews for searching. Saving an '
+            'article or book review updates the index, so this is only '
+            'needed for existing content.')
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--chunk-size', type='int', dest='chunk_size',
+                    default=200,
+                    help='Number of rows to process per query.'),
+        make_option('--missing', action='store_true', dest='missing',
+                    default=False,
+                    help='Only index rows which are not yet indexed.'),
+    )
+
+    def handle_noargs(self, **options):
+        verbosity = int(options.get('verbosity', 1))
+
+        for model, fields in SEARCH_FIELDS.items():
+            queryset = model._base_manager.only(
+                'pk', 'issue', *[field for field, _, _ in fields])
+
+            if options['missing']:
+                queryset = queryset.filter(search_terms__isnull=True)
+
+            indexed = 0
+
+            for chunk in queryset_in_chunks(queryset, options['chunk_size']):
+                with transaction.commit_on_success():
+                    index_objects(chunk)
+                indexed += len(chunk)
+
+                if verbosity > 1:
+                    self.stdout.write(u'{0}: {1} rows done\n'.format(
+                        model._meta.verbose_name_plural, indexed))
+
+            if verbosity > 0:
+                self.stdout.write(u'Indexed {0} {1}.\n'.format(
+                    indexed, model._meta.verbose_name_plural))
@@ -0,0 +1,22 @@
+from django.core.management.base import NoArgsCommand
+from magazine.models import Author, update_author_counts
+
+
+class Command(NoArgsCommand):
+    help = ('Recounts the articles and book reviews by each author. The '
+            'counts are kept up to date automatically, so this is only '
+            'needed after changing authors outside of Django (e.g. with '
+            'raw SQL).')
+
+    def handle_noargs(self, **options):
+        def counts():
+            return set(Author.objects.values_list('pk', 'num_articles',
+                                                  'num_book_reviews'))
+
+        before = counts()
+        update_author_counts()
+        corrected = len(counts() - before)
+
+        if int(options.get('verbosity', 1)) > 0:
+            self.stdout.write(u'Corrected the counts for {0} author(s).\n'
+                              .format(corrected))
@@ -0,0 +1,58 @@
+from optparse import make_option
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+from magazine.author_summaries import invalidate_author_summaries
+from magazine.models import Article, BookReview
+from magazine.utils.querysets import queryset_in_chunks
+
+
+# The fields each model's build_teaser() needs.
+TEASER_SOURCE_FIELDS = (
+    (Article, ('pk', 'description', 'cleaned_text',)),
+    (BookReview, ('pk', 'cleaned_text',)),
+)
+
+
+class Command(NoArgsCommand):
+    help = ('Regenerates the stored teasers of articles and book reviews, '
+            'as shown on listing pages.')
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--chunk-size', type='int', dest='chunk_size',
+                    default=200,
+                    help='Number of rows to process per query.'),
+        make_option('--missing', action='store_true', dest='missing',
+                    default=False,
+                    help='Only generate teasers for rows without one.'),
+    )
+
+    def handle_noargs(self, **options):
+        verbosity = int(options.get('verbosity', 1))
+
+        for model, fields in TEASER_SOURCE_FIELDS:
+            queryset = model._base_manager.only(*fields)
+
+            if options['missing']:
+                queryset = queryset.filter(teaser_text__isnull=True)
+
+            updated = 0
+
+            for chunk in queryset_in_chunks(queryset, options['chunk_size']):
+                with transaction.commit_on_success():
+                    for obj in chunk:
+                        # update() rather than save(), so that we don't
+                        # touch the auto_now "updated" timestamp.
+                        model._base_manager.filter(pk=obj.pk).update(
+                            teaser_text=obj.build_teaser())
+                updated += len(chunk)
+
+                # Author summaries cache the teasers.
+                invalidate_author_summaries(sender=model)
+
+                if verbosity > 1:
+                    self.stdout.write(u'{0}: {1} rows done\n'.format(
+                        model._meta.verbose_name_plural, updated))
+
+            if verbosity > 0:
+                self.stdout.write(u'Regenerated {0} {1} teasers.\n'.format(
+                    updated, model._meta.verbose_name))
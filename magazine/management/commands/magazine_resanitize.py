@@ -0,0 +1,196 @@
+import difflib
+import json
+import multiprocessing
+import os
+from optparse import make_option
+from django.core.management.base import NoArgsCommand
+from django.db import connections, transaction
+from magazine.author_summaries import invalidate_author_summaries
+from magazine.models import Article, BookReview
+from magazine.search import SEARCH_FIELDS, index_objects
+from magazine.utils.cache_versions import bump_version
+from magazine.utils.headings import demote_headings
+from magazine.utils.querysets import queryset_in_chunks
+from magazine.utils.word_cleaner import (CLEANED_TEXT_VERSION_KEY,
+                                         clean_word_text, hash_text)
+
+
+DEFAULT_CHECKPOINT = '.magazine-resanitize-checkpoint.json'
+
+
+def clean_text(task):
+    """
+    Cleans the text of one row. Runs in the worker processes, so takes
+    and returns a plain ``(pk, text)`` tuple.
+    """
+    pk, text = task
+    return pk, clean_word_text(text)
+
+
+def read_checkpoint(filename):
+    """
+    Returns the primary key of the last row processed for each model,
+    keyed by model name.
+    """
+    try:
+        with open(filename) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def write_checkpoint(filename, checkpoint):
+    with open(filename + '.tmp', 'w') as f:
+        json.dump(checkpoint, f, sort_keys=True)
+
+    os.rename(filename + '.tmp', filename)
+
+
+class Command(NoArgsCommand):
+    help = ('Cleans the text of every article and book review again, for '
+            'when the tags or attributes allowed by the cleaner change. '
+            'Stopping it part way through is safe - it picks up where it '
+            'left off the next time it is run.')
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--chunk-size', type='int', dest='chunk_size',
+                    default=200,
+                    help='Number of rows to process per query.'),
+        make_option('--processes', type='int', dest='processes',
+                    default=multiprocessing.cpu_count(),
+                    help='Number of processes to clean text with.'),
+        make_option('--checkpoint', dest='checkpoint',
+                    default=DEFAULT_CHECKPOINT,
+                    help='File to record progress in (default: '
+                         '{0}).'.format(DEFAULT_CHECKPOINT)),
+        make_option('--restart', action='store_true', dest='restart',
+                    default=False,
+                    help='Start from the beginning, ignoring any '
+                         'recorded progress.'),
+        make_option('--dry-run', action='store_true', dest='dry_run',
+                    default=False,
+                    help='Show how the cleaned text would change, '
+                         'without changing anything.'),
+    )
+
+    def handle_noargs(self, **options):
+        self.verbosity = int(options.get('verbosity', 1))
+        self.dry_run = options['dry_run']
+        checkpoint_file = options['checkpoint']
+
+        checkpoint = {}
+        if not options['restart'] and not self.dry_run:
+            checkpoint = read_checkpoint(checkpoint_file)
+
+        if options['processes'] > 1:
+            # Each process needs its own database connection, so don't
+            # let them inherit ours.
+            for connection in connections.all():
+                connection.close()
+
+            pool = multiprocessing.Pool(options['processes'])
+            self.clean = lambda tasks: pool.map(clean_text, tasks)
+        else:
+            pool = None
+            self.clean = lambda tasks: map(clean_text, tasks)
+
+        try:
+            for model in (Article, BookReview):
+                name = model._meta.object_name
+                # Only fetch what we need - the text columns can be large.
+                # The search fields are needed to re-index changed rows
+                # (and include an article's description, for its teaser).
+                queryset = model._base_manager\
+                    .only('pk', 'issue', 'text', 'text_hash', 'cleaned_text',
+                          *[field for field, _, _ in SEARCH_FIELDS[model]])\
+                    .exclude(text__isnull=True).exclude(text=u'')
+
+                checked = changed = 0
+
+                for chunk in queryset_in_chunks(queryset,
+                                                options['chunk_size'],
+                                                checkpoint.get(name)):
+                    changed += self.process_chunk(model, chunk)
+                    checked += len(chunk)
+
+                    if not self.dry_run:
+                        checkpoint[name] = chunk[-1].pk
+                        write_checkpoint(checkpoint_file, checkpoint)
+
+                    if self.verbosity > 1:
+                        self.stdout.write(u'{0}: {1} rows done\n'.format(
+                            model._meta.verbose_name_plural, checked))
+
+                if self.verbosity > 0:
+                    self.stdout.write(
+                        u'{0} {1}: {2} checked, {3} {4}.\n'.format(
+                            u'Would clean' if self.dry_run else u'Cleaned',
+                            model._meta.verbose_name_plural, checked,
+                            changed,
+                            u'would change' if self.dry_run
+                            else u'changed'))
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        # Finished, so the next run should start from the beginning.
+        if not self.dry_run and os.path.exists(checkpoint_file):
+            os.remove(checkpoint_file)
+
+    def process_chunk(self, model, chunk):
+        """
+        Cleans the text of ``chunk`` and saves (or, for a dry run,
+        shows) whatever has changed. Returns the number of rows changed.
+        """
+        cleaned = dict(self.clean([(obj.pk, obj.text) for obj in chunk]))
+        changed = [obj for obj in chunk
+                   if cleaned[obj.pk] != obj.cleaned_text]
+
+        for obj in changed:
+            if self.dry_run:
+                self.show_diff(obj, cleaned[obj.pk])
+
+            obj.cleaned_text = cleaned[obj.pk]
+
+        if self.dry_run or not changed:
+            return len(changed)
+
+        saved = []
+
+        with transaction.commit_on_success():
+            for obj in changed:
+                # update() rather than save(), so that we don't touch
+                # the auto_now "updated" timestamp - and only if the
+                # text hasn't been changed since we read it, so that we
+                # don't save text cleaned from the old version.
+                if model._base_manager\
+                        .filter(pk=obj.pk, text_hash=obj.text_hash)\
+                        .update(cleaned_text=obj.cleaned_text,
+                                demoted_cleaned_text=demote_headings(
+                                    obj.cleaned_text),
+                                teaser_text=obj.build_teaser(),
+                                text_hash=hash_text(obj.text),
+                                sanitization_pending=False):
+                    saved.append(obj)
+
+            index_objects(saved)
+
+        # Author summaries cache the teasers, and article and book review
+        # pages' ETags include the cleaned text version.
+        if saved:
+            invalidate_author_summaries(sender=model)
+            bump_version(CLEANED_TEXT_VERSION_KEY)
+
+        return len(saved)
+
+    def show_diff(self, obj, cleaned_text):
+        label = u'{0} {1}'.format(obj._meta.verbose_name, obj.pk)
+        diff = difflib.unified_diff(
+            (obj.cleaned_text or u'').splitlines(),
+            cleaned_text.splitlines(),
+            fromfile=u'{0} (current)'.format(label),
+            tofile=u'{0} (re-cleaned)'.format(label), lineterm=u'')
+
+        for line in diff:
+            self.stdout.write(line + u'\n')
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding model 'SearchTerm'
+        db.create_table(u'magazine_searchterm', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('term', self.gf('django.db.models.fields.CharField')(max_length=50, db_index=True)),
+            ('weight', self.gf('django.db.models.fields.PositiveIntegerField')(default=1)),
+            ('in_body', self.gf('django.db.models.fields.BooleanField')(default=False)),
+            ('issue', self.gf('django.db.models.fields.related.ForeignKey')(to=orm['magazine.Issue'])),
+            ('article', self.gf('django.db.models.fields.related.ForeignKey')(blank=True, related_name='search_terms', null=True, to=orm['magazine.Article'])),
+            ('book_review', self.gf('django.db.models.fields.related.ForeignKey')(blank=True, related_name='search_terms', null=True, to=orm['magazine.BookReview'])),
+        ))
+        db.send_create_signal(u'magazine', ['SearchTerm'])
+
+
+    def backwards(self, orm):
+        # Deleting model 'SearchTerm'
+        db.delete_table(u'magazine_searchterm')
+
+
+    models = {
+        u'magazine.article': {
+            'Meta': {'ordering': "('-issue', 'order_in_issue')", 'object_name': 'Article'},
+            'authors': ('django.db.models.fields.related.ManyToManyField', [], {'to': u"orm['magazine.Author']", 'symmetrical': 'False'}),
+            'cleaned_text': ('django.db.models.fields.TextField', [], {'null': 'True', 'blank': 'True'}),
+            'demoted_cleaned_text': ('django.db.models.fields.TextField', [], {'null': 'True', 'blank': 'True'}),
+            'description': ('django.db.models.fields.TextField', [], {'null': 'True', 'blank': 'True'}),
+            'hits': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'image': ('sorl.thumbnail.fields.ImageField', [], {'max_length': '100', 'null': 'True', 'blank': 'True'}),
+            'issue': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['magazine.Issue']"}),
+            'order_in_issue': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'subheading': ('django.db.models.fields.CharField', [], {'max_length': '250', 'null': 'True', 'blank': 'True'}),
+            'teaser_text': ('django.db.models.fields.TextField', [], {'null': 'True', 'blank': 'True'}),
+            'text': ('django.db.models.fields.TextField', [], {'null': 'True', 'blank': 'True'}),
+            'title': ('django.db.models.fields.CharField', [], {'max_length': '250'}),
+            'updated': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime(2026, 10, 18, 0, 0)', 'auto_now': 'True', 'blank': 'True'})
+        },
+        u'magazine.author': {
+            'Meta': {'ordering': "('surname', 'forename')", 'object_name': 'Author'},
+            'details': ('django.db.models.fields.TextField', [], {'null': 'True', 'blank': 'True'}),
+            'forename': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'indexable': ('django.db.models.fields.BooleanField', [], {'default': 'True'}),
+            'surname': ('django.db.models.fields.CharField', [], {'max_length': '100', 'null': 'True', 'blank': 'True'})
+        },
+        u'magazine.bookreview': {
+            'Meta': {'ordering': "('-issue', 'order_in_issue')", 'object_name': 'BookReview'},
+            'authors': ('django.db.models.fields.related.ManyToManyField', [], {'to': u"orm['magazine.Author']", 'symmetrical': 'False'}),
+            'book_author': ('django.db.models.fields.CharField', [], {'max_length': '60', 'null': 'True', 'blank': 'True'}),
+            'cleaned_text': ('django.db.models.fields.TextField', [], {'null': 'True', 'blank': 'True'}),
+            'demoted_cleaned_text': ('django.db.models.fields.TextField', [], {'null': 'True', 'blank': 'True'}),
+            'hits': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'isbn': ('django.db.models.fields.CharField', [], {'max_length': '20', 'null': 'True', 'blank': 'True'}),
+            'issue': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['magazine.Issue']"}),
+            'num_pages': ('django.db.models.fields.PositiveIntegerField', [], {'null': 'True', 'blank': 'True'}),
+            'order_in_issue': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'price': ('django.db.models.fields.CharField', [], {'max_length': '250', 'null': 'True', 'blank': 'True'}),
+            'publication_date': ('django.db.models.fields.CharField', [], {'max_length': '20', 'null': 'True', 'blank': 'True'}),
+            'publisher': ('django.db.models.fields.CharField', [], {'max_length': '60', 'null': 'True', 'blank': 'True'}),
+            'publisher_location': ('django.db.models.fields.CharField', [], {'max_length': '60', 'null': 'True', 'blank': 'True'}),
+            'teaser_text': ('django.db.models.fields.TextField', [], {'null': 'True', 'blank': 'True'}),
+            'text': ('django.db.models.fields.TextField', [], {'null': 'True', 'blank': 'True'}),
+            'title': ('django.db.models.fields.CharField', [], {'max_length': '250'}),
+            'updated': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime(2026, 10, 18, 0, 0)', 'auto_now': 'True', 'blank': 'True'})
+        },
+        u'magazine.issue': {
+            'Meta': {'ordering': "('-issue_date',)", 'object_name': 'Issue'},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'issue_date': ('django.db.models.fields.DateField', [], {}),
+            'number': ('django.db.models.fields.PositiveIntegerField', [], {'unique': 'True'}),
+            'published': ('django.db.models.fields.BooleanField', [], {'default': 'True'})
+        },
+        u'magazine.searchterm': {
+            'Meta': {'object_name': 'SearchTerm'},
+            'article': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'search_terms'", 'null': 'True', 'to': u"orm['magazine.Article']"}),
+            'book_review': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'search_terms'", 'null': 'True', 'to': u"orm['magazine.BookReview']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'in_body': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'issue': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['magazine.Issue']"}),
+            'term': ('django.db.models.fields.CharField', [], {'max_length': '50', 'db_index': 'True'}),
+            'weight': ('django.db.models.fields.PositiveIntegerField', [], {'default': '1'})
+        }
+    }
+
+    complete_apps = ['magazine']
\ No newline at end of file
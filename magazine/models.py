@@ -1,32 +1,39 @@
-import calendar
-import re
 from datetime import date, datetime
 from django.conf import settings
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
-from django.db import models
-from django.db.models import F, Count
+from django.db import connections, models, transaction
+from django.db.models import Count, Q
+from django.db.models.query import QuerySet
+from django.db.models.sql.datastructures import EmptyResultSet
+from django.db.models.signals import (pre_save, post_save, pre_delete,
+                                      post_delete, m2m_changed)
 from django.utils.text import truncate_words
 from django.template.defaultfilters import striptags
 from sorl.thumbnail import ImageField, get_thumbnail
-from magazine.utils.word_cleaner import clean_word_text
+from magazine.author_summaries import invalidate_author_summaries
+from magazine.bylines import (invalidate_all_bylines,
+                              invalidate_bylines_for_authors_change)
+from magazine.embargo import (embargo_cutoff, get_embargo_policy,
+                              invalidate_unembargoed_issues)
+from magazine.hits import record_hit, get_pending_hits
+from magazine.utils.dates import (subtract_n_months,  # noqa
+                                  seconds_until_midnight)
+from magazine.utils.headings import demote_headings
+from magazine.utils.word_cleaner import clean_word_text, hash_text
 
 
 EMBARGO_TIME_IN_MONTHS = int(getattr(settings,
                                      'MAGAZINE_EMBARGO_TIME_IN_MONTHS', 2))
 
+CURRENT_ISSUE_CACHE_KEY = 'magazine_current_issue'
 
-def embargoed_by_date(issue):
-    today = date.today()
 
+def embargoed_by_date(issue):
     # Embargo this article if it's less than EMBARGO_TIME_IN_MONTHS
     # months old.
-    return subtract_n_months(today, EMBARGO_TIME_IN_MONTHS) < issue.issue_date
-
-
-class AuthorManager(models.Manager):
-    def get_query_set(self):
-        return super(AuthorManager, self).get_query_set()\
-            .annotate(num_articles=Count('article'))
+    return embargo_cutoff(date.today(),
+                          EMBARGO_TIME_IN_MONTHS) < issue.issue_date
 
 
 class Author(models.Model):
@@ -40,8 +47,15 @@ class Author(models.Model):
         default=True,
         help_text=(u'Deselect this for authors who shouldn\'t have their own '
                    u'page (e.g. "Anonymous")'))
-
-    objects = AuthorManager()
+    # Kept up to date when articles and book reviews are saved or
+    # deleted (see update_author_counts).
+    num_articles = models.PositiveIntegerField(default=0, db_index=True)
+    num_book_reviews = models.PositiveIntegerField(default=0,
+                                                   db_index=True)
+
+    objects = models.Manager()
+    # Authors used to be annotated with their article counts by default,
+    # and this was the way to avoid it.
     plain_objects = models.Manager()
 
     def __unicode__(self):
@@ -65,9 +79,6 @@ class Author(models.Model):
         return reverse('magazine_author_detail', args=[self.pk, ])
 
     def get_num_articles(self):
-        if not hasattr(self, 'num_articles'):
-            self.num_articles = self.article_set.count()
-
         return self.num_articles
     get_num_articles.short_description = u'Articles'
     get_num_articles.admin_order_field = 'num_articles'
@@ -76,38 +87,69 @@ class Author(models.Model):
         ordering = ('surname', 'forename',)
 
 
-def __days_in_month(year, month):
-    return calendar.monthrange(year, month)[1]
+class IssueQuerySet(QuerySet):
+    def __unembargoed_filter(self, today):
+        return Q(published=True, issue_date__lte=today) & \
+            get_embargo_policy().unembargoed_filter(today)
 
+    def with_embargo_status(self, today=None):
+        """
+        Annotates each issue with ``embargo_status`` - 1 if the issue is
+        embargoed, and 0 otherwise - computed by the database, so that
+        issues can be sorted by it.
+        """
+        if today is None:
+            today = date.today()
 
-def subtract_n_months(date_val, num_months):
-    # Split the number of months to subtract into months and years
-    year, month = divmod(num_months, 12)
+        unembargoed = self.model._base_manager\
+            .filter(self.__unembargoed_filter(today)).order_by().values('pk')
 
-    if date_val.month <= month:
-        year = date_val.year - year - 1
-        month = date_val.month - month + 12
-    else:
-        year = date_val.year - year
-        month = date_val.month - month
+        try:
+            sql, params = unembargoed.query.sql_with_params()
+        except EmptyResultSet:
+            # The filter can't match anything (e.g. an embargo policy's
+            # pk__in=[]), so every issue is embargoed.
+            return self.extra(select={'embargo_status': u'1'})
 
-    try:
-        return date(year, month, date_val.day)
-    except ValueError:
-        return date(year, month, __days_in_month(year, month))
+        qn = connections[self.db].ops.quote_name
+        status = u'CASE WHEN {0}.{1} IN ({2}) THEN 0 ELSE 1 END'.format(
+            qn(self.model._meta.db_table), qn(self.model._meta.pk.column),
+            sql)
 
+        return self.extra(select={'embargo_status': status},
+                          select_params=params)
 
-class PublishedIssueManager(models.Manager):
-    def get_query_set(self):
-        return super(PublishedIssueManager, self).get_query_set()\
-            .filter(issue_date__lte=date.today(), published=True)\
-            .annotate(num_articles=Count('article'))
+    def embargoed(self, today=None):
+        if today is None:
+            today = date.today()
+
+        return self.exclude(self.__unembargoed_filter(today))
+
+    def unembargoed(self, today=None):
+        if today is None:
+            today = date.today()
+
+        return self.filter(self.__unembargoed_filter(today))
 
 
 class IssueManager(models.Manager):
     def get_query_set(self):
-        return super(IssueManager, self).get_query_set()\
-            .annotate(num_articles=Count('article'))
+        return IssueQuerySet(self.model, using=self._db)
+
+    def with_embargo_status(self, today=None):
+        return self.get_query_set().with_embargo_status(today)
+
+    def embargoed(self, today=None):
+        return self.get_query_set().embargoed(today)
+
+    def unembargoed(self, today=None):
+        return self.get_query_set().unembargoed(today)
+
+
+class PublishedIssueManager(IssueManager):
+    def get_query_set(self):
+        return super(PublishedIssueManager, self).get_query_set()\
+            .filter(issue_date__lte=date.today(), published=True)
 
 
 class Issue(models.Model):
@@ -121,6 +163,11 @@ class Issue(models.Model):
         default=True,
         help_text=u'Uncheck to create an issue which is not yet published.'
     )
+    # Kept up to date when articles and book reviews are saved or
+    # deleted (see update_issue_counts).
+    num_articles = models.PositiveIntegerField(default=0)
+    num_book_reviews = models.PositiveIntegerField(default=0)
+
     objects = IssueManager()
     published_objects = PublishedIssueManager()
 
@@ -140,20 +187,27 @@ class Issue(models.Model):
         return self.issue_date <= date.today() and self.published
 
     def embargoed(self):
+        # Issues fetched with Issue.objects.with_embargo_status() already
+        # know whether they're embargoed.
+        if hasattr(self, 'embargo_status'):
+            return bool(self.embargo_status)
+
         if not self.is_published():
             return True
 
-        f = getattr(settings, 'MAGAZINE_IS_EMBARGOED_FUNCTION',
-                    embargoed_by_date)
-
-        return f(self)
+        return get_embargo_policy().is_embargoed(self)
 
     def get_absolute_url(self):
         return reverse('magazine_issue_detail', args=[self.number, ])
 
     @staticmethod
     def current_issue():
-        live_issues = Issue.published_objects.all()[:1]
+        live_issues = cache.get(CURRENT_ISSUE_CACHE_KEY)
+
+        if live_issues is None:
+            live_issues = list(Issue.published_objects.all()[:1])
+            cache.set(CURRENT_ISSUE_CACHE_KEY, live_issues,
+                      seconds_until_midnight())
 
         if not live_issues:
             return None
@@ -164,23 +218,70 @@ class Issue(models.Model):
         ordering = ('-issue_date',)
 
 
+def defer_sanitization():
+    return getattr(settings, 'MAGAZINE_DEFER_SANITIZATION', False)
+
+
+def prepare_text(obj):
+    """
+    Cleans the text of ``obj`` (an article or book review) if it has
+    changed since it was last cleaned, and populates the text derived
+    from it. If ``MAGAZINE_DEFER_SANITIZATION`` is ``True``, cleaning is
+    left to the sanitization queue instead, and ``True`` is returned.
+    """
+    deferred = False
+
+    if obj.text:
+        # Editors often re-save without touching the text, so only
+        # clean it if it's changed since it was last cleaned.
+        text_hash = hash_text(obj.text)
+
+        if text_hash != obj.text_hash:
+            stale = True
+        elif obj.sanitization_pending:
+            # Already queued, unless we've stopped deferring since.
+            stale = not defer_sanitization()
+        else:
+            stale = obj.cleaned_text is None
+
+        if stale and defer_sanitization():
+            obj.text_hash = text_hash
+            obj.sanitization_pending = True
+            deferred = True
+        elif stale:
+            obj.cleaned_text = clean_word_text(obj.text)
+            obj.text_hash = text_hash
+            obj.sanitization_pending = False
+            obj.demoted_cleaned_text = None
+    else:
+        obj.sanitization_pending = False
+
+    if obj.demoted_cleaned_text is None or not obj.text:
+        obj.demoted_cleaned_text = demote_headings(obj.cleaned_text or u'')
+    obj.teaser_text = obj.build_teaser()
+
+    return deferred
+
+
+# The full text of articles and book reviews, which listings (showing
+# only the teaser) don't need.
+BODY_FIELDS = ('text', 'cleaned_text', 'demoted_cleaned_text')
+
+
 class ArticleManager(models.Manager):
     def get_query_set(self):
         return super(ArticleManager, self).get_query_set()\
             .select_related(u'issue',)
 
+    def for_listing(self):
+        return self.get_query_set().defer(*BODY_FIELDS)
+
 
 class ArticleManagerWithNumAuthors(ArticleManager):
     def get_query_set(self):
         return super(ArticleManagerWithNumAuthors, self)\
             .get_query_set().annotate(num_authors=Count('authors'))
 
-heading_pattern = re.compile('<(/?)h(\d)>')
-
-
-def increment_heading_tag(match):
-    return '<{0}h{1}>'.format(match.group(1), int(match.group(2)) + 1)
-
 
 class Article(models.Model):
     title = models.CharField(max_length=250)
@@ -196,6 +297,23 @@ class Article(models.Model):
         blank=True, null=True,
         help_text=u'Auto-populated from the main body text, and cleaned up.'
     )
+    text_hash = models.CharField(
+        max_length=40, blank=True, null=True,
+        help_text=u'Auto-populated - the hash of the text last cleaned.'
+    )
+    sanitization_pending = models.BooleanField(
+        default=False,
+        help_text=u'Auto-populated - whether the text is waiting to be '
+                  u'cleaned up.'
+    )
+    demoted_cleaned_text = models.TextField(
+        blank=True, null=True,
+        help_text=u'Auto-populated from the cleaned text.'
+    )
+    teaser_text = models.TextField(
+        blank=True, null=True,
+        help_text=u'Auto-populated from the description or cleaned text.'
+    )
     hits = models.IntegerField(default=0)
     issue = models.ForeignKey(Issue)
     order_in_issue = models.PositiveIntegerField(default=0)
@@ -210,7 +328,12 @@ class Article(models.Model):
         return self.title
 
     def mark_visited(self):
-        Article.objects.filter(pk=self.pk).update(hits=F('hits') + 1)
+        record_hit(self)
+
+    def get_hits(self):
+        return self.hits + get_pending_hits(self)
+    get_hits.short_description = u'Hits'
+    get_hits.admin_order_field = 'hits'
 
     def all_authors(self):
         return self.authors.all()
@@ -224,11 +347,13 @@ class Article(models.Model):
     admin_thumbnail.allow_tags = True
 
     def save(self, *args, **kwargs):
-        if self.text:
-            self.cleaned_text = clean_word_text(self.text)
-        return super(Article, self).save(*args, **kwargs)
+        deferred = prepare_text(self)
+        super(Article, self).save(*args, **kwargs)
 
-    def teaser(self):
+        if deferred:
+            enqueue_sanitization(self)
+
+    def build_teaser(self):
         if self.description:
             return self.description
 
@@ -237,8 +362,21 @@ class Article(models.Model):
 
         return u'None available.'
 
+    def teaser(self):
+        if self.teaser_text is not None:
+            return self.teaser_text
+
+        # Not saved since teaser_text was added, and not yet
+        # regenerated (see the magazine_regenerate_teasers command).
+        return self.build_teaser()
+
     def demoted_text(self):
-        return heading_pattern.sub(increment_heading_tag, self.cleaned_text)
+        if self.demoted_cleaned_text is not None:
+            return self.demoted_cleaned_text
+
+        # Not saved since demoted_cleaned_text was added, and not yet
+        # backfilled (see the magazine_backfill_demoted_text command).
+        return demote_headings(self.cleaned_text or u'')
 
     def get_absolute_url(self):
         return reverse('magazine_article_detail',
@@ -253,6 +391,9 @@ class BookReviewManager(models.Manager):
         return super(BookReviewManager, self).get_query_set()\
             .select_related(u'issue', )
 
+    def for_listing(self):
+        return self.get_query_set().defer(*BODY_FIELDS)
+
 
 class BookReview(models.Model):
     title = models.CharField(max_length=250)
@@ -273,6 +414,23 @@ class BookReview(models.Model):
         blank=True, null=True,
         help_text=u'Auto-populated from the main body text, and cleaned up.'
     )
+    text_hash = models.CharField(
+        max_length=40, blank=True, null=True,
+        help_text=u'Auto-populated - the hash of the text last cleaned.'
+    )
+    sanitization_pending = models.BooleanField(
+        default=False,
+        help_text=u'Auto-populated - whether the text is waiting to be '
+                  u'cleaned up.'
+    )
+    demoted_cleaned_text = models.TextField(
+        blank=True, null=True,
+        help_text=u'Auto-populated from the cleaned text.'
+    )
+    teaser_text = models.TextField(
+        blank=True, null=True,
+        help_text=u'Auto-populated from the cleaned text.'
+    )
     hits = models.IntegerField(default=0)
     updated = models.DateTimeField(auto_now=True, default=datetime.now(),
                                    verbose_name=u'Last Updated')
@@ -286,24 +444,44 @@ class BookReview(models.Model):
         return self.title
 
     def mark_visited(self):
-        BookReview.objects.filter(pk=self.pk).update(hits=F('hits') + 1)
+        record_hit(self)
+
+    def get_hits(self):
+        return self.hits + get_pending_hits(self)
+    get_hits.short_description = u'Hits'
+    get_hits.admin_order_field = 'hits'
 
     def all_authors(self):
         return self.authors.all()
 
     def save(self, *args, **kwargs):
-        if self.text:
-            self.cleaned_text = clean_word_text(self.text)
-        return super(BookReview, self).save(*args, **kwargs)
+        deferred = prepare_text(self)
+        super(BookReview, self).save(*args, **kwargs)
 
-    def teaser(self):
+        if deferred:
+            enqueue_sanitization(self)
+
+    def build_teaser(self):
         if self.cleaned_text:
             return truncate_words(striptags(self.cleaned_text), 50)
 
         return u'None available.'
 
+    def teaser(self):
+        if self.teaser_text is not None:
+            return self.teaser_text
+
+        # Not saved since teaser_text was added, and not yet
+        # regenerated (see the magazine_regenerate_teasers command).
+        return self.build_teaser()
+
     def demoted_text(self):
-        return heading_pattern.sub(increment_heading_tag, self.cleaned_text)
+        if self.demoted_cleaned_text is not None:
+            return self.demoted_cleaned_text
+
+        # Not saved since demoted_cleaned_text was added, and not yet
+        # backfilled (see the magazine_backfill_demoted_text command).
+        return demote_headings(self.cleaned_text or u'')
 
     def get_absolute_url(self):
         return reverse('magazine_bookreview_detail',
@@ -311,3 +489,266 @@ class BookReview(models.Model):
 
     class Meta:
         ordering = ('-issue', 'order_in_issue',)
+
+
+class SearchTerm(models.Model):
+    """
+    An entry in the search index: a word which appears in an article or
+    book review, and how much weight it carries there (see
+    ``magazine.search``).
+    """
+    term = models.CharField(max_length=50, db_index=True)
+    weight = models.PositiveIntegerField(default=1)
+    # Whether the term comes from the body text, which isn't searchable
+    # by everyone while an issue is embargoed.
+    in_body = models.BooleanField(default=False)
+    issue = models.ForeignKey(Issue)
+    article = models.ForeignKey(Article, blank=True, null=True,
+                                related_name='search_terms')
+    book_review = models.ForeignKey(BookReview, blank=True, null=True,
+                                    related_name='search_terms')
+
+    def __unicode__(self):
+        return self.term
+
+
+class SanitizationJob(models.Model):
+    """
+    An article or book review whose text is waiting to be cleaned up
+    (see ``magazine.sanitization``).
+    """
+    article = models.ForeignKey(Article, blank=True, null=True,
+                                related_name='sanitization_jobs')
+    book_review = models.ForeignKey(BookReview, blank=True, null=True,
+                                    related_name='sanitization_jobs')
+    # The hash of the text to be cleaned - if the text has changed since
+    # the job was queued, there'll be a newer job for it.
+    text_hash = models.CharField(max_length=40)
+    created = models.DateTimeField(auto_now_add=True)
+    # When a worker started processing the job, if one has.
+    claimed = models.DateTimeField(blank=True, null=True)
+
+    def __unicode__(self):
+        return unicode(self.article or self.book_review)
+
+    class Meta:
+        ordering = ('pk',)
+
+
+def enqueue_sanitization(obj):
+    field = 'article' if isinstance(obj, Article) else 'book_review'
+    SanitizationJob.objects.create(text_hash=obj.text_hash, **{field: obj})
+
+
+def invalidate_current_issue(sender, **kwargs):
+    cache.delete(CURRENT_ISSUE_CACHE_KEY)
+
+
+post_save.connect(invalidate_unembargoed_issues, sender=Issue,
+                  dispatch_uid='magazine_unembargoed_issues_save')
+post_delete.connect(invalidate_unembargoed_issues, sender=Issue,
+                    dispatch_uid='magazine_unembargoed_issues_delete')
+
+for model in (Article, BookReview):
+    m2m_changed.connect(invalidate_bylines_for_authors_change,
+                        sender=model.authors.through,
+                        dispatch_uid='magazine_bylines_authors_changed')
+
+post_save.connect(invalidate_all_bylines, sender=Author,
+                  dispatch_uid='magazine_bylines_author_save')
+post_delete.connect(invalidate_all_bylines, sender=Author,
+                    dispatch_uid='magazine_bylines_author_delete')
+
+for model in (Issue, Article, BookReview):
+    post_save.connect(invalidate_author_summaries, sender=model,
+                      dispatch_uid='magazine_author_summaries_save')
+    post_delete.connect(invalidate_author_summaries, sender=model,
+                        dispatch_uid='magazine_author_summaries_delete')
+
+for model in (Article, BookReview):
+    m2m_changed.connect(invalidate_author_summaries,
+                        sender=model.authors.through,
+                        dispatch_uid='magazine_author_summaries_authors')
+
+
+def update_search_index(sender, instance, **kwargs):
+    from magazine.search import index_objects
+    index_objects([instance])
+
+
+for model in (Article, BookReview):
+    post_save.connect(update_search_index, sender=model,
+                      dispatch_uid='magazine_search_index')
+
+
+def _update_counts(model, counts, pks, using):
+    """
+    Sets each of the ``counts`` columns of the ``model`` rows with
+    primary keys ``pks`` (or every row) to the number of rows in another
+    table which refer to it. ``counts`` is a list of ``(column, table,
+    foreign key column)`` tuples.
+    """
+    if pks is not None and not pks:
+        return
+
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    pk = qn(model._meta.pk.column)
+
+    sql = u'UPDATE {0} SET {1}'.format(table, u', '.join(
+        u'{0} = (SELECT COUNT(*) FROM {1} WHERE {1}.{2} = {3}.{4})'.format(
+            qn(column), qn(other_table), qn(fk_column), table, pk)
+        for column, other_table, fk_column in counts))
+    cursor = connection.cursor()
+
+    if pks is None:
+        cursor.execute(sql)
+    else:
+        pks = list(pks)
+
+        # Some databases limit the number of parameters in a query.
+        for start in xrange(0, len(pks), 500):
+            chunk = pks[start:start + 500]
+            cursor.execute(u'{0} WHERE {1} IN ({2})'.format(
+                sql, pk, u', '.join([u'%s'] * len(chunk))), chunk)
+
+    transaction.commit_unless_managed(using=using)
+
+
+def update_author_counts(author_pks=None, using='default'):
+    """
+    Recounts the articles and book reviews by the authors with primary
+    keys ``author_pks`` (or by every author).
+    """
+    counts = []
+    for column, model in (('num_articles', Article),
+                          ('num_book_reviews', BookReview)):
+        field = model._meta.get_field('authors')
+        counts.append((column, field.m2m_db_table(),
+                       field.m2m_reverse_name()))
+
+    _update_counts(Author, counts, author_pks, using)
+
+
+def update_author_counts_for_authors_change(sender, instance, action,
+                                            reverse, pk_set, using,
+                                            **kwargs):
+    if reverse:
+        # Articles or book reviews added to (or removed from) an author.
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            update_author_counts([instance.pk], using)
+        return
+
+    if action == 'pre_clear':
+        # We won't be able to tell who the authors were afterwards.
+        instance._magazine_cleared_authors = list(
+            instance.authors.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        update_author_counts(
+            getattr(instance, '_magazine_cleared_authors', None), using)
+    elif action in ('post_add', 'post_remove'):
+        update_author_counts(pk_set, using)
+
+
+def remember_authors_before_delete(sender, instance, **kwargs):
+    # Deleting an article doesn't send m2m_changed for its authors.
+    instance._magazine_deleted_authors = list(
+        instance.authors.values_list('pk', flat=True))
+
+
+def update_author_counts_after_delete(sender, instance, using, **kwargs):
+    update_author_counts(
+        getattr(instance, '_magazine_deleted_authors', None), using)
+
+
+for model in (Article, BookReview):
+    m2m_changed.connect(update_author_counts_for_authors_change,
+                        sender=model.authors.through,
+                        dispatch_uid='magazine_author_counts_changed')
+    pre_delete.connect(remember_authors_before_delete, sender=model,
+                       dispatch_uid='magazine_author_counts_pre_delete')
+    post_delete.connect(update_author_counts_after_delete, sender=model,
+                        dispatch_uid='magazine_author_counts_delete')
+
+
+def update_issue_counts(issue_pks=None, using='default'):
+    """
+    Recounts the articles and book reviews in the issues with primary
+    keys ``issue_pks`` (or in every issue).
+    """
+    counts = []
+    for column, model in (('num_articles', Article),
+                          ('num_book_reviews', BookReview)):
+        counts.append((column, model._meta.db_table,
+                       model._meta.get_field('issue').column))
+
+    _update_counts(Issue, counts, issue_pks, using)
+
+    from magazine.archive import invalidate_archive_for_issues
+    invalidate_archive_for_issues(issue_pks)
+
+
+def remember_issue_before_save(sender, instance, using, **kwargs):
+    # So that we can recount the issue an article is moved out of.
+    previous = list(sender._base_manager.using(using)
+                    .filter(pk=instance.pk).values_list('issue', flat=True))
+    instance._magazine_saved_issue = previous[0] if previous else None
+
+
+def update_issue_counts_after_save(sender, instance, created, using,
+                                   **kwargs):
+    previous = getattr(instance, '_magazine_saved_issue', None)
+
+    if created or previous != instance.issue_id:
+        update_issue_counts(set([instance.issue_id, previous]) -
+                            set([None]), using)
+
+
+def update_issue_counts_after_delete(sender, instance, using, **kwargs):
+    update_issue_counts([instance.issue_id], using)
+
+
+def remember_issue_date_before_save(sender, instance, using, **kwargs):
+    previous = list(sender._base_manager.using(using)
+                    .filter(pk=instance.pk).values_list('issue_date',
+                                                        flat=True))
+    instance._magazine_saved_issue_date = previous[0] if previous else None
+
+
+def recount_issue_after_save(sender, instance, using, **kwargs):
+    # The counts saved with an issue may have been out of date by the
+    # time it was saved.
+    update_issue_counts([instance.pk], using)
+
+
+def invalidate_archive_for_issue_change(sender, instance, **kwargs):
+    from magazine.archive import invalidate_archive_for_issue_change
+    invalidate_archive_for_issue_change(sender, instance, **kwargs)
+
+
+for model in (Article, BookReview):
+    pre_save.connect(remember_issue_before_save, sender=model,
+                     dispatch_uid='magazine_issue_counts_pre_save')
+    post_save.connect(update_issue_counts_after_save, sender=model,
+                      dispatch_uid='magazine_issue_counts_save')
+    post_delete.connect(update_issue_counts_after_delete, sender=model,
+                        dispatch_uid='magazine_issue_counts_delete')
+
+pre_save.connect(remember_issue_date_before_save, sender=Issue,
+                 dispatch_uid='magazine_archive_issue_pre_save')
+post_save.connect(recount_issue_after_save, sender=Issue,
+                  dispatch_uid='magazine_issue_counts_issue_save')
+post_save.connect(invalidate_archive_for_issue_change, sender=Issue,
+                  dispatch_uid='magazine_archive_issue_save')
+post_delete.connect(invalidate_archive_for_issue_change, sender=Issue,
+                    dispatch_uid='magazine_archive_issue_delete')
+
+# Articles and book reviews are included since the cached issue carries
+# their counts - so these are connected after the receivers which update
+# those, or a page rendered in between could cache the old counts again.
+for model in (Issue, Article, BookReview):
+    post_save.connect(invalidate_current_issue, sender=model,
+                      dispatch_uid='magazine_current_issue_save')
+    post_delete.connect(invalidate_current_issue, sender=model,
+                        dispatch_uid='magazine_current_issue_delete')
@@ -0,0 +1,282 @@
+"""
+Pagination helpers for long listings.
+
+``page_window`` trims a paginator's page range to the pages around the
+current one, so the paginator doesn't print a link for every page.
+
+Cursor (or "keyset") pagination is an alternative to paginating with
+``OFFSET``, whose cost grows with the offset (the database has to read
+and discard every row before the page), and which needs a ``COUNT(*)``
+to know how many pages there are. Instead, each page starts after (or
+before) the sort key of the last (or first) row of the previous page,
+so every page costs the same. The price is that pages aren't numbered:
+you can only go forwards or backwards a page at a time.
+"""
+import base64
+import json
+import operator
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+
+
+def cursor_pagination_enabled():
+    return getattr(settings, 'MAGAZINE_CURSOR_PAGINATION', False)
+
+
+def page_window(page, size=2):
+    """
+    Returns the page numbers to link to from ``page``: the first and
+    last pages, and ``size`` pages either side of ``page``, with
+    ``None`` wherever pages have been left out.
+    """
+    num_pages = page.paginator.num_pages
+    first = max(1, page.number - size)
+    last = min(num_pages, page.number + size)
+
+    pages = range(first, last + 1)
+
+    if first > 2:
+        pages = [1, None] + pages
+    elif first == 2:
+        pages = [1] + pages
+
+    if last < num_pages - 1:
+        pages = pages + [None, num_pages]
+    elif last == num_pages - 1:
+        pages = pages + [num_pages]
+
+    return pages
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(
+        json.dumps(values, cls=DjangoJSONEncoder)).rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Returns the sort key values encoded in ``cursor``, or ``None`` if it
+    isn't a valid cursor.
+    """
+    try:
+        cursor = str(cursor)
+        values = json.loads(base64.urlsafe_b64decode(
+            cursor + '=' * (-len(cursor) % 4)))
+    except (TypeError, ValueError, UnicodeEncodeError):
+        return None
+
+    if not isinstance(values, list):
+        return None
+
+    return values
+
+
+def get_sort_key(obj, ordering):
+    """
+    Returns the values of ``obj``'s ``ordering`` fields, following
+    relations (e.g. ``issue__issue_date``).
+    """
+    values = []
+
+    for field in ordering:
+        value = obj
+        for name in field.lstrip('-').split('__'):
+            value = getattr(value, name)
+        values.append(value)
+
+    return values
+
+
+def get_field(model, field):
+    """
+    Returns the model field for ``field`` (which may span relations).
+    """
+    names = field.lstrip('-').split('__')
+
+    for name in names[:-1]:
+        model = model._meta.get_field(name).rel.to
+
+    if names[-1] == 'pk':
+        return model._meta.pk
+
+    return model._meta.get_field(names[-1])
+
+
+def is_nullable(model, field):
+    """
+    Returns whether ``field`` (which may span relations) can be NULL.
+    """
+    return get_field(model, field).null
+
+
+def coerce_cursor(model, ordering, values):
+    """
+    Returns the sort key ``values`` from a cursor converted to the types
+    of the ``ordering`` fields, or ``None`` if they can't be (since
+    cursors come from the query string, they could be anything).
+    """
+    if len(values) != len(ordering):
+        return None
+
+    coerced = []
+
+    for field, value in zip(ordering, values):
+        if value is None:
+            coerced.append(None)
+            continue
+
+        try:
+            coerced.append(get_field(model, field).to_python(value))
+        except (ValidationError, TypeError, ValueError):
+            return None
+
+    return coerced
+
+
+def order_for_cursor(queryset, ordering, reverse=False):
+    """
+    Orders ``queryset`` by ``ordering``, putting NULLs first (or last,
+    if ``reverse``) whatever the database, so that ``cursor_filter``
+    can rely on where they are.
+    """
+    qn = connections[queryset.db].ops.quote_name
+    order_by = []
+    null_flags = {}
+
+    for field in ordering:
+        descending = field.startswith('-')
+
+        if is_nullable(queryset.model, field):
+            if '__' in field:
+                raise ValueError(u'Nullable cursor fields on related '
+                                 u'models aren\'t supported.')
+
+            column = queryset.model._meta.get_field(field.lstrip('-')).column
+            flag = 'magazine_{0}_is_null'.format(column)
+            null_flags[flag] = u'CASE WHEN {0}.{1} IS NULL THEN 1 ELSE 0 ' \
+                u'END'.format(qn(queryset.model._meta.db_table), qn(column))
+            order_by.append(flag if reverse else '-' + flag)
+
+        if descending == reverse:
+            order_by.append(field.lstrip('-'))
+        else:
+            order_by.append('-' + field.lstrip('-'))
+
+    if null_flags:
+        queryset = queryset.extra(select=null_flags)
+
+    return queryset.order_by(*order_by)
+
+
+def cursor_filter(model, ordering, values, reverse=False):
+    """
+    Returns a ``Q`` matching the ``model`` rows after (or, if
+    ``reverse``, before) the row with sort key ``values`` in
+    ``ordering``, as ordered by ``order_for_cursor``.
+    """
+    alternatives = []
+    equal = Q()
+
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        descending = field.startswith('-') != reverse
+
+        if value is None:
+            # NULLs come first, so everything else is after them (and
+            # only other NULLs can be before them).
+            if not reverse:
+                alternatives.append(equal & Q(**{name + '__isnull': False}))
+            equal = equal & Q(**{name + '__isnull': True})
+            continue
+
+        after = Q(**{name + ('__lt' if descending else '__gt'): value})
+
+        # Going backwards, NULLs come after everything else.
+        if reverse and is_nullable(model, field):
+            after = after | Q(**{name + '__isnull': True})
+
+        alternatives.append(equal & after)
+        equal = equal & Q(**{name: value})
+
+    return reduce(operator.or_, alternatives)
+
+
+class CursorPage(object):
+    """
+    A page of results paginated by cursor, with the cursors for the
+    pages either side of it.
+    """
+    def __init__(self, object_list, ordering, has_next, has_previous):
+        self.object_list = object_list
+        self.ordering = ordering
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def next_cursor(self):
+        if self._has_next:
+            return encode_cursor(get_sort_key(self.object_list[-1],
+                                              self.ordering))
+
+    def previous_cursor(self):
+        if self._has_previous:
+            return encode_cursor(get_sort_key(self.object_list[0],
+                                              self.ordering))
+
+
+def paginate_by_cursor(queryset, ordering, page_size, after=None,
+                       before=None):
+    """
+    Returns the ``CursorPage`` of ``page_size`` rows of ``queryset``,
+    ordered by ``ordering`` (which should end with a unique field, like
+    ``pk``), after the cursor ``after`` or before the cursor ``before``.
+    With neither, returns the first page.
+    """
+    reverse = False
+    values = None
+
+    if before is not None:
+        values = decode_cursor(before)
+        reverse = values is not None
+    elif after is not None:
+        values = decode_cursor(after)
+
+    if values is not None:
+        values = coerce_cursor(queryset.model, ordering, values)
+        reverse = reverse and values is not None
+
+    page_qs = order_for_cursor(queryset, ordering, reverse)
+
+    if values is not None:
+        page_qs = page_qs.filter(
+            cursor_filter(queryset.model, ordering, values, reverse))
+
+    # One extra row tells us whether there's another page.
+    object_list = list(page_qs[:page_size + 1])
+    has_more = len(object_list) > page_size
+    object_list = object_list[:page_size]
+
+    if reverse:
+        object_list.reverse()
+        return CursorPage(object_list, ordering, has_next=True,
+                          has_previous=has_more)
+
+    return CursorPage(object_list, ordering, has_next=has_more,
+                      has_previous=values is not None)
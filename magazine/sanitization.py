@@ -0,0 +1,134 @@
+"""
+Deferred cleaning of article and book review text.
+
+Cleaning up text pasted from Microsoft Word can take seconds for big
+documents. If ``MAGAZINE_DEFER_SANITIZATION`` is ``True``, saving an
+article or book review whose text has changed doesn't clean it -
+instead it's flagged with ``sanitization_pending``, and a
+``SanitizationJob`` is queued in the database, to be processed by the
+``magazine_process_sanitization_queue`` management command.
+
+Until its job has been processed, an object keeps the cleaned text from
+before the change (if any), which is what the templates show.
+
+Several workers can process the queue at once: each job is claimed by
+the first to mark it as ``claimed``, and the others skip it. A job whose
+worker died is claimed again once ``MAGAZINE_SANITIZATION_CLAIM_TIMEOUT``
+seconds (by default, an hour) have passed.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from magazine.author_summaries import invalidate_author_summaries
+from magazine.models import SanitizationJob
+from magazine.search import index_objects
+from magazine.utils.headings import demote_headings
+from magazine.utils.word_cleaner import clean_word_text, hash_text
+
+
+def get_claim_expiry():
+    """
+    Returns the time before which claimed jobs are assumed to have been
+    abandoned.
+    """
+    timeout = getattr(settings, 'MAGAZINE_SANITIZATION_CLAIM_TIMEOUT', 3600)
+    return timezone.now() - timedelta(seconds=timeout)
+
+
+def claim_job(job):
+    """
+    Marks ``job`` as claimed, unless another worker has claimed it since
+    it was read. Returns ``True`` if this worker now has the job.
+    """
+    claimed = timezone.now()
+
+    # The update only matches if the job is still as we read it, so of
+    # several workers racing for it, only one updates the row.
+    if SanitizationJob.objects.filter(pk=job.pk, claimed=job.claimed)\
+            .update(claimed=claimed) == 0:
+        return False
+
+    job.claimed = claimed
+    return True
+
+
+def get_unclaimed_jobs():
+    """
+    Returns the jobs which no worker is processing, oldest first.
+    """
+    return SanitizationJob.objects\
+        .filter(Q(claimed__isnull=True) | Q(claimed__lt=get_claim_expiry()))\
+        .select_related('article', 'book_review')
+
+
+def process_job(job):
+    """
+    Claims ``job``, cleans its text, and removes it from the queue.
+    Returns ``True`` if the cleaned text was saved, or ``False`` if
+    another worker had claimed the job, or it was out of date (because
+    the text has changed again since it was queued, or the object has
+    been deleted).
+    """
+    if not claim_job(job):
+        return False
+
+    return process_claimed_job(job)
+
+
+def process_claimed_job(job):
+    """
+    Does the work of ``process_job()``, for a job which this worker has
+    already claimed.
+    """
+    obj = job.article or job.book_review
+    saved = False
+
+    if obj is not None and hash_text(obj.text) == job.text_hash:
+        obj.cleaned_text = clean_word_text(obj.text)
+        obj.demoted_cleaned_text = demote_headings(obj.cleaned_text)
+        obj.teaser_text = obj.build_teaser()
+        obj.sanitization_pending = False
+        obj.updated = timezone.now()
+
+        # An update() rather than save(), so that we don't overwrite
+        # the text if it's been changed while we were cleaning it.
+        saved = obj.__class__._base_manager\
+            .filter(pk=obj.pk, text_hash=job.text_hash)\
+            .update(cleaned_text=obj.cleaned_text,
+                    demoted_cleaned_text=obj.demoted_cleaned_text,
+                    teaser_text=obj.teaser_text,
+                    sanitization_pending=False,
+                    updated=obj.updated) > 0
+
+        if saved:
+            index_objects([obj])
+            # Author summaries cache the teasers, and update() doesn't
+            # send the signals which would invalidate them.
+            invalidate_author_summaries(sender=obj.__class__)
+
+    job.delete()
+    return saved
+
+
+def process_queue(limit=None):
+    """
+    Processes queued jobs, oldest first, until the queue is empty or
+    ``limit`` jobs have been processed. Returns the number of jobs
+    processed.
+    """
+    processed = 0
+
+    while limit is None or processed < limit:
+        try:
+            job = get_unclaimed_jobs()[0]
+        except IndexError:
+            break
+
+        # If another worker claimed it first, it won't be returned by
+        # get_unclaimed_jobs() again.
+        if claim_job(job):
+            process_claimed_job(job)
+            processed += 1
+
+    return processed
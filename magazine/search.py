@@ -0,0 +1,190 @@
+"""
+Full-text search over articles and book reviews.
+
+Searches are answered from an inverted index (the ``SearchTerm`` model)
+rather than by scanning article text: each article and book review has
+a row for every distinct word in its searchable fields, weighted by
+where (and how often) the word appears. An object's rows are replaced
+whenever it is saved, so the index is kept up to date incrementally -
+the ``magazine_rebuild_search_index`` command is only needed to index
+articles and book reviews which existed before search was added.
+
+Results are ranked by the total weight of the terms searched for, and
+only objects containing every term are returned. Searches by non-staff
+users only match articles and book reviews in published issues, and
+don't match the body text of embargoed articles (which they can't
+read).
+"""
+import re
+from datetime import date
+from django.db.models import Count, Q, Sum
+from django.utils.html import strip_tags
+from magazine.embargo import get_embargo_policy
+from magazine.models import Article, BookReview, Issue, SearchTerm
+
+
+# (field, weight, whether it is body text) for each searchable model.
+SEARCH_FIELDS = {
+    Article: (('title', 10, False),
+              ('subheading', 5, False),
+              ('description', 3, False),
+              ('cleaned_text', 1, True),),
+    BookReview: (('title', 10, False),
+                 ('book_author', 5, False),
+                 ('cleaned_text', 1, True),),
+}
+
+# The SearchTerm foreign key for each searchable model.
+SEARCH_TERM_FIELDS = {
+    Article: 'article',
+    BookReview: 'book_review',
+}
+
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = SearchTerm._meta.get_field('term').max_length
+
+STOP_WORDS = frozenset([
+    u'an', u'and', u'are', u'as', u'at', u'be', u'but', u'by', u'for',
+    u'if', u'in', u'into', u'is', u'it', u'no', u'not', u'of', u'on',
+    u'or', u'such', u'that', u'the', u'their', u'then', u'there',
+    u'these', u'they', u'this', u'to', u'was', u'will', u'with',
+])
+
+word_pattern = re.compile(r'\w+', re.UNICODE)
+entity_pattern = re.compile(r'&#?\w+;')
+
+
+def tokenize(text):
+    """
+    Returns the search terms in ``text`` (which may be HTML), in order.
+    """
+    if not text:
+        return []
+
+    text = entity_pattern.sub(u' ', strip_tags(text)).lower()
+
+    return [word[:MAX_TERM_LENGTH] for word in word_pattern.findall(text)
+            if len(word) >= MIN_TERM_LENGTH and word not in STOP_WORDS]
+
+
+def get_term_weights(obj):
+    """
+    Returns a dictionary mapping ``(term, in_body)`` to its weight in
+    ``obj`` (an article or book review).
+    """
+    weights = {}
+
+    # Not SEARCH_FIELDS[obj.__class__], since obj may be deferred.
+    fields = [fields for model, fields in SEARCH_FIELDS.items()
+              if isinstance(obj, model)][0]
+
+    for field, weight, in_body in fields:
+        for term in tokenize(getattr(obj, field)):
+            key = (term, in_body)
+            weights[key] = weights.get(key, 0) + weight
+
+    return weights
+
+
+def index_objects(objects):
+    """
+    Replaces the search index entries for ``objects`` (articles and/or
+    book reviews).
+    """
+    for model, fk in SEARCH_TERM_FIELDS.items():
+        instances = [obj for obj in objects if isinstance(obj, model)]
+
+        if not instances:
+            continue
+
+        SearchTerm.objects.filter(**{
+            fk + '__in': [obj.pk for obj in instances]}).delete()
+
+        terms = []
+        for obj in instances:
+            for (term, in_body), weight in get_term_weights(obj).items():
+                terms.append(SearchTerm(term=term, weight=weight,
+                                        in_body=in_body,
+                                        issue_id=obj.issue_id,
+                                        **{fk + '_id': obj.pk}))
+
+        SearchTerm.objects.bulk_create(terms)
+
+
+def search(query, include_unpublished=False):
+    """
+    Returns a queryset of dictionaries, with keys ``article``,
+    ``book_review`` (one of which is ``None``) and ``score``, for the
+    articles and book reviews matching every term in ``query``, best
+    match first.
+
+    Unpublished issues, and body text from embargoed issues, are only
+    searched if ``include_unpublished`` is ``True``.
+    """
+    terms = set(tokenize(query))
+    queryset = SearchTerm.objects.filter(term__in=terms)
+
+    if not terms:
+        queryset = queryset.none()
+
+    if not include_unpublished:
+        today = date.today()
+        published = Issue._base_manager.filter(published=True,
+                                               issue_date__lte=today)
+        unembargoed = published.filter(
+            get_embargo_policy().unembargoed_filter(today))
+
+        queryset = queryset.filter(issue__in=published.values('pk'))\
+            .filter(Q(in_body=False) |
+                    Q(issue__in=unembargoed.values('pk')))
+
+    return queryset.values('article', 'book_review')\
+        .annotate(score=Sum('weight'),
+                  num_terms=Count('term', distinct=True))\
+        .filter(num_terms=len(terms))\
+        .order_by('-score', 'article', 'book_review')
+
+
+def objects_with_prefix(model, prefix):
+    """
+    Returns a queryset of the primary keys of the ``model`` objects
+    (articles or book reviews) with a search term starting with
+    ``prefix``, for use as a subquery.
+    """
+    prefix = prefix.lower()[:MAX_TERM_LENGTH]
+
+    # A range rather than LIKE 'prefix%', so that the index on term can
+    # be used on every database.
+    return SearchTerm.objects\
+        .filter(term__gte=prefix, term__lt=prefix + u'\uffff')\
+        .values(SEARCH_TERM_FIELDS[model])
+
+
+def get_result_objects(results):
+    """
+    Returns the articles and book reviews for a list of ``search``
+    results, in the same order, each with a ``search_score`` attribute.
+    """
+    results = list(results)
+    articles = Article.objects.for_listing().in_bulk(
+        [result['article'] for result in results if result['article']])
+    book_reviews = BookReview.objects.for_listing().in_bulk(
+        [result['book_review'] for result in results
+         if result['book_review']])
+
+    objects = []
+
+    for result in results:
+        if result['article']:
+            obj = articles.get(result['article'])
+        else:
+            obj = book_reviews.get(result['book_review'])
+
+        # Deleted since the search was run.
+        if obj is None:
+            continue
+
+        obj.search_score = result['score']
+        objects.append(obj)
+
+    return objects
@@ -0,0 +1,4 @@
+-- Composite indexes matching the hot queries (see docs/models.rst). These
+-- are also created by migration 0023 for databases managed by South.
+CREATE INDEX magazine_author_indexable_name ON magazine_author (indexable, surname, forename);
+CREATE INDEX magazine_author_indexable_num_articles ON magazine_author (indexable, num_articles);
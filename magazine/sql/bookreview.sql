@@ -0,0 +1,3 @@
+-- Composite indexes matching the hot queries (see docs/models.rst). These
+-- are also created by migration 0023 for databases managed by South.
+CREATE INDEX magazine_bookreview_issue_order ON magazine_bookreview (issue_id, order_in_issue);
@@ -0,0 +1,3 @@
+-- Composite indexes matching the hot queries (see docs/models.rst). These
+-- are also created by migration 0023 for databases managed by South.
+CREATE INDEX magazine_issue_published_issue_date ON magazine_issue (published, issue_date);
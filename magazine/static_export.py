@@ -0,0 +1,131 @@
+"""
+Static export of the published archive.
+
+Pages are rendered by the magazine's own views, as an anonymous user,
+so exported pages follow exactly the same publication and embargo rules
+as the live site. Each page is fetched as a conditional GET using the
+ETag recorded in the export's manifest the last time it was written, so
+pages whose content hasn't changed since are skipped without being
+rendered.
+
+Paginated listings (an author's articles and book reviews, and the
+author index) aren't exported, since their pages are distinguished only
+by query string - leave those to Django. The issue list is exported
+unpaginated, with every year on one page.
+"""
+import json
+import os
+from datetime import date
+from django.contrib.auth.models import AnonymousUser
+from django.core.urlresolvers import resolve, reverse
+from django.test.client import RequestFactory
+from magazine.models import Article, Author, BookReview, Issue
+
+
+MANIFEST_NAME = '.magazine-manifest.json'
+
+# Set on requests made by the exporter, so that they don't count hits.
+EXPORT_REQUEST_ATTRIBUTE = 'magazine_static_export'
+
+
+def get_export_paths():
+    """
+    Returns the paths of every published page which should be exported.
+    """
+    today = date.today()
+    paths = [reverse('magazine_index'), reverse('magazine_issues')]
+
+    for number in Issue.published_objects.values_list('number', flat=True):
+        paths.append(reverse('magazine_issue_detail', args=[number]))
+
+    for model, url_name in ((Article, 'magazine_article_detail'),
+                            (BookReview, 'magazine_bookreview_detail')):
+        published = model._base_manager.filter(issue__published=True,
+                                               issue__issue_date__lte=today)
+
+        for pk, number in published.values_list('pk', 'issue__number'):
+            paths.append(reverse(url_name, args=[number, pk]))
+
+    authors = set(Author._base_manager.filter(
+        indexable=True,
+        article__issue__published=True,
+        article__issue__issue_date__lte=today).values_list('pk', flat=True))
+    authors.update(Author._base_manager.filter(
+        indexable=True,
+        bookreview__issue__published=True,
+        bookreview__issue__issue_date__lte=today).values_list('pk', flat=True))
+
+    for pk in sorted(authors):
+        paths.append(reverse('magazine_author_detail', args=[pk]))
+
+    return paths
+
+
+def get_output_filename(output_dir, path):
+    parts = [part for part in path.split('/') if part]
+    return os.path.join(output_dir, *(parts + ['index.html']))
+
+
+def read_manifest(output_dir):
+    """
+    Returns the ETags of the pages written by the last export to
+    ``output_dir``, keyed by path.
+    """
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME)) as manifest:
+            return json.load(manifest)
+    except (IOError, ValueError):
+        return {}
+
+
+def write_manifest(output_dir, manifest):
+    filename = os.path.join(output_dir, MANIFEST_NAME)
+
+    with open(filename + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+    os.rename(filename + '.tmp', filename)
+
+
+def export_page(task):
+    """
+    Renders the page at ``path`` into ``output_dir``, unless its ETag is
+    still ``etag``.
+
+    Takes a single ``(output_dir, path, etag)`` tuple, so that it can be
+    used with ``multiprocessing.Pool.imap_unordered``, and returns a
+    ``(path, status_code, etag)`` tuple.
+    """
+    output_dir, path, etag = task
+
+    headers = {}
+    if etag:
+        headers['HTTP_IF_NONE_MATCH'] = etag
+
+    request = RequestFactory().get(path, **headers)
+    request.user = AnonymousUser()
+    setattr(request, EXPORT_REQUEST_ATTRIBUTE, True)
+
+    match = resolve(path)
+    response = match.func(request, *match.args, **match.kwargs)
+
+    if hasattr(response, 'render') and not response.is_rendered:
+        response.render()
+
+    if response.status_code == 200:
+        filename = get_output_filename(output_dir, path)
+
+        if not os.path.isdir(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+
+        with open(filename, 'wb') as f:
+            f.write(response.content)
+
+    return path, response.status_code, response.get('ETag')
+
+
+def remove_page(output_dir, path):
+    try:
+        os.remove(get_output_filename(output_dir, path))
+    except OSError:
+        pass
@@ -2,10 +2,19 @@
 
 from magazine.tests.articles import ArticleTestCase
 from magazine.tests.authors import AuthorTestCase
+from magazine.tests.bylines import BylineTestCase
 from magazine.tests.filters import (
     MagazineFiltersTestCase,
     MagazineTagsTestCase)
+from magazine.tests.hits import HitBufferTestCase
 from magazine.tests.html_sanitizer import HTMLSanitizerTestCase
-from magazine.tests.issues import IssueTestCase, NoIssuesTestCase
+from magazine.tests.indexes import QueryPlanTestCase
+from magazine.tests.issues import (IssueArchiveTestCase, IssueTestCase,
+                                   NoIssuesTestCase)
+from magazine.tests.pagination import PaginationTestCase
+from magazine.tests.query_budgets import QueryBudgetTestCase
+from magazine.tests.sanitization import SanitizationQueueTestCase
+from magazine.tests.search import SearchTestCase
+from magazine.tests.static_export import StaticExportTestCase
 from magazine.tests.utils import SubtractNMonthsTestCase
 from magazine.tests.views import MagazineGeneralViewsTestCase
@@ -1,7 +1,16 @@
+import json
+import os
+import shutil
+import tempfile
+from StringIO import StringIO
+from django.core.management import call_command
 from django.core.urlresolvers import reverse
 from django.test import TestCase
+from magazine.management.commands import magazine_resanitize as resanitize
 from magazine.models import Article, Author
+from magazine.search import search
 from magazine.tests.test_utils import initialise_article_text
+from magazine.utils.word_cleaner import hash_text
 
 
 class ArticleTestCase(TestCase):
@@ -45,6 +54,210 @@ class ArticleTestCase(TestCase):
                          'dolor in reprehenderit in voluptate ...')
         self.assertEqual(self.article_3.teaser(), u'None available.')
 
+    def testDemotedText(self):
+        article = Article.objects.get(pk=5)
+        self.assertTrue(article.demoted_cleaned_text.startswith(
+            u'<h2>Heading 1</h2>'))
+        self.assertEqual(article.demoted_text(), article.demoted_cleaned_text)
+        self.assertEqual(self.article_1.demoted_text(), u'')
+
+    def testBackfillDemotedText(self):
+        Article.objects.update(demoted_cleaned_text=None)
+        updated = Article.objects.get(pk=5).updated
+
+        # Rows which haven't been backfilled yet still render correctly
+        self.assertTrue(Article.objects.get(pk=5).demoted_text().startswith(
+            u'<h2>Heading 1</h2>'))
+
+        call_command('magazine_backfill_demoted_text', verbosity=0,
+                     chunk_size=2)
+
+        article = Article.objects.get(pk=5)
+        self.assertTrue(article.demoted_cleaned_text.startswith(
+            u'<h2>Heading 1</h2>'))
+        self.assertEqual(article.updated, updated)
+        self.assertEqual(Article.objects.filter(
+            demoted_cleaned_text__isnull=True).count(), 0)
+
+    def testStoredTeaser(self):
+        # Fixtures don't call save(), and initialise_article_text only
+        # saves articles with text.
+        self.article_1.save()
+        self.article_3.save()
+
+        self.assertEqual(self.article_1.teaser_text,
+                         u'Witty description of the first article')
+        self.assertEqual(self.article_2.teaser_text, self.article_2.teaser())
+        self.assertEqual(self.article_3.teaser_text, u'None available.')
+
+    def testRegenerateTeasers(self):
+        Article.objects.update(teaser_text=None)
+        updated = Article.objects.get(pk=2).updated
+
+        call_command('magazine_regenerate_teasers', verbosity=0,
+                     missing=True)
+
+        article = Article.objects.get(pk=2)
+        self.assertEqual(article.teaser_text, self.article_2.teaser())
+        self.assertEqual(article.updated, updated)
+        self.assertEqual(Article.objects.get(pk=1).teaser_text,
+                         u'Witty description of the first article')
+
+    def testCleaningSkippedForUnchangedText(self):
+        article = Article.objects.get(pk=2)
+        self.assertEqual(article.text_hash, hash_text(article.text))
+
+        # Stand-in for text cleaned by an older sanitizer.
+        Article.objects.filter(pk=2).update(cleaned_text=u'<p>Stale</p>',
+                                            demoted_cleaned_text=None)
+        article = Article.objects.get(pk=2)
+        article.order_in_issue = 3
+        article.save()
+        article = Article.objects.get(pk=2)
+        self.assertEqual(article.cleaned_text, u'<p>Stale</p>')
+        self.assertEqual(article.demoted_cleaned_text, u'<p>Stale</p>')
+
+        article.text = u'<p>New <span>text</span></p>'
+        article.save()
+        article = Article.objects.get(pk=2)
+        self.assertEqual(article.cleaned_text, u'<p>New text</p>')
+        self.assertEqual(article.text_hash, hash_text(article.text))
+
+    def testImportArticles(self):
+        import_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, import_dir)
+
+        with open(os.path.join(import_dir, 'imported.html'), 'w') as f:
+            f.write(u'<h1 style="color: red">Imported</h1><p>'
+                    u'Caf\xe9</p>'.encode('utf-8'))
+
+        records = [
+            {'title': u'Imported article', 'issue': 3,
+             'text_file': 'imported.html',
+             'authors': [u'Paul Beasley-Murray', u'Jo Bloggs',
+                         {'forename': u'Bugs'}]},
+            {'title': u'Another imported article', 'issue': 1,
+             'order_in_issue': 5, 'description': u'Imported description',
+             'authors': [u'Jo Bloggs']},
+        ]
+
+        manifest = os.path.join(import_dir, 'articles.jsonl')
+        with open(manifest, 'w') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+
+        num_authors = Author.plain_objects.count()
+        call_command('magazine_import_articles', manifest, processes=1,
+                     batch_size=1, verbosity=0)
+
+        article = Article.objects.get(title=u'Imported article')
+        self.assertEqual(article.issue.number, 3)
+        self.assertEqual(article.cleaned_text,
+                         u'<h1>Imported</h1><p>Caf\xe9</p>')
+        self.assertEqual(article.demoted_text(),
+                         u'<h2>Imported</h2><p>Caf\xe9</p>')
+        self.assertEqual(article.teaser(), u'ImportedCaf\xe9')
+        self.assertEqual(
+            sorted(unicode(author) for author in article.authors.all()),
+            [u'Bugs', u'Jo Bloggs', u'Paul Beasley-Murray'])
+
+        # Authors are only created if they don't already exist
+        self.assertEqual(Author.plain_objects.count(), num_authors + 1)
+        self.assertEqual(Author.objects.get(forename=u'Jo').num_articles, 2)
+        self.assertEqual(Author.objects.get(pk=1).num_articles, 3)
+
+        other = Article.objects.get(title=u'Another imported article')
+        self.assertEqual(other.order_in_issue, 5)
+        self.assertEqual(other.teaser(), u'Imported description')
+        self.assertEqual([unicode(author) for author in other.authors.all()],
+                         [u'Jo Bloggs'])
+
+        # Imported articles are searchable
+        self.assertEqual([result['article'] for result in
+                          search(u'imported description')], [other.pk])
+
+        # ...and don't get in the way of articles added later
+        new_article = Article.objects.create(title=u'New', issue=other.issue)
+        self.assertTrue(new_article.pk > max(article.pk, other.pk))
+
+    def testResanitize(self):
+        checkpoint_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, checkpoint_dir)
+        checkpoint = os.path.join(checkpoint_dir, 'checkpoint.json')
+
+        # Stand-in for text cleaned with an older whitelist.
+        Article.objects.filter(pk__in=[2, 5]).update(
+            cleaned_text=u'<p>Stale</p>')
+        updated = Article.objects.get(pk=2).updated
+
+        output = StringIO()
+        call_command('magazine_resanitize', dry_run=True, processes=1,
+                     checkpoint=checkpoint, stdout=output)
+        self.assertTrue(u'-<p>Stale</p>\n' in output.getvalue())
+        self.assertTrue(u'+<h1>Heading 1</h1>\n' in output.getvalue())
+        self.assertEqual(Article.objects.filter(
+            cleaned_text=u'<p>Stale</p>').count(), 2)
+        self.assertFalse(os.path.exists(checkpoint))
+
+        # Resuming after article 2.
+        with open(checkpoint, 'w') as f:
+            json.dump({'Article': 2}, f)
+
+        call_command('magazine_resanitize', processes=1, chunk_size=1,
+                     checkpoint=checkpoint, verbosity=0)
+        self.assertEqual(Article.objects.get(pk=2).cleaned_text,
+                         u'<p>Stale</p>')
+        article = Article.objects.get(pk=5)
+        self.assertTrue(article.cleaned_text.startswith(u'<h1>Heading 1'))
+        self.assertTrue(article.demoted_cleaned_text.startswith(
+            u'<h2>Heading 1'))
+        self.assertFalse(os.path.exists(checkpoint))
+
+        call_command('magazine_resanitize', processes=1, restart=True,
+                     checkpoint=checkpoint, verbosity=0)
+        article = Article.objects.get(pk=2)
+        self.assertEqual(article.cleaned_text, self.article_2.cleaned_text)
+        self.assertEqual(article.teaser_text, self.article_2.teaser())
+        self.assertEqual(article.updated, updated)
+        self.assertEqual([result['article'] for result in search('lorem')],
+                         [2])
+
+    def testResanitizeTextChanged(self):
+        Article.objects.filter(pk=2).update(cleaned_text=u'<p>Stale</p>')
+        chunk = list(Article.objects.filter(pk=2))
+
+        # An editor changes the text while it's being cleaned.
+        Article.objects.filter(pk=2).update(
+            text=u'<p>New</p>', text_hash=hash_text(u'<p>New</p>'))
+
+        command = resanitize.Command()
+        command.dry_run = False
+        command.clean = lambda tasks: map(resanitize.clean_text, tasks)
+
+        self.assertEqual(command.process_chunk(Article, chunk), 0)
+        article = Article.objects.get(pk=2)
+        self.assertEqual(article.text, u'<p>New</p>')
+        self.assertEqual(article.cleaned_text, u'<p>Stale</p>')
+
+    def testResanitizeChangesETag(self):
+        Article.objects.filter(pk=2).update(
+            cleaned_text=u'<p>Stale</p>',
+            demoted_cleaned_text=u'<p>Stale</p>')
+        url = self.article_2.get_absolute_url()
+        etag = self.client.get(url)['ETag']
+
+        command = resanitize.Command()
+        command.dry_run = False
+        command.clean = lambda tasks: map(resanitize.clean_text, tasks)
+        self.assertEqual(
+            command.process_chunk(Article, list(Article.objects.filter(pk=2))),
+            1)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, u'Stale')
+        self.assertNotEqual(response['ETag'], etag)
+
     def testGetURL(self):
         self.assertEqual(self.article_1.get_absolute_url(),
                          reverse('magazine_article_detail',
@@ -75,10 +288,41 @@ class ArticleTestCase(TestCase):
         self.assertEqual(self.author_3.num_articles, 0)
 
         local_author_1 = Author.plain_objects.get(pk=1)
-        self.assertNumQueries(1, local_author_1.get_num_articles)
         self.assertNumQueries(0, local_author_1.get_num_articles)
         self.assertEqual(local_author_1.num_articles, 2)
 
+    def testNumArticlesKeptUpToDate(self):
+        def counts():
+            return list(Author.objects.order_by('pk').values_list(
+                'num_articles', 'num_book_reviews'))
+
+        self.assertEqual(counts(), [(2, 0), (4, 0), (0, 0)])
+
+        self.article_1.authors.add(self.author_3)
+        self.author_3.bookreview_set.create(title=u'A review',
+                                            issue=self.article_1.issue)
+        self.assertEqual(counts(), [(2, 0), (4, 0), (1, 1)])
+
+        self.article_1.authors.remove(self.author_1)
+        self.assertEqual(counts(), [(1, 0), (4, 0), (1, 1)])
+
+        self.author_2.article_set.remove(self.article_2)
+        self.assertEqual(counts(), [(1, 0), (3, 0), (1, 1)])
+
+        self.article_1.authors.clear()
+        self.assertEqual(counts(), [(1, 0), (3, 0), (0, 1)])
+
+        Article.objects.filter(pk__in=[3, 5]).delete()
+        self.author_3.bookreview_set.all().delete()
+        self.assertEqual(counts(), [(0, 0), (1, 0), (0, 0)])
+
+        Author.objects.update(num_articles=7, num_book_reviews=7)
+        output = StringIO()
+        call_command('magazine_reconcile_author_counts', stdout=output)
+        self.assertEqual(output.getvalue(),
+                         u'Corrected the counts for 3 author(s).\n')
+        self.assertEqual(counts(), [(0, 0), (1, 0), (0, 0)])
+
     def testNumAuthors(self):
         articles = Article.objects_with_num_authors.all()
 
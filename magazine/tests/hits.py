@@ -0,0 +1,111 @@
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.test.utils import override_settings
+from magazine import hits
+from magazine.hits import current_bucket, flush_hits
+from magazine.models import Article, BookReview, Issue
+
+
+@override_settings(MAGAZINE_BUFFER_HITS=True, MAGAZINE_HIT_FLUSH_INTERVAL=0)
+class HitBufferTestCase(TestCase):
+    fixtures = ['test_issues.json',
+                'test_authors.json',
+                'test_articles.json', ]
+
+    def setUp(self):
+        cache.clear()
+        # So that the tests don't straddle two buckets.
+        self.old_bucket_seconds = hits.BUCKET_SECONDS
+        hits.BUCKET_SECONDS = 60 * 60 * 24
+        self.article = Article.objects.get(pk=1)
+        self.review = BookReview.objects.create(title=u'A review',
+                                                issue=Issue.objects.get(pk=1))
+
+    def tearDown(self):
+        hits.BUCKET_SECONDS = self.old_bucket_seconds
+
+    def testHitsAreBuffered(self):
+        self.article.mark_visited()
+        self.article.mark_visited()
+        self.review.mark_visited()
+
+        self.assertEqual(Article.objects.get(pk=1).hits, 0)
+        self.assertEqual(BookReview.objects.get(pk=self.review.pk).hits, 0)
+        self.assertEqual(self.article.get_hits(), 2)
+        self.assertEqual(self.review.get_hits(), 1)
+
+    def testFlush(self):
+        self.article.mark_visited()
+        self.article.mark_visited()
+        self.review.mark_visited()
+
+        # One UPDATE per object
+        self.assertNumQueries(2, flush_hits)
+
+        article = Article.objects.get(pk=1)
+        self.assertEqual(article.hits, 2)
+        self.assertEqual(article.get_hits(), 2)
+        self.assertEqual(BookReview.objects.get(pk=self.review.pk).hits, 1)
+
+        # Nothing left to write
+        self.assertNumQueries(0, flush_hits)
+
+        article.mark_visited()
+        flush_hits()
+        self.assertEqual(Article.objects.get(pk=1).hits, 3)
+
+    def testRegisteredOnce(self):
+        bucket_key = u'magazine_hits_bucket_{0}'.format(current_bucket())
+
+        self.article.mark_visited()
+        self.article.mark_visited()
+        self.review.mark_visited()
+        self.assertEqual(cache.get(bucket_key), 2)
+
+        # Flushing unregisters the article, so its next hit registers
+        # it again.
+        flush_hits()
+        self.article.mark_visited()
+        self.assertEqual(cache.get(bucket_key), 3)
+
+    def testSlotFilledInLate(self):
+        bucket = current_bucket()
+        self.article.mark_visited()
+
+        # Another hit has taken the next slot, but not filled it in yet.
+        cache.incr(u'magazine_hits_bucket_{0}'.format(bucket))
+        cache.set(u'magazine_hits_registered_bookreview_{0}'.format(
+            self.review.pk), True)
+        cache.set(u'magazine_hits_bookreview_{0}'.format(self.review.pk), 1)
+
+        self.assertEqual(flush_hits(), 1)
+        self.assertEqual(Article.objects.get(pk=1).hits, 1)
+
+        cache.set(u'magazine_hits_bucket_{0}_2'.format(bucket),
+                  ('bookreview', self.review.pk))
+        self.assertEqual(flush_hits(), 1)
+        self.assertEqual(BookReview.objects.get(pk=self.review.pk).hits, 1)
+
+    def testFlushCommand(self):
+        self.article.mark_visited()
+        call_command('magazine_flush_hits', verbosity=0)
+        self.assertEqual(Article.objects.get(pk=1).hits, 1)
+
+    @override_settings(MAGAZINE_HIT_FLUSH_INTERVAL=300)
+    def testFlushInterval(self):
+        # The first hit after the interval has elapsed flushes the
+        # buffer, subsequent hits within the interval are buffered.
+        self.article.mark_visited()
+        self.assertEqual(Article.objects.get(pk=1).hits, 1)
+        self.article.mark_visited()
+        self.assertEqual(Article.objects.get(pk=1).hits, 1)
+        self.assertEqual(Article.objects.get(pk=1).get_hits(), 2)
+
+    def testArticleView(self):
+        self.client.get(reverse('magazine_article_detail', args=[1, 1]))
+        self.client.get(reverse('magazine_article_detail', args=[1, 1]))
+        self.assertEqual(Article.objects.get(pk=1).hits, 0)
+        flush_hits()
+        self.assertEqual(Article.objects.get(pk=1).hits, 2)
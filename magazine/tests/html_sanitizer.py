@@ -1,5 +1,11 @@
+import threading
+from StringIO import StringIO
+from django.core.management import call_command
 from django.test import TestCase
-from magazine.utils.word_cleaner import clean_word_text
+from magazine.benchmarks import generate_word_document, measure
+from magazine.utils.lru import LRUCache
+from magazine.utils.word_cleaner import (clean_word_text, cleaned_text_cache,
+                                         hash_text)
 
 
 class HTMLSanitizerTestCase(TestCase):
@@ -53,3 +59,174 @@ class HTMLSanitizerTestCase(TestCase):
     def testEmpty(self):
         html = u''
         self.assertEqual(clean_word_text(html), u'')
+
+    def testImpliedEndTags(self):
+        self.assertEqual(clean_word_text(u'<p>one<p>two'),
+                         u'<p>one</p><p>two</p>')
+        self.assertEqual(clean_word_text(u'<div><p>one</div>two'),
+                         u'<p>one</p>two')
+        self.assertEqual(clean_word_text(u'<ul><li>one<li>two</ul>'),
+                         u'<ul><li>one</li><li>two</li></ul>')
+        self.assertEqual(clean_word_text(u'<h1>one</h2>two'),
+                         u'<h1>one</h1>two')
+        self.assertEqual(clean_word_text(u'one</p>two'),
+                         u'one<p></p>two')
+
+    def testFormattingReopened(self):
+        self.assertEqual(clean_word_text(u'<p><b>one</p>two'),
+                         u'<p><b>one</b></p><b>two</b>')
+        self.assertEqual(clean_word_text(u'<b>1<i>2</b>3</i>'),
+                         u'<b>1<i>2</i></b><i>3</i>')
+
+    def testHeadings(self):
+        # A heading only closes a heading it's directly inside.
+        self.assertEqual(clean_word_text(u'<h1>a<h2>b'),
+                         u'<h1>a</h1><h2>b</h2>')
+        self.assertEqual(clean_word_text(u'<h2><strong>a<br></br><h2>b'),
+                         u'<h2><strong>a<h2>b</h2></strong></h2>')
+        self.assertEqual(clean_word_text(u'<h1><strong>x</strong><h2>y'),
+                         u'<h1><strong>x</strong></h1><h2>y</h2>')
+
+        # Formatting carries on after a heading closes - and after a
+        # </br>, which is read as a <br>.
+        self.assertEqual(clean_word_text(u'<h1><em>x</h1>y'),
+                         u'<h1><em>x</em></h1><em>y</em>')
+        self.assertEqual(clean_word_text(u'<h2><em>a</h2></br>'),
+                         u'<h2><em>a</em></h2><em></em>')
+        self.assertEqual(clean_word_text(u'<p><em>a<p></h1></br>'),
+                         u'<p><em>a</em></p><p><em></em></p>')
+
+    def testNestingAfterStrippedTags(self):
+        # These are nested as the old pipeline's two trees nested them:
+        # first with every tag, and then with only the whitelisted ones.
+        self.assertEqual(clean_word_text(u'<br> z<font><h1><p></font>'),
+                         u'z<h1><p></p></h1>')
+        self.assertEqual(clean_word_text(u'<h2><table>x<h2><tr>'),
+                         u'<h2>x</h2><h2></h2>')
+        self.assertEqual(clean_word_text(u'<h2><pre>x<h1>'),
+                         u'<h2>x</h2><h1></h1>')
+        self.assertEqual(clean_word_text(u'<sup><li></sup><ol>'),
+                         u'<li><ol></ol></li>')
+        self.assertEqual(clean_word_text(u'<em><li><ol></li>x'),
+                         u'<em><li><ol>x</ol></li></em>')
+
+    def testTables(self):
+        self.assertEqual(
+            clean_word_text(u'<table><h1></br><a href="x"><strong>x<tr>x'),
+            u'<h1><a href="x"><strong>x</strong></a></h1>'
+            u'<a href="x"><strong>x</strong></a>')
+        self.assertEqual(
+            clean_word_text(u'<h3><table>x<strong><a href="x"><td>y'),
+            u'<h3>x<strong><a href="x"></a></strong>y</h3>')
+        self.assertEqual(
+            clean_word_text(u'<table><tr><td>a<b>b</td><td>c</b>d</table>'),
+            u'a<b>b</b>cd')
+        self.assertEqual(clean_word_text(u'x<tr><div><em>x</tr>y'),
+                         u'x<em>xy</em>')
+
+    def testKnownDifferences(self):
+        # See magazine.utils.sanitizer for why these differ from the old
+        # pipeline, which gave "<b>1</b><p><b>2</b>3</p>",
+        # "<h1><strong>x</strong></h1><h2><strong>y</strong>z</h2>", "ba"
+        # and "<p>ax</p><p>yb</p>".
+        self.assertEqual(clean_word_text(u'<b>1<p>2</b>3</p>'),
+                         u'<b>1<p>23</p></b>')
+        self.assertEqual(clean_word_text(u'<h1><strong>x<h2>y</strong>z'),
+                         u'<h1><strong>x<h2>yz</h2></strong></h1>')
+        self.assertEqual(
+            clean_word_text(u'<table><tr><td>a</td></tr>b</table>'),
+            u'ab')
+        self.assertEqual(clean_word_text(u'<p>a<script>x<p>y</script>b'),
+                         u'<p>ax&lt;p&gt;yb</p>')
+
+    def testWordDocument(self):
+        html = u"""<html xmlns:o="urn:schemas-microsoft-com:office:office">
+<head><!--[if gte mso 9]><xml><w:WordDocument><w:View>Normal</w:View>
+</w:WordDocument></xml><![endif]--><style><!--
+p.MsoNormal {mso-style-parent:""; margin:0cm;}
+--></style></head>
+<body lang=EN-GB><div class=WordSection1>
+<h1>A heading</h1>
+<p class=MsoNormal style="margin-bottom:0cm"><span lang=EN-GB
+style='font-size:11.0pt'>Lorem <b style="mso-bidi-font-weight:normal">ipsum
+<i>dolor</i></b> sit &amp; <a href="http://example.com/"
+onclick="x()">amet</a><o:p></o:p></span></p>
+<table class=MsoTableGrid><tr><td><p class=MsoNormal>Cell<o:p></o:p>
+</td></tr></table>
+</div></body></html>"""
+        self.assertEqual(clean_word_text(html), u"""<h1>A heading</h1>
+<p>Lorem <b>ipsum
+<i>dolor</i></b> sit &amp; <a href="http://example.com/">amet</a></p>
+<p>Cell
+</p>""")
+
+    def testUnsafeLinks(self):
+        html = u'<a href="javascript:alert(1)" title="x">hello</a>'
+        self.assertEqual(clean_word_text(html), u'<a title="x">hello</a>')
+
+    def testBenchmarks(self):
+        document = generate_word_document(4096)
+        self.assertEqual(document, generate_word_document(4096))
+        self.assertTrue(len(document) >= 4096)
+        self.assertTrue(u'mso-' in document)
+        self.assertFalse(u'mso-' in clean_word_text(document))
+
+        output = StringIO()
+        call_command('magazine_benchmark_sanitizer', sizes='1K,2K',
+                     repeat=1, isolate=False, stdout=output)
+        self.assertTrue(u'legacy_clean_word_text' in output.getvalue())
+
+        # Not cache hits, whatever the cache size.
+        with self.settings(MAGAZINE_SANITIZER_CACHE_SIZE=2):
+            measure('clean_word_text', 1024, repeat=2)
+            self.assertEqual(len(cleaned_text_cache), 0)
+
+    def testCleanedTextCache(self):
+        html = u'<p>Cached <span>text</span></p>'
+        key = hash_text(html)
+
+        clean_word_text(html)
+        self.assertFalse(key in cleaned_text_cache)
+
+        with self.settings(MAGAZINE_SANITIZER_CACHE_SIZE=2):
+            self.assertEqual(clean_word_text(html), u'<p>Cached text</p>')
+            self.assertTrue(key in cleaned_text_cache)
+            self.assertEqual(clean_word_text(html), u'<p>Cached text</p>')
+
+            clean_word_text(u'<p>One</p>')
+            clean_word_text(html)
+            clean_word_text(u'<p>Two</p>')
+
+            # The least recently used text is dropped.
+            self.assertEqual(len(cleaned_text_cache), 2)
+            self.assertTrue(key in cleaned_text_cache)
+            self.assertFalse(hash_text(u'<p>One</p>') in cleaned_text_cache)
+
+        clean_word_text(html)
+        self.assertEqual(len(cleaned_text_cache), 0)
+
+    def testLRUCacheThreads(self):
+        cache = LRUCache(8)
+
+        def use_cache(offset):
+            for i in xrange(2000):
+                key = (i * 7 + offset) % 20
+                if cache.get(key) is None:
+                    cache.set(key, key)
+
+        threads = [threading.Thread(target=use_cache, args=(offset, ))
+                   for offset in xrange(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Walk the linked list, which must still hold every entry once.
+        keys = []
+        entry = cache.root[cache.NEXT]
+        while entry is not cache.root:
+            keys.append(entry[cache.KEY])
+            entry = entry[cache.NEXT]
+
+        self.assertTrue(len(cache) <= 8)
+        self.assertEqual(sorted(keys), sorted(cache.entries))
@@ -0,0 +1,75 @@
+import re
+from django.db import connection
+from django.test import TestCase
+from django.utils.unittest import skipUnless
+from magazine.models import Article, Author, BookReview, Issue
+from magazine.views import (AuthorArticlesView, AuthorBookReviewsView,
+                            AuthorListView, AuthorListViewAlphabetised)
+
+# "SCAN magazine_article", or "SCAN TABLE magazine_article" on SQLite
+# before 3.36 - but not "SCAN magazine_article USING INDEX ...".
+full_scan_pattern = re.compile(
+    r'\bSCAN (?:TABLE )?(\w+)(?! USING (?:COVERING )?INDEX)(?:\s|$)')
+
+
+@skipUnless(connection.vendor == 'sqlite',
+            'Query plans are only checked on SQLite.')
+class QueryPlanTestCase(TestCase):
+    fixtures = ['test_issues.json', 'test_authors.json',
+                'test_articles.json', ]
+
+    def get_query_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        cursor = connection.cursor()
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+
+    def assertNoFullScans(self, queryset):
+        plan = self.get_query_plan(queryset)
+        scans = [line for line in plan if full_scan_pattern.search(line)]
+        self.assertEqual(scans, [], u'Full table scan in:\n{0}\n{1}'.format(
+            queryset.query, u'\n'.join(plan)))
+
+    def get_view_queryset(self, view_class, **kwargs):
+        view = view_class()
+        view.kwargs = kwargs
+        return view.get_queryset()
+
+    def testFullScanDetected(self):
+        plan = self.get_query_plan(Article.objects.filter(hits__gt=0))
+        self.assertTrue([line for line in plan
+                         if full_scan_pattern.search(line)])
+
+    def testPublishedIssues(self):
+        self.assertNoFullScans(Issue.published_objects.all())
+
+    def testIssueContents(self):
+        self.assertNoFullScans(Article.objects.filter(issue=1))
+        self.assertNoFullScans(BookReview.objects.filter(issue=1))
+
+    def testAuthorListings(self):
+        self.assertNoFullScans(self.get_view_queryset(AuthorListView))
+        self.assertNoFullScans(
+            self.get_view_queryset(AuthorListViewAlphabetised))
+
+    def testAuthorArticles(self):
+        self.assertNoFullScans(
+            self.get_view_queryset(AuthorArticlesView, pk='1'))
+        self.assertNoFullScans(
+            self.get_view_queryset(AuthorBookReviewsView, pk='1'))
+
+    def testIndexesCreated(self):
+        names = set()
+        cursor = connection.cursor()
+
+        for model in (Issue, Article, BookReview, Author):
+            cursor.execute('PRAGMA index_list({0})'.format(
+                connection.ops.quote_name(model._meta.db_table)))
+            names.update(row[1] for row in cursor.fetchall())
+
+        for name in ('magazine_issue_published_issue_date',
+                     'magazine_article_issue_order',
+                     'magazine_bookreview_issue_order',
+                     'magazine_author_indexable_name',
+                     'magazine_author_indexable_num_articles'):
+            self.assertTrue(name in names, name)
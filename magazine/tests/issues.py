@@ -1,19 +1,38 @@
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta
 from django.conf import settings
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
+from django.db.models import Q
 from django.test import TestCase
-from magazine.models import Issue, subtract_n_months
+from magazine.archive import get_archive
+from magazine.embargo import EmbargoPolicy, FunctionEmbargoPolicy
+from magazine.models import (Article, BookReview, Issue, subtract_n_months,
+                             seconds_until_midnight)
 
 
 class NoIssuesTestCase(TestCase):
+    def setUp(self):
+        # The current issue is cached, and the test database is rolled
+        # back between tests without any signals being sent.
+        cache.clear()
+
     def testLiveIssues(self):
         self.assertEqual(Issue.current_issue(), None)
 
+    def testFunctionEmbargoPolicy(self):
+        policy = FunctionEmbargoPolicy(lambda issue: False)
+
+        with self.settings(MAGAZINE_EMBARGO_POLICY=policy):
+            self.assertEqual(list(Issue.objects.with_embargo_status()), [])
+            response = self.client.get(reverse('magazine_issues'))
+            self.assertEqual(response.status_code, 200)
+
 
 class IssueTestCase(TestCase):
     fixtures = ['test_issues.json', ]
 
     def setUp(self):
+        cache.clear()
         self.issue_1 = Issue.objects.get(pk=1)
         self.issue_2 = Issue.objects.get(pk=2)
         self.issue_3 = Issue.objects.get(pk=3)
@@ -40,6 +59,39 @@ class IssueTestCase(TestCase):
         self.issue_2.published = True
         self.issue_2.save()
 
+    def testCurrentIssueCached(self):
+        self.assertEqual(Issue.current_issue(), self.issue_2)
+        self.assertNumQueries(0, Issue.current_issue)
+
+        # Saving or deleting an issue invalidates the cache
+        self.issue_1.save()
+        self.assertNumQueries(1, Issue.current_issue)
+        self.issue_2.delete()
+        self.assertEqual(Issue.current_issue(), self.issue_1)
+
+    def testCurrentIssueCounts(self):
+        self.assertEqual(Issue.current_issue().num_articles, 0)
+        self.assertEqual(Issue.current_issue().num_book_reviews, 0)
+
+        article = Article.objects.create(title=u'New', issue=self.issue_2)
+        self.assertEqual(Issue.current_issue().num_articles, 1)
+        review = BookReview.objects.create(title=u'Review',
+                                           issue=self.issue_2)
+        self.assertEqual(Issue.current_issue().num_book_reviews, 1)
+
+        article.delete()
+        self.assertEqual(Issue.current_issue().num_articles, 0)
+        review.delete()
+        self.assertEqual(Issue.current_issue().num_book_reviews, 0)
+
+    def testSecondsUntilMidnight(self):
+        self.assertEqual(seconds_until_midnight(datetime(2010, 4, 1, 23, 0)),
+                         3600)
+        self.assertEqual(seconds_until_midnight(datetime(2010, 4, 1, 0, 0)),
+                         86400)
+        self.assertEqual(
+            seconds_until_midnight(datetime(2010, 4, 1, 23, 59, 59, 999)), 1)
+
     def testGetURL(self):
         self.assertEqual(self.issue_1.get_absolute_url(),
                          reverse('magazine_issue_detail',
@@ -81,3 +133,171 @@ class IssueTestCase(TestCase):
                                                    magazine_embargo_months)
             issue_4.save()
             self.assertFalse(issue_4.embargoed())
+
+    def testEmbargoStatusAnnotation(self):
+        issue = Issue.objects.create(number=4, issue_date=date.today())
+        issues = Issue.objects.with_embargo_status()
+
+        self.assertEqual(len(issues), 4)
+        for annotated in issues:
+            self.assertEqual(bool(annotated.embargo_status),
+                             Issue.objects.get(pk=annotated.pk).embargoed())
+            self.assertNumQueries(0, annotated.embargoed)
+
+        self.assertEqual(list(Issue.objects.embargoed().order_by('pk')),
+                         [self.issue_3, issue])
+        self.assertEqual(list(Issue.objects.unembargoed()),
+                         [self.issue_2, self.issue_1])
+        self.assertEqual(
+            [i.embargo_status for i in Issue.objects.with_embargo_status()
+             .order_by('embargo_status', '-number')],
+            [0, 0, 1, 1])
+
+    def testFunctionEmbargoPolicy(self):
+        def embargo_issue_1(issue):
+            return issue.number == 1
+
+        policy = FunctionEmbargoPolicy(embargo_issue_1)
+
+        with self.settings(MAGAZINE_EMBARGO_POLICY=policy):
+            self.assertTrue(self.issue_1.embargoed())
+            self.assertFalse(self.issue_2.embargoed())
+            self.assertTrue(self.issue_3.embargoed())
+            self.assertEqual(list(Issue.objects.unembargoed()),
+                             [self.issue_2])
+            self.assertEqual(
+                [i.embargo_status for i in
+                 Issue.objects.with_embargo_status()],
+                [1, 0, 1])
+
+    def testFunctionEmbargoPolicyEmbargoesEverything(self):
+        policy = FunctionEmbargoPolicy(lambda issue: True)
+
+        with self.settings(MAGAZINE_EMBARGO_POLICY=policy):
+            self.assertEqual(list(Issue.objects.unembargoed()), [])
+            self.assertEqual(
+                [i.embargo_status for i in
+                 Issue.objects.with_embargo_status()],
+                [1, 1, 1])
+
+            for url in (reverse('magazine_issues'),
+                        reverse('magazine_issue_detail', args=[1, ])):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def testFunctionEmbargoPolicyCached(self):
+        calls = []
+
+        def embargo_issue_1(issue):
+            calls.append(issue.pk)
+            return issue.number == 1
+
+        policy = FunctionEmbargoPolicy(embargo_issue_1)
+
+        with self.settings(MAGAZINE_EMBARGO_POLICY=policy):
+            self.assertEqual(list(Issue.objects.unembargoed()),
+                             [self.issue_2])
+            self.assertEqual(len(calls), 2)
+
+            # The published issues' status is cached...
+            self.assertNumQueries(1, lambda: list(
+                Issue.objects.with_embargo_status()))
+            self.assertEqual(len(calls), 2)
+
+            # ...until an issue changes.
+            self.issue_3.published = True
+            self.issue_3.issue_date = date(2010, 7, 1)
+            self.issue_3.save()
+            self.assertEqual(list(Issue.objects.unembargoed()),
+                             [self.issue_3, self.issue_2])
+            self.assertEqual(len(calls), 5)
+
+    def testCustomEmbargoPolicy(self):
+        class NothingEmbargoedPolicy(EmbargoPolicy):
+            def is_embargoed(self, issue):
+                return False
+
+            def unembargoed_filter(self, today):
+                return Q()
+
+        with self.settings(MAGAZINE_EMBARGO_POLICY=NothingEmbargoedPolicy()):
+            self.assertFalse(self.issue_1.embargoed())
+            # Unpublished issues are always embargoed
+            self.assertTrue(self.issue_3.embargoed())
+            self.assertEqual(list(Issue.objects.embargoed()),
+                             [self.issue_3])
+
+
+class IssueArchiveTestCase(TestCase):
+    fixtures = ['test_issues.json',
+                'test_authors.json',
+                'test_articles.json', ]
+
+    def setUp(self):
+        cache.clear()
+
+    def counts(self):
+        return list(Issue.objects.order_by('pk').values_list(
+            'num_articles', 'num_book_reviews'))
+
+    def testCountsKeptUpToDate(self):
+        self.assertEqual(self.counts(), [(2, 0), (2, 0), (1, 0)])
+
+        article = Article.objects.create(title=u'New', issue_id=1)
+        BookReview.objects.create(title=u'Review', issue_id=3)
+        self.assertEqual(self.counts(), [(3, 0), (2, 0), (1, 1)])
+
+        article.issue_id = 2
+        article.save()
+        self.assertEqual(self.counts(), [(2, 0), (3, 0), (1, 1)])
+
+        article.delete()
+        self.assertEqual(self.counts(), [(2, 0), (2, 0), (1, 1)])
+
+        Issue.objects.update(num_articles=7)
+        Issue.objects.get(pk=1).save()
+        self.assertEqual(self.counts(), [(2, 0), (7, 0), (7, 1)])
+
+    def testArchive(self):
+        for year in xrange(1995, 2009):
+            Issue.objects.create(number=year, issue_date=date(year, 6, 1))
+        Issue.objects.create(number=2011, issue_date=date(1995, 1, 1))
+
+        url = reverse('magazine_issues')
+        response = self.client.get(url)
+        self.assertEqual(response.context['years'],
+                         [2010, 2008, 2007, 2006, 2005, 2004, 2003, 2002,
+                          2001, 2000])
+        archive = response.context['archive']
+        self.assertEqual(archive[0]['year'], 2010)
+        self.assertEqual([issue.number for issue in archive[0]['issues']],
+                         [3, 1])
+        self.assertEqual(archive[0]['issues'][0].num_articles, 2)
+        self.assertEqual(len(response.context['issues']), 11)
+        self.assertContains(response, u'?page=2')
+
+        response = self.client.get(url, {'page': 2})
+        self.assertEqual(response.context['years'],
+                         [1999, 1998, 1997, 1996, 1995])
+        self.assertEqual([issue.number for issue in
+                          response.context['archive'][-1]['issues']],
+                         [1995, 2011])
+
+        # Each year is cached separately: the years (and the session)
+        # need querying, but not the issues.
+        with self.assertNumQueries(1):
+            get_archive(range(1995, 2011))
+
+        Article.objects.create(title=u'New', issue_id=1)
+        with self.assertNumQueries(1):
+            archive = get_archive([2010, 2009, 2008])
+        self.assertEqual(archive[0][1][1].num_articles, 3)
+
+        # Moving an issue invalidates the year it left.
+        issue = Issue.objects.get(number=2008)
+        issue.issue_date = date(2007, 1, 1)
+        issue.save()
+        with self.assertNumQueries(2):
+            archive = dict(get_archive([2008, 2007, 2006]))
+        self.assertEqual(archive[2008], [])
+        self.assertEqual([i.number for i in archive[2007]],
+                         [2007, 2008])
@@ -0,0 +1,119 @@
+import re
+from django.core.paginator import Paginator
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from magazine.models import Author
+from magazine.pagination import (encode_cursor, page_window,
+                                 paginate_by_cursor)
+
+
+class PaginationTestCase(TestCase):
+    fixtures = ['test_authors.json', ]
+
+    def setUp(self):
+        names = [(u'Zed', None), (u'Amy', None), (u'Amy', u'Smith'),
+                 (u'Bob', u'Smith'), (u'Amy', u'Jones'), (u'Cat', u'Adams')]
+
+        for i in xrange(24):
+            forename, surname = names[i % len(names)]
+            Author.objects.create(forename=forename, surname=surname,
+                                  num_articles=i % 5 + 1)
+
+    def testPageWindow(self):
+        paginator = Paginator(range(20), 1)
+
+        def window(number):
+            return page_window(paginator.page(number))
+
+        self.assertEqual(window(1), [1, 2, 3, None, 20])
+        self.assertEqual(window(4), [1, 2, 3, 4, 5, 6, None, 20])
+        self.assertEqual(window(10), [1, None, 8, 9, 10, 11, 12, None, 20])
+        self.assertEqual(window(19), [1, None, 17, 18, 19, 20])
+        self.assertEqual(page_window(Paginator(range(3), 1).page(2)),
+                         [1, 2, 3])
+
+    def walk(self, ordering, page_size):
+        """
+        Returns the primary keys on each page, paging forwards through
+        every page, then backwards from the last.
+        """
+        queryset = Author.objects.all()
+        forwards = []
+        page = paginate_by_cursor(queryset, ordering, page_size)
+        forwards.append([author.pk for author in page])
+        self.assertFalse(page.has_previous())
+
+        while page.has_next():
+            page = paginate_by_cursor(queryset, ordering, page_size,
+                                      after=page.next_cursor())
+            forwards.append([author.pk for author in page])
+
+        backwards = [[author.pk for author in page]]
+
+        while page.has_previous():
+            page = paginate_by_cursor(queryset, ordering, page_size,
+                                      before=page.previous_cursor())
+            backwards.insert(0, [author.pk for author in page])
+
+        return forwards, backwards
+
+    def testCursorPagination(self):
+        authors = list(Author.objects.all())
+        alphabetical = sorted(
+            authors, key=lambda author: (author.surname is not None,
+                                         author.surname, author.forename,
+                                         author.pk))
+        by_num_articles = sorted(
+            authors, key=lambda author: (-author.num_articles, author.pk))
+
+        for ordering, expected in (
+                (('surname', 'forename', 'pk'), alphabetical),
+                (('-num_articles', 'pk'), by_num_articles)):
+            expected = [author.pk for author in expected]
+
+            for page_size in (1, 4, 5, 100):
+                forwards, backwards = self.walk(ordering, page_size)
+                pages = [expected[i:i + page_size]
+                         for i in xrange(0, len(expected), page_size)]
+
+                self.assertEqual(forwards, pages)
+                self.assertEqual(backwards, pages)
+
+    def testInvalidCursor(self):
+        page = paginate_by_cursor(Author.objects.all(), ('pk',), 2,
+                                  after=u'not a cursor \u2603')
+        self.assertEqual([author.pk for author in page], [1, 2])
+
+    def testCursorOfWrongTypes(self):
+        ordering = ('-num_articles', 'pk')
+        first_page = [author.pk for author in
+                      paginate_by_cursor(Author.objects.all(), ordering, 2)]
+
+        # Treated as invalid cursors, rather than reaching the database.
+        for values in (['abc', 1], [{'x': 1}, 1], [[1, 2], 1], [1, 'abc']):
+            page = paginate_by_cursor(Author.objects.all(), ordering, 2,
+                                      after=encode_cursor(values))
+            self.assertEqual([author.pk for author in page], first_page)
+
+        with self.settings(MAGAZINE_CURSOR_PAGINATION=True):
+            response = self.client.get(reverse('magazine_authors'), {
+                'before': encode_cursor(['abc', 1])})
+        self.assertEqual(response.status_code, 200)
+
+    def testCursorPaginatedViews(self):
+        url = reverse('magazine_authors_alphabetised')
+
+        with self.settings(MAGAZINE_CURSOR_PAGINATION=True):
+            response = self.client.get(url)
+            self.assertEqual(len(response.context['authors']), 20)
+            self.assertFalse(response.context['page_obj'].has_previous())
+
+            cursor = re.search(r'\?after=([\w-]+)', response.content).group(1)
+            response = self.client.get(url, {'after': cursor})
+            self.assertEqual(len(response.context['authors']), 4)
+            self.assertContains(response, u'?before=')
+            self.assertNotContains(response, u'?after=')
+
+        response = self.client.get(url, {'page': 2})
+        self.assertEqual(len(response.context['authors']), 4)
+        self.assertContains(response, u'?page=1')
@@ -0,0 +1,232 @@
+import os
+import sys
+from datetime import date
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.signals import request_started
+from django.core.urlresolvers import reverse
+from django.db import connection, reset_queries
+from django.test import TestCase
+from magazine import urls
+from magazine.models import (Article, Author, BookReview, Issue,
+                             update_author_counts, update_issue_counts)
+from magazine.search import index_objects
+from magazine.tests.test_utils import LoginGuard
+from magazine.utils.dates import subtract_n_months
+
+NUM_ISSUES = 30
+ARTICLES_PER_ISSUE = 40
+BOOK_REVIEWS_PER_ISSUE = 5
+AUTHORS_PER_ARTICLE = 3
+NUM_AUTHORS = 60
+
+# The most queries each view may make, as (anonymous, staff), with an
+# empty cache. Views which check whether the user is staff also load
+# the session and user for staff. If a change makes a view cheaper,
+# lower its budget here, so that the new number shows up in review.
+QUERY_BUDGETS = {
+    'magazine_index': (7, 9),
+    'magazine_issues': (4, 6),
+    'magazine_issue_detail': (7, 9),
+    'magazine_article_detail': (3, 5),
+    'magazine_bookreview_detail': (3, 5),
+    'magazine_authors': (2, 2),
+    'magazine_authors_alphabetised': (2, 2),
+    'magazine_author_detail': (5, 9),
+    'magazine_author_articles': (5, 7),
+    'magazine_author_book_reviews': (5, 7),
+    'magazine_search': (4, 6),
+}
+
+# The same, for a second request for the same page, once the first has
+# filled the cache. These are what most visitors get, so a change which
+# stops a view using the cache shows up here.
+WARM_QUERY_BUDGETS = {
+    'magazine_index': (4, 6),
+    'magazine_issues': (1, 3),
+    'magazine_issue_detail': (5, 7),
+    'magazine_article_detail': (3, 5),
+    'magazine_bookreview_detail': (3, 5),
+    'magazine_authors': (2, 2),
+    'magazine_authors_alphabetised': (2, 2),
+    'magazine_author_detail': (1, 9),
+    'magazine_author_articles': (5, 7),
+    'magazine_author_book_reviews': (5, 7),
+    'magazine_search': (3, 5),
+}
+
+QUERY_STRINGS = {
+    'magazine_search': 'q=lorem',
+}
+
+
+class QueryCounter(object):
+    """
+    Counts the queries made inside a ``with`` block, like
+    ``assertNumQueries``.
+    """
+    def __enter__(self):
+        self.old_debug_cursor = connection.use_debug_cursor
+        connection.use_debug_cursor = True
+        self.starting_queries = len(connection.queries)
+        request_started.disconnect(reset_queries)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        connection.use_debug_cursor = self.old_debug_cursor
+        request_started.connect(reset_queries)
+        self.count = len(connection.queries) - self.starting_queries
+
+
+def build_dataset():
+    """
+    Creates ``NUM_ISSUES`` published monthly issues, each with
+    ``ARTICLES_PER_ISSUE`` articles by ``AUTHORS_PER_ARTICLE`` authors
+    and ``BOOK_REVIEWS_PER_ISSUE`` book reviews.
+    """
+    this_month = date.today().replace(day=1)
+
+    Issue.objects.bulk_create([
+        Issue(pk=i + 1, number=i + 1,
+              issue_date=subtract_n_months(this_month, NUM_ISSUES - i - 1))
+        for i in xrange(NUM_ISSUES)])
+    Author.objects.bulk_create([
+        Author(pk=i + 1, forename=u'Author', surname=u'{0:03}'.format(i))
+        for i in xrange(NUM_AUTHORS)])
+
+    text = u'<p>Lorem ipsum dolor sit amet.</p>'
+    articles = []
+    book_reviews = []
+    article_authors = []
+    book_review_authors = []
+
+    for issue in xrange(NUM_ISSUES):
+        for i in xrange(ARTICLES_PER_ISSUE):
+            pk = issue * ARTICLES_PER_ISSUE + i + 1
+            articles.append(Article(
+                pk=pk, title=u'Article {0}'.format(pk), issue_id=issue + 1,
+                order_in_issue=i, text=text, cleaned_text=text,
+                demoted_cleaned_text=text, teaser_text=text))
+
+            for j in xrange(AUTHORS_PER_ARTICLE):
+                article_authors.append(Article.authors.through(
+                    article_id=pk, author_id=(pk + j) % NUM_AUTHORS + 1))
+
+        for i in xrange(BOOK_REVIEWS_PER_ISSUE):
+            pk = issue * BOOK_REVIEWS_PER_ISSUE + i + 1
+            book_reviews.append(BookReview(
+                pk=pk, title=u'Book review {0}'.format(pk),
+                issue_id=issue + 1, order_in_issue=i, text=text,
+                cleaned_text=text, demoted_cleaned_text=text,
+                teaser_text=text))
+            book_review_authors.append(BookReview.authors.through(
+                bookreview_id=pk, author_id=pk % NUM_AUTHORS + 1))
+
+    Article.objects.bulk_create(articles)
+    BookReview.objects.bulk_create(book_reviews)
+    Article.authors.through.objects.bulk_create(article_authors)
+    BookReview.authors.through.objects.bulk_create(book_review_authors)
+
+    update_author_counts()
+    update_issue_counts(range(1, NUM_ISSUES + 1))
+    index_objects(articles + book_reviews)
+
+
+class QueryBudgetTestCase(TestCase):
+    def setUp(self):
+        build_dataset()
+
+        User.objects.create_user('staff', 'staff@internal.com', 'password')
+        User.objects.filter(username='staff').update(is_staff=True)
+
+    def get_url(self, name):
+        issue = Issue.objects.get(number=NUM_ISSUES)
+        article = issue.article_set.all()[0]
+        book_review = issue.bookreview_set.all()[0]
+        author = article.authors.all()[0]
+
+        kwargs = {
+            'magazine_issue_detail': [issue.number],
+            'magazine_article_detail': [issue.number, article.pk],
+            'magazine_bookreview_detail': [issue.number, book_review.pk],
+            'magazine_author_detail': [author.pk],
+            'magazine_author_articles': [author.pk],
+            'magazine_author_book_reviews': [author.pk],
+        }
+
+        url = reverse(name, args=kwargs.get(name, []))
+
+        if name in QUERY_STRINGS:
+            url += '?' + QUERY_STRINGS[name]
+
+        return url
+
+    def count_queries(self, warm=False):
+        """
+        Returns a dictionary mapping each named route in
+        ``magazine.urls`` to the number of queries a request for it
+        makes, with an empty cache - or, if ``warm``, after an earlier
+        request for it has filled the cache.
+        """
+        counts = {}
+
+        for pattern in urls.urlpatterns:
+            url = self.get_url(pattern.name)
+            cache.clear()
+
+            if warm:
+                self.client.get(url)
+
+            with QueryCounter() as counter:
+                response = self.client.get(url)
+
+            self.assertEqual(response.status_code, 200, url)
+            counts[pattern.name] = counter.count
+
+        return counts
+
+    def report(self, counts, budgets, user_index):
+        lines = [u'{0:<32}{1:>8}{2:>8}'.format(u'View', u'Queries',
+                                               u'Budget')]
+
+        for name in sorted(counts):
+            lines.append(u'{0:<32}{1:>8}{2:>8}'.format(
+                name, counts[name],
+                budgets.get(name, (None, None))[user_index]))
+
+        return u'\n'.join(lines)
+
+    def assertWithinBudgets(self, counts, budgets, user_index):
+        report = self.report(counts, budgets, user_index)
+
+        if os.environ.get('MAGAZINE_QUERY_REPORT'):
+            sys.stderr.write(u'\n{0}\n'.format(report))
+
+        # Views without a budget are caught by testEveryRouteHasABudget.
+        over = [name for name in counts if name in budgets and
+                counts[name] > budgets[name][user_index]]
+        self.assertEqual(over, [], u'Over budget:\n{0}'.format(report))
+
+    def testEveryRouteHasABudget(self):
+        names = sorted(pattern.name for pattern in urls.urlpatterns)
+        self.assertEqual(names, sorted(QUERY_BUDGETS))
+        self.assertEqual(names, sorted(WARM_QUERY_BUDGETS))
+
+    def testAnonymousQueryBudgets(self):
+        self.assertWithinBudgets(self.count_queries(), QUERY_BUDGETS, 0)
+
+    def testStaffQueryBudgets(self):
+        with LoginGuard(self.client, 'staff'):
+            counts = self.count_queries()
+
+        self.assertWithinBudgets(counts, QUERY_BUDGETS, 1)
+
+    def testWarmAnonymousQueryBudgets(self):
+        self.assertWithinBudgets(self.count_queries(warm=True),
+                                 WARM_QUERY_BUDGETS, 0)
+
+    def testWarmStaffQueryBudgets(self):
+        with LoginGuard(self.client, 'staff'):
+            counts = self.count_queries(warm=True)
+
+        self.assertWithinBudgets(counts, WARM_QUERY_BUDGETS, 1)
@@ -0,0 +1,164 @@
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.utils import timezone
+from magazine.models import Article, BookReview, Issue, SanitizationJob
+from magazine.sanitization import (get_claim_expiry, process_job,
+                                   process_queue)
+from magazine.search import search
+from magazine.tests.test_utils import initialise_article_text
+from magazine.utils.word_cleaner import hash_text
+
+
+class SanitizationQueueTestCase(TestCase):
+    fixtures = ['test_issues.json',
+                'test_authors.json',
+                'test_articles.json', ]
+
+    def setUp(self):
+        initialise_article_text()
+        self.article = Article.objects.get(pk=2)
+        self.url = reverse('magazine_article_detail', args=[1, 2])
+
+    def testSaveIsDeferred(self):
+        old_text = self.article.cleaned_text
+
+        with self.settings(MAGAZINE_DEFER_SANITIZATION=True):
+            self.article.text = u'<p>Alpacas <span>everywhere</span></p>'
+            self.article.save()
+
+        article = Article.objects.get(pk=2)
+        self.assertTrue(article.sanitization_pending)
+        self.assertEqual(article.cleaned_text, old_text)
+        self.assertEqual(article.text_hash, hash_text(article.text))
+        self.assertEqual(SanitizationJob.objects.count(), 1)
+
+        # Until the job is processed, the old text is shown.
+        response = self.client.get(self.url)
+        self.assertContains(response, u'Full text of the second article')
+
+        # Re-saving doesn't queue it again.
+        with self.settings(MAGAZINE_DEFER_SANITIZATION=True):
+            article.save()
+        self.assertEqual(SanitizationJob.objects.count(), 1)
+
+        call_command('magazine_process_sanitization_queue', verbosity=0)
+
+        article = Article.objects.get(pk=2)
+        self.assertFalse(article.sanitization_pending)
+        self.assertEqual(article.cleaned_text, u'<p>Alpacas everywhere</p>')
+        self.assertEqual(article.teaser_text, u'Alpacas everywhere')
+        self.assertTrue(article.updated > self.article.updated)
+        self.assertEqual(SanitizationJob.objects.count(), 0)
+        self.assertEqual([result['article'] for result in search('alpacas')],
+                         [2])
+
+        response = self.client.get(self.url)
+        self.assertContains(response, u'<p>Alpacas everywhere</p>')
+
+    def testNewObjectPending(self):
+        with self.settings(MAGAZINE_DEFER_SANITIZATION=True):
+            review = BookReview.objects.create(
+                title=u'A review', issue=Issue.objects.get(pk=1),
+                text=u'<p>Vicunas</p>')
+
+        self.assertTrue(review.sanitization_pending)
+        self.assertEqual(review.cleaned_text, None)
+
+        response = self.client.get(review.get_absolute_url())
+        self.assertContains(response, u'magazine_text_pending')
+
+        self.assertEqual(process_queue(), 1)
+        response = self.client.get(review.get_absolute_url())
+        self.assertContains(response, u'<p>Vicunas</p>')
+
+    def testAuthorPageUpdated(self):
+        with self.settings(MAGAZINE_DEFER_SANITIZATION=True):
+            article = Article.objects.create(
+                title=u'Pending', issue=Issue.objects.get(pk=1),
+                text=u'<p>Hello world</p>')
+        article.authors.add(*self.article.authors.all())
+
+        url = self.article.authors.all()[0].get_absolute_url()
+        response = self.client.get(url)
+        self.assertNotContains(response, u'Hello world')
+        etag = response['ETag']
+
+        process_queue()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, u'Hello world')
+
+    def testOutOfDateJobs(self):
+        with self.settings(MAGAZINE_DEFER_SANITIZATION=True):
+            self.article.text = u'<p>First</p>'
+            self.article.save()
+            self.article.text = u'<p>Second</p>'
+            self.article.save()
+
+        jobs = list(SanitizationJob.objects.all())
+        self.assertEqual(len(jobs), 2)
+        self.assertFalse(process_job(jobs[0]))
+        self.assertTrue(process_job(jobs[1]))
+        self.assertEqual(Article.objects.get(pk=2).cleaned_text,
+                         u'<p>Second</p>')
+
+    def testJobClaimedOnce(self):
+        with self.settings(MAGAZINE_DEFER_SANITIZATION=True):
+            self.article.text = u'<p>First</p>'
+            self.article.save()
+
+        # Two workers read the same job...
+        job = SanitizationJob.objects.get()
+        same_job = SanitizationJob.objects.get()
+
+        # ...but only the first to claim it processes it.
+        self.assertTrue(process_job(job))
+        self.assertFalse(process_job(same_job))
+        self.assertEqual(Article.objects.get(pk=2).cleaned_text,
+                         u'<p>First</p>')
+
+    def testClaimedJobsSkipped(self):
+        with self.settings(MAGAZINE_DEFER_SANITIZATION=True):
+            self.article.text = u'<p>First</p>'
+            self.article.save()
+
+        SanitizationJob.objects.update(claimed=timezone.now())
+        self.assertEqual(process_queue(), 0)
+        self.assertTrue(Article.objects.get(pk=2).sanitization_pending)
+
+        # Once the claim has expired, another worker takes the job.
+        SanitizationJob.objects.update(claimed=get_claim_expiry())
+        self.assertEqual(process_queue(), 1)
+        self.assertFalse(Article.objects.get(pk=2).sanitization_pending)
+        self.assertEqual(SanitizationJob.objects.count(), 0)
+
+    def testTextChangedWhileCleaning(self):
+        with self.settings(MAGAZINE_DEFER_SANITIZATION=True):
+            self.article.text = u'<p>First</p>'
+            self.article.save()
+
+        job = SanitizationJob.objects.get()
+        # The worker reads the article...
+        job.article
+
+        # ...which an editor then changes before it has been cleaned.
+        Article.objects.filter(pk=2).update(text=u'<p>Second</p>',
+                                            text_hash=hash_text(u'<p>Second'
+                                                                u'</p>'))
+
+        self.assertFalse(process_job(job))
+        article = Article.objects.get(pk=2)
+        self.assertTrue(article.sanitization_pending)
+        self.assertEqual(article.text, u'<p>Second</p>')
+
+    def testStopDeferring(self):
+        with self.settings(MAGAZINE_DEFER_SANITIZATION=True):
+            self.article.text = u'<p>First</p>'
+            self.article.save()
+
+        self.article.save()
+        article = Article.objects.get(pk=2)
+        self.assertFalse(article.sanitization_pending)
+        self.assertEqual(article.cleaned_text, u'<p>First</p>')
@@ -0,0 +1,153 @@
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from magazine.embargo import DateEmbargoPolicy
+from magazine.models import Article, BookReview, Issue, SearchTerm
+from magazine.search import search, get_result_objects, tokenize
+from magazine.tests.test_utils import (assert_same_objects,
+                                       initialise_article_text, LoginGuard)
+
+
+class SearchTestCase(TestCase):
+    fixtures = ['test_issues.json',
+                'test_authors.json',
+                'test_articles.json', ]
+
+    def setUp(self):
+        initialise_article_text()
+
+        self.article = Article.objects.get(pk=1)
+        self.unpublished_article = Article.objects.get(pk=4)
+        self.review = BookReview.objects.create(
+            title=u'A review of a book about llamas',
+            book_author=u'Jo Bloggs',
+            text=u'<p>The article has a <strong>paragraph</strong></p>',
+            issue=Issue.objects.get(pk=2))
+
+    def results(self, query, **kwargs):
+        return get_result_objects(search(query, **kwargs))
+
+    def testTokenize(self):
+        self.assertEqual(tokenize(u'<p>The Llama&rsquo;s <b>wool</b></p>'),
+                         [u'llama', u'wool'])
+        self.assertEqual(tokenize(u''), [])
+        self.assertEqual(tokenize(None), [])
+
+    def testSearch(self):
+        assert_same_objects(self, self.results(u'witty'), [self.article])
+        assert_same_objects(self, self.results(u'WITTY Description'),
+                            [self.article])
+        assert_same_objects(self, self.results(u'llamas'), [self.review])
+        assert_same_objects(self, self.results(u'bloggs'), [self.review])
+
+        # Every term must match
+        assert_same_objects(self, self.results(u'witty llamas'), [])
+        assert_same_objects(self, self.results(u''), [])
+
+    def testRanking(self):
+        # Titles count for more than body text
+        results = self.results(u'article')
+        assert_same_objects(self, results[-1:], [self.review])
+        self.assertTrue(results[0].search_score > results[-1].search_score)
+
+    def testUnpublished(self):
+        assert_same_objects(self, self.results(u'fourth'), [])
+        assert_same_objects(
+            self, self.results(u'fourth', include_unpublished=True),
+            [self.unpublished_article])
+
+    def testEmbargoed(self):
+        policy = DateEmbargoPolicy(num_months=12 * 2000)
+
+        with self.settings(MAGAZINE_EMBARGO_POLICY=policy):
+            # Titles of embargoed articles are shown, so they're
+            # searchable, but their text isn't.
+            assert_same_objects(self, self.results(u'llamas'), [self.review])
+            assert_same_objects(self, self.results(u'paragraph'), [])
+            assert_same_objects(
+                self, self.results(u'paragraph', include_unpublished=True),
+                [self.review])
+
+    def testIncrementalIndexing(self):
+        article = Article.objects.get(pk=2)
+        article.title = u'An article about alpacas'
+        article.save()
+
+        assert_same_objects(self, self.results(u'alpacas'), [article])
+
+        article.title = u'An article about vicunas'
+        article.save()
+
+        assert_same_objects(self, self.results(u'vicunas'), [article])
+        assert_same_objects(self, self.results(u'alpacas'), [])
+
+        article.delete()
+        assert_same_objects(self, self.results(u'alpacas'), [])
+
+    def testRebuildSearchIndex(self):
+        SearchTerm.objects.all().delete()
+        assert_same_objects(self, self.results(u'witty'), [])
+
+        call_command('magazine_rebuild_search_index', verbosity=0,
+                     missing=True)
+        assert_same_objects(self, self.results(u'witty'), [self.article])
+
+    def testSearchView(self):
+        response = self.client.get(reverse('magazine_search'),
+                                   {'q': u'witty'})
+        self.assertEqual(response.status_code, 200)
+        assert_same_objects(self, response.context['results'], [self.article])
+        self.assertContains(response, self.article.get_absolute_url())
+
+        response = self.client.get(reverse('magazine_search'),
+                                   {'q': u'fourth'})
+        assert_same_objects(self, response.context['results'], [])
+
+        User.objects.create_user('staff', 'staff@internal.com', 'password')
+        User.objects.filter(username='staff').update(is_staff=True)
+
+        with LoginGuard(self.client, 'staff'):
+            response = self.client.get(reverse('magazine_search'),
+                                       {'q': u'fourth'})
+        assert_same_objects(self, response.context['results'],
+                            [self.unpublished_article])
+
+    def testSearchViewPagination(self):
+        for i in range(12):
+            BookReview.objects.create(title=u'Llamas volume {0}'.format(i),
+                                      issue=self.review.issue)
+
+        response = self.client.get(reverse('magazine_search'),
+                                   {'q': u'llamas'})
+        self.assertEqual(len(response.context['results']), 10)
+        self.assertContains(response, '?q=llamas&amp;page=2')
+
+        response = self.client.get(reverse('magazine_search'),
+                                   {'q': u'llamas', 'page': 2})
+        self.assertEqual(len(response.context['results']), 3)
+
+    def testAdminSearch(self):
+        User.objects.create_superuser('admin', 'admin@internal.com',
+                                      'password')
+        url = reverse('admin:magazine_article_changelist')
+
+        def admin_search(url, query):
+            response = self.client.get(url, {'q': query})
+            self.assertEqual(response.status_code, 200)
+            return sorted(obj.pk for obj in response.context['cl'].result_list)
+
+        with LoginGuard(self.client, 'admin'):
+            # Substrings of titles and subheadings
+            self.assertEqual(admin_search(url, u'y fir'), [1])
+            self.assertEqual(admin_search(url, u'subheading 1'), [1])
+
+            # Words in the description and text, or the starts of them
+            self.assertEqual(admin_search(url, u'witty'), [1])
+            self.assertEqual(admin_search(url, u'Wit DESCRIP'), [1])
+            self.assertEqual(admin_search(url, u'fourth'), [4])
+            self.assertEqual(admin_search(url, u'witty llamas'), [])
+
+            url = reverse('admin:magazine_bookreview_changelist')
+            self.assertEqual(admin_search(url, u'bloggs'), [self.review.pk])
+            self.assertEqual(admin_search(url, u'paragr'), [self.review.pk])
@@ -0,0 +1,106 @@
+import os
+import shutil
+import tempfile
+from datetime import date
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from magazine.models import Article, Issue
+from magazine.static_export import get_output_filename, read_manifest
+from magazine.tests.test_utils import initialise_article_text
+
+
+class StaticExportTestCase(TestCase):
+    fixtures = ['test_issues.json',
+                'test_authors.json',
+                'test_articles.json', ]
+
+    def setUp(self):
+        cache.clear()
+        initialise_article_text()
+        self.output_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def export(self, **options):
+        call_command('magazine_export_static', self.output_dir,
+                     processes=1, verbosity=0, **options)
+
+    def get_filename(self, article):
+        return get_output_filename(self.output_dir,
+                                   article.get_absolute_url())
+
+    def testExport(self):
+        self.export()
+
+        published = Article.objects.get(pk=5)
+        self.assertTrue(os.path.exists(self.get_filename(published)))
+        with open(self.get_filename(published)) as f:
+            self.assertTrue(published.title in f.read())
+
+        # Exporting pages isn't visiting them
+        self.assertEqual(Article.objects.get(pk=5).hits, published.hits)
+
+        # Articles in unpublished issues aren't exported
+        unpublished = Article.objects.get(pk=4)
+        self.assertFalse(os.path.exists(self.get_filename(unpublished)))
+        self.assertFalse(unpublished.get_absolute_url() in
+                         read_manifest(self.output_dir))
+
+        self.assertTrue(os.path.exists(
+            get_output_filename(self.output_dir,
+                                reverse('magazine_author_detail', args=[2]))))
+
+    def testIssueListNotPaginated(self):
+        for year in range(1990, 2002):
+            Issue.objects.create(number=year, issue_date=date(year, 6, 1))
+
+        self.export()
+
+        with open(get_output_filename(self.output_dir,
+                                      reverse('magazine_issues'))) as f:
+            content = f.read()
+        self.assertTrue(u'1990' in content)
+        self.assertFalse(u'?page=' in content)
+
+        # The live site is still paginated.
+        response = self.client.get(reverse('magazine_issues'))
+        self.assertNotContains(response, u'1990')
+        self.assertContains(response, u'?page=2')
+
+    def testIncrementalExport(self):
+        self.export()
+
+        article = Article.objects.get(pk=5)
+        other_article = Article.objects.get(pk=3)
+        os.remove(self.get_filename(article))
+        os.remove(self.get_filename(other_article))
+
+        article.title = u'A new title'
+        article.save()
+
+        self.export()
+
+        # Only the changed article is rendered again
+        with open(self.get_filename(article)) as f:
+            self.assertTrue(u'A new title' in f.read())
+        self.assertFalse(os.path.exists(self.get_filename(other_article)))
+
+        self.export(full=True)
+        self.assertTrue(os.path.exists(self.get_filename(other_article)))
+
+    def testUnpublishedPagesRemoved(self):
+        self.export()
+
+        article = Article.objects.get(pk=5)
+        issue = article.issue
+        issue.published = False
+        issue.save()
+
+        self.export()
+
+        self.assertFalse(os.path.exists(self.get_filename(article)))
+        self.assertFalse(article.get_absolute_url() in
+                         read_manifest(self.output_dir))
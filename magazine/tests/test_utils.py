@@ -2,11 +2,12 @@ from magazine.models import Article
 
 
 # Loading from fixtures doesn't call Article.save(), so the
-# cleaned_text won't be populated. We therefore need to force
-# it here.
+# cleaned_text and teaser_text won't be populated. We therefore need to
+# force it here.
 def initialise_article_text():
     for article in Article.objects.all():
-        if article.text and not article.cleaned_text:
+        if article.teaser_text is None or \
+                (article.text and not article.cleaned_text):
             article.save()
 
 
@@ -20,3 +21,19 @@ class LoginGuard(object):
 
     def __exit__(self, exc_type, exc_value, traceback):
         self.client.logout()
+
+
+def __object_key(obj):
+    # Listings defer the article text, and before Django 1.6 instances
+    # with deferred fields don't compare equal to plain ones.
+    model = obj.__class__.__base__ if obj._deferred else obj.__class__
+    return model, obj.pk
+
+
+def assert_same_objects(test_case, first, second):
+    """
+    Asserts that ``first`` and ``second`` are the same model instances,
+    in the same order, whether or not any of their fields are deferred.
+    """
+    test_case.assertEqual([__object_key(obj) for obj in first],
+                          [__object_key(obj) for obj in second])
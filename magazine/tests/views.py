@@ -1,8 +1,13 @@
+from datetime import date
 from django.contrib.auth.models import User
 from django.core.urlresolvers import reverse
 from django.test import TestCase
-from magazine.models import Author, Issue, Article
-from magazine.tests.test_utils import initialise_article_text, LoginGuard
+from magazine.author_summaries import build_author_summary
+from magazine.models import BODY_FIELDS, Author, Issue, Article
+from magazine.tests.test_utils import (assert_same_objects,
+                                       initialise_article_text, LoginGuard)
+from magazine.utils.cache_versions import bump_version
+from magazine.utils.word_cleaner import CLEANED_TEXT_VERSION_KEY
 
 
 class MagazineGeneralViewsTestCase(TestCase):
@@ -40,9 +45,9 @@ class MagazineGeneralViewsTestCase(TestCase):
     def testIndexView(self):
         response = self.client.get(reverse('magazine_index'))
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(list(response.context['current_articles']),
-                         [self.article_by_dom_issue_2,
-                          self.article_by_dom_and_paul, ])
+        assert_same_objects(self, response.context['current_articles'],
+                            [self.article_by_dom_issue_2,
+                             self.article_by_dom_and_paul, ])
         self.assertEqual(response.context['current_issue'], self.issue_2)
         self.assertNotContains(response, self.article_by_paul.teaser())
         self.assertNotContains(response, self.article_by_dom.teaser())
@@ -54,8 +59,8 @@ class MagazineGeneralViewsTestCase(TestCase):
 
         response = self.client.get(reverse('magazine_index'))
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(list(response.context['current_articles']),
-                         [self.article_by_paul, self.article_by_dom, ])
+        assert_same_objects(self, response.context['current_articles'],
+                            [self.article_by_paul, self.article_by_dom, ])
         self.assertEqual(response.context['current_issue'], self.issue_1)
         self.assertContains(response, self.article_by_paul.teaser())
         self.assertContains(response, self.article_by_dom.teaser())
@@ -68,8 +73,8 @@ class MagazineGeneralViewsTestCase(TestCase):
         response = self.client.get(reverse('magazine_issue_detail', args=[1]))
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.context['issue'], self.issue_1)
-        self.assertEqual(list(response.context['articles']),
-                         [self.article_by_paul, self.article_by_dom])
+        assert_same_objects(self, response.context['articles'],
+                            [self.article_by_paul, self.article_by_dom])
         self.assertContains(response,
                             self.article_by_paul.authors.all()[0].
                             __unicode__())
@@ -91,8 +96,8 @@ class MagazineGeneralViewsTestCase(TestCase):
         response = self.client.get(reverse('magazine_issue_detail', args=[1]))
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.context['issue'], self.issue_1)
-        self.assertEqual(list(response.context['articles']),
-                         [self.article_by_dom, self.article_by_paul])
+        assert_same_objects(self, response.context['articles'],
+                            [self.article_by_dom, self.article_by_paul])
 
         self.article_by_paul.order_in_issue = old_order_in_issue
         self.article_by_paul.save()
@@ -115,15 +120,15 @@ class MagazineGeneralViewsTestCase(TestCase):
             self.assertEqual(response.status_code, 200)
             self.assertEqual(response.context['issue'],
                              self.issue_3_unpublished)
-            self.assertEqual(list(response.context['articles']),
-                             [self.article_by_dom_unpublished, ])
+            assert_same_objects(self, response.context['articles'],
+                                [self.article_by_dom_unpublished, ])
 
         response = self.client.get(reverse('magazine_issue_detail', args=[3]))
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.context['issue'], self.issue_2)
-        self.assertEqual(list(response.context['articles']),
-                         [self.article_by_dom_issue_2,
-                          self.article_by_dom_and_paul, ])
+        assert_same_objects(self, response.context['articles'],
+                            [self.article_by_dom_issue_2,
+                             self.article_by_dom_and_paul, ])
 
         response = self.client.get(reverse('magazine_issue_detail', args=[4]))
         self.assertEqual(response.status_code, 404)
@@ -212,13 +217,29 @@ class MagazineGeneralViewsTestCase(TestCase):
         self.assertContains(response, '<h5>Heading 4</h5>')
         self.assertContains(response, '<h6>Heading 5</h6>')
 
+    def testArticleDetailViewQueries(self):
+        # The article and its issue, its authors, and the hit count
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('magazine_article_detail',
+                                               args=[3, 5]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['issue'], self.issue_2)
+
+        # Fetching an article from an unpublished issue doesn't count
+        # a hit
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('magazine_article_detail',
+                                               args=[2, 4]))
+        self.assertEqual(response.status_code, 404)
+
     def testAuthorDetailView(self):
         response = self.client.get(reverse('magazine_author_detail',
                                            args=[1, ]))
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.context['author'], self.paul)
-        self.assertEqual(list(response.context['articles']),
-                         [self.article_by_dom_and_paul, self.article_by_paul])
+        assert_same_objects(self, response.context['articles'],
+                            [self.article_by_dom_and_paul,
+                             self.article_by_paul])
         self.assertContains(response, u'Paul Beasley-Murray')
         self.assertContains(response, self.article_by_paul.get_absolute_url())
         self.assertContains(response,
@@ -228,10 +249,10 @@ class MagazineGeneralViewsTestCase(TestCase):
                                            args=[2, ]))
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.context['author'], self.dominic)
-        self.assertEqual(list(response.context['articles']),
-                         [self.article_by_dom_issue_2,
-                          self.article_by_dom_and_paul,
-                          self.article_by_dom, ])
+        assert_same_objects(self, response.context['articles'],
+                            [self.article_by_dom_issue_2,
+                             self.article_by_dom_and_paul,
+                             self.article_by_dom, ])
         self.assertContains(response, u'Dominic Rodger')
         self.assertNotContains(response,
                                self.article_by_paul.get_absolute_url())
@@ -254,10 +275,10 @@ class MagazineGeneralViewsTestCase(TestCase):
             response = self.client.get(reverse('magazine_author_detail',
                                                args=[2, ]))
             self.assertEqual(response.status_code, 200)
-            self.assertEqual(list(response.context['articles']),
-                             [self.article_by_dom_issue_2,
-                              self.article_by_dom_and_paul,
-                              self.article_by_dom])
+            assert_same_objects(self, response.context['articles'],
+                                [self.article_by_dom_issue_2,
+                                 self.article_by_dom_and_paul,
+                                 self.article_by_dom])
 
         # Check that you can see articles from unpublished issues if you're
         # logged in as a staff member
@@ -265,11 +286,68 @@ class MagazineGeneralViewsTestCase(TestCase):
             response = self.client.get(reverse('magazine_author_detail',
                                                args=[2, ]))
             self.assertEqual(response.status_code, 200)
-            self.assertEqual(list(response.context['articles']),
-                             [self.article_by_dom_unpublished,
-                              self.article_by_dom_issue_2,
-                              self.article_by_dom_and_paul,
-                              self.article_by_dom])
+            assert_same_objects(self, response.context['articles'],
+                                [self.article_by_dom_unpublished,
+                                 self.article_by_dom_issue_2,
+                                 self.article_by_dom_and_paul,
+                                 self.article_by_dom])
+
+    def testListingsDeferText(self):
+        response = self.client.get(reverse('magazine_issue_detail', args=[1]))
+
+        for obj in response.context['articles']:
+            for field in BODY_FIELDS:
+                self.assertFalse(field in obj.__dict__)
+
+        # The teaser is stored, so doesn't need the text either.
+        self.assertContains(response, self.article_by_dom.teaser())
+        for obj in response.context['articles']:
+            for field in BODY_FIELDS:
+                self.assertFalse(field in obj.__dict__)
+
+    def testAuthorDetailSummaryCached(self):
+        url = reverse('magazine_author_detail', args=[2, ])
+        self.client.get(url)
+
+        # Just the author - the ETag comes from the summary, which
+        # includes the articles themselves.
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.context['num_articles'], 3)
+        assert_same_objects(self, response.context['articles'],
+                            [self.article_by_dom_issue_2,
+                             self.article_by_dom_and_paul,
+                             self.article_by_dom, ])
+
+        etag = response['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Publishing an issue changes the summary (and the ETag)...
+        self.issue_3_unpublished.issue_date = date(2011, 1, 1)
+        self.issue_3_unpublished.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['num_articles'], 4)
+        assert_same_objects(self, response.context['articles'][:1],
+                            [self.article_by_dom_unpublished])
+
+        # ...as does changing an article's authors.
+        self.article_by_dom.authors.remove(self.dominic)
+        response = self.client.get(url)
+        self.assertEqual(response.context['num_articles'], 3)
+        self.assertFalse(self.article_by_dom.pk in
+                         [article.pk for article in
+                          response.context['articles']])
+
+        # Summaries depend on the date, since issues go live on their
+        # issue date.
+        summary = build_author_summary(self.dominic, today=date(2010, 2, 1))
+        self.assertEqual(summary['num_articles'], 0)
+        summary = build_author_summary(self.paul, today=date(2010, 2, 1))
+        assert_same_objects(self, summary['articles'],
+                            [self.article_by_paul])
 
     def testIssueListView(self):
         response = self.client.get(reverse('magazine_issues'))
@@ -352,3 +430,84 @@ class MagazineGeneralViewsTestCase(TestCase):
         response = self.client.get(reverse('magazine_author_articles',
                                            args=[73, ]))
         self.assertEqual(response.status_code, 404)
+
+    def testConditionalGet(self):
+        urls = [reverse('magazine_index'),
+                reverse('magazine_issue_detail', args=[1, ]),
+                reverse('magazine_article_detail', args=[3, 5]),
+                reverse('magazine_author_detail', args=[2, ]),
+                reverse('magazine_author_articles', args=[2, ]), ]
+
+        for url in urls:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.has_header('ETag'))
+            # Pages depend on things without a timestamp.
+            self.assertFalse(response.has_header('Last-Modified'))
+
+            etag = response['ETag']
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.content, '')
+
+            response = self.client.get(
+                url, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+            self.assertEqual(response.status_code, 200)
+
+            response = self.client.get(url, HTTP_IF_NONE_MATCH='"stale"')
+            self.assertEqual(response.status_code, 200)
+
+    def testConditionalGetDoesNotCountHits(self):
+        url = reverse('magazine_article_detail', args=[3, 5])
+        etag = self.client.get(url)['ETag']
+        hits = Article.objects.get(pk=5).hits
+
+        with self.assertNumQueries(2):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(Article.objects.get(pk=5).hits, hits)
+
+    def testConditionalGetChangedByline(self):
+        url = reverse('magazine_issue_detail', args=[1, ])
+        etag = self.client.get(url)['ETag']
+
+        # Changes an article's byline without saving the article.
+        self.article_by_paul.authors.add(self.dominic)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def testConditionalGetTextCleanedAgain(self):
+        urls = [reverse('magazine_issue_detail', args=[3, ]),
+                reverse('magazine_article_detail', args=[3, 5]), ]
+        etags = [self.client.get(url)['ETag'] for url in urls]
+
+        # As magazine_resanitize does, without changing "updated".
+        Article.objects.filter(pk=5).update(
+            cleaned_text=u'<p>Cleaned again</p>',
+            demoted_cleaned_text=u'<p>Cleaned again</p>',
+            teaser_text=u'Cleaned again')
+        bump_version(CLEANED_TEXT_VERSION_KEY)
+
+        for url, etag in zip(urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, u'Cleaned again')
+            self.assertNotEqual(response['ETag'], etag)
+
+    def testConditionalGetChangedArticle(self):
+        url = reverse('magazine_article_detail', args=[3, 5])
+        etag = self.client.get(url)['ETag']
+
+        self.article_by_dom_and_paul.title = u'A new title'
+        self.article_by_dom_and_paul.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        # Staff users see a different page, so get a different ETag
+        self.client.login(username='staff', password='password')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
@@ -3,7 +3,7 @@ from magazine.views import (CurrentIssueListView, IssueListView, IssueView,
                             ArticleView, AuthorListView,
                             AuthorListViewAlphabetised, AuthorDetailView,
                             BookReviewView, AuthorArticlesView,
-                            AuthorBookReviewsView)
+                            AuthorBookReviewsView, SearchView)
 
 urlpatterns = patterns(
     '',
@@ -25,4 +25,5 @@ urlpatterns = patterns(
         AuthorArticlesView.as_view(), name='magazine_author_articles'),
     url(r'^authors/(?P<pk>([0-9]+))/reviews/$',
         AuthorBookReviewsView.as_view(), name='magazine_author_book_reviews'),
+    url(r'^search/$', SearchView.as_view(), name='magazine_search'),
 )
@@ -0,0 +1,48 @@
+"""
+Version tokens for cache invalidation.
+
+Rather than deleting cached values when the data behind them changes,
+cache keys include a version token, which is replaced when the data
+changes. Tokens are unique (rather than counters), so if a version key
+is evicted, values cached under the old version are never revived.
+"""
+import random
+import time
+from django.core.cache import cache
+
+
+VERSION_TIMEOUT = 60 * 60 * 24 * 30
+
+
+def new_version():
+    return u'{0:x}{1:04x}'.format(int(time.time() * 1000000),
+                                  random.getrandbits(16))
+
+
+def get_versions(keys):
+    """
+    Returns a dictionary mapping each of ``keys`` to its current version,
+    creating versions for any which don't have one yet.
+    """
+    versions = cache.get_many(keys)
+    missing = dict((key, new_version()) for key in keys
+                   if key not in versions)
+
+    if missing:
+        cache.set_many(missing, VERSION_TIMEOUT)
+        versions.update(missing)
+
+    return versions
+
+
+def get_version(key):
+    return get_versions([key])[key]
+
+
+def bump_versions(keys):
+    cache.set_many(dict((key, new_version()) for key in keys),
+                   VERSION_TIMEOUT)
+
+
+def bump_version(key):
+    bump_versions([key])
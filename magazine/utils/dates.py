@@ -0,0 +1,35 @@
+import calendar
+from datetime import date, datetime, time, timedelta
+
+
+def __days_in_month(year, month):
+    return calendar.monthrange(year, month)[1]
+
+
+def subtract_n_months(date_val, num_months):
+    # Split the number of months to subtract into months and years
+    year, month = divmod(num_months, 12)
+
+    if date_val.month <= month:
+        year = date_val.year - year - 1
+        month = date_val.month - month + 12
+    else:
+        year = date_val.year - year
+        month = date_val.month - month
+
+    try:
+        return date(year, month, date_val.day)
+    except ValueError:
+        return date(year, month, __days_in_month(year, month))
+
+
+def seconds_until_midnight(now=None):
+    # Issues go live (and embargoes end) at the start of a day, so
+    # anything which depends on the date can be cached until midnight.
+    if now is None:
+        now = datetime.now()
+
+    midnight = datetime.combine(now.date() + timedelta(days=1), time())
+    remaining = midnight - now
+
+    return max(remaining.days * 86400 + remaining.seconds, 1)
@@ -0,0 +1,17 @@
+import re
+
+
+heading_pattern = re.compile(r'<(/?)h(\d)>')
+
+
+def increment_heading_tag(match):
+    return '<{0}h{1}>'.format(match.group(1), int(match.group(2)) + 1)
+
+
+def demote_headings(text):
+    """
+    Demotes every heading in ``text`` by one level (``<h1>`` becomes
+    ``<h2>`` and so on), so that article headings sit beneath the page
+    title.
+    """
+    return heading_pattern.sub(increment_heading_tag, text)
@@ -0,0 +1,76 @@
+import threading
+
+
+class LRUCache(object):
+    """
+    A dictionary-like cache which holds at most ``size`` items,
+    discarding the least recently used when it's full. It's shared by
+    every thread in the process, so changes to the linked list are made
+    under a lock.
+    """
+    # Indexes into the linked list entries.
+    PREVIOUS, NEXT, KEY, VALUE = 0, 1, 2, 3
+
+    def __init__(self, size):
+        self.size = size
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+            # The root of a circular doubly linked list of entries, most
+            # recently used first.
+            self.root = []
+            self.root[:] = [self.root, self.root, None, None]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __unlink(self, entry):
+        entry[self.PREVIOUS][self.NEXT] = entry[self.NEXT]
+        entry[self.NEXT][self.PREVIOUS] = entry[self.PREVIOUS]
+
+    def __push(self, entry):
+        first = self.root[self.NEXT]
+        entry[self.PREVIOUS] = self.root
+        entry[self.NEXT] = first
+        first[self.PREVIOUS] = entry
+        self.root[self.NEXT] = entry
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is None:
+                return default
+
+            self.__unlink(entry)
+            self.__push(entry)
+            return entry[self.VALUE]
+
+    def set(self, key, value):
+        if self.size <= 0:
+            return
+
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is not None:
+                self.__unlink(entry)
+                entry[self.VALUE] = value
+            else:
+                # The size can shrink under us, so drop as many as it
+                # takes to make room.
+                while self.entries and len(self.entries) >= self.size:
+                    last = self.root[self.PREVIOUS]
+                    self.__unlink(last)
+                    del self.entries[last[self.KEY]]
+
+                entry = [None, None, key, value]
+                self.entries[key] = entry
+
+            self.__push(entry)
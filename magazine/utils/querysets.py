@@ -0,0 +1,26 @@
+def queryset_in_chunks(queryset, chunk_size=500, start_after=None):
+    """
+    Yields lists of at most ``chunk_size`` objects from ``queryset``,
+    in primary key order, starting after the primary key
+    ``start_after`` (if given).
+
+    Each chunk is fetched with its own query, so only one chunk is held
+    in memory at a time, and rows can safely be updated between
+    chunks.
+    """
+    queryset = queryset.order_by('pk')
+    last_pk = start_after
+
+    while True:
+        chunk_qs = queryset
+
+        if last_pk is not None:
+            chunk_qs = chunk_qs.filter(pk__gt=last_pk)
+
+        chunk = list(chunk_qs[:chunk_size])
+
+        if not chunk:
+            return
+
+        yield chunk
+        last_pk = chunk[-1].pk
@@ -0,0 +1,455 @@
+"""
+A streaming HTML sanitizer.
+
+``clean_word_text`` used to parse each document twice: once in
+``strip_styles`` (building a DOM to drop ``<style>`` blocks) and again
+in ``bleach.clean``. ``sanitize_html`` does the same job over html5lib's
+tokenizer, without building a tree: tokens are filtered as they're
+read, and passed straight to the serializer.
+
+Rather than a tree, it keeps a stack of open elements, which is enough
+to apply the parts of the HTML5 tree construction rules which change
+the output of the old pipeline - closing paragraphs, list items and
+headings when a block starts, closing elements left open inside one
+which ends (but not outside the element's scope), re-opening formatting
+elements (``<b>``, ``<em>`` and so on) which were closed implicitly,
+closing whatever was misplaced inside a table when the next row or cell
+starts, and closing whatever is left open at the end.
+
+Like the old pipeline, this is done twice, by two chained filters: once
+over every tag (the old ``strip_styles`` tree), and again over just the
+whitelisted ones (bleach's tree), since dropping a tag changes how the
+tags around it nest - in ``<h2><pre>x<h1>``, the ``<h1>`` is only
+outside the ``<h2>`` because the ``<pre>`` has gone.
+
+A heading start tag only closes a heading which is the current element,
+so in ``<h2><strong>a<h2>b``, the second heading is nested inside the
+first, as it was by the old pipeline (and as html5lib nests it).
+
+The output differs from the old pipeline's in three cases, which would
+need tags already written to be moved:
+
+* When a formatting element ends around a block it contains (including
+  an ``<a>`` starting inside another), the tree builder splits it, so
+  ``<b>1<p>2</b>3</p>`` was ``<b>1</b><p><b>2</b>3</p>``. Here, the
+  formatting element stays open until the block closes, giving
+  ``<b>1<p>23</p></b>``. Headings are blocks too, so
+  ``<h1><strong>x<h2>y</strong>z`` was
+  ``<h1><strong>x</strong></h1><h2><strong>y</strong>z</h2>`` (the
+  second parse moving the ``<h2>`` out of the ``<h1>`` once it was
+  split from the ``<strong>``), but is now
+  ``<h1><strong>x<h2>yz</h2></strong></h1>``.
+* Text misplaced inside a table, outside a cell, was moved before the
+  table. Here, it stays where it was.
+* ``<script>`` bodies are kept as (escaped) text, rather than being
+  parsed as HTML.
+"""
+import re
+from xml.sax.saxutils import unescape
+from html5lib.constants import (formattingElements, headingElements,
+                                scopingElements, specialElements,
+                                tokenTypes, voidElements)
+from html5lib.sanitizer import HTMLSanitizerMixin
+from html5lib.serializer.htmlserializer import HTMLSerializer
+from html5lib.tokenizer import HTMLTokenizer
+
+
+# Elements which close an open paragraph when they start.
+CLOSES_P = frozenset([
+    'address', 'article', 'aside', 'blockquote', 'center', 'datagrid',
+    'details', 'dir', 'div', 'dl', 'fieldset', 'figure', 'footer',
+    'header', 'hgroup', 'menu', 'nav', 'ol', 'p', 'section', 'ul', 'pre',
+    'listing', 'form', 'li', 'dd', 'dt', 'plaintext', 'table', 'hr',
+    'xmp', ] + list(headingElements))
+
+# Start tags which don't re-open implicitly closed formatting elements.
+NO_RECONSTRUCT = CLOSES_P | frozenset(['table', 'caption', 'col',
+                                       'colgroup', 'tbody', 'td', 'tfoot',
+                                       'th', 'thead', 'tr'])
+
+FORMATTING = frozenset(name for namespace, name in formattingElements)
+
+# Elements which stay open when a formatting element around them ends.
+BLOCKS = frozenset(name for namespace, name in
+                   list(specialElements) + list(scopingElements))
+
+# Elements which an end tag can't close elements outside of.
+SCOPE = frozenset(name for namespace, name in scopingElements)
+
+# Elements which stop a new list item closing the one before.
+LIST_ITEM_SCOPE = BLOCKS - frozenset(['address', 'div', 'p'])
+
+# The elements which each part of a table goes inside. Anything else
+# left open there (whatever was misplaced inside the table, outside a
+# cell) is closed when the part starts.
+TABLE_CONTEXTS = {
+    'caption': ('table', ),
+    'colgroup': ('table', ),
+    'col': ('table', 'colgroup'),
+    'tbody': ('table', ),
+    'thead': ('table', ),
+    'tfoot': ('table', ),
+    'tr': ('table', 'tbody', 'thead', 'tfoot'),
+    'td': ('table', 'tbody', 'thead', 'tfoot', 'tr'),
+    'th': ('table', 'tbody', 'thead', 'tfoot', 'tr'),
+}
+
+CELLS = frozenset(['td', 'th', 'caption'])
+
+# Tags which are dropped entirely when parsing a fragment.
+IGNORED = frozenset(['html', 'head', 'body'])
+
+# The tokenizer state to switch to after each of these elements starts.
+TEXT_STATES = {
+    'script': 'scriptDataState',
+    'xmp': 'rawtextState',
+    'iframe': 'rawtextState',
+    'noembed': 'rawtextState',
+    'noframes': 'rawtextState',
+    'noscript': 'rawtextState',
+    'textarea': 'rcdataState',
+    'title': 'rcdataState',
+    'plaintext': 'plaintextState',
+}
+
+START_TAG = tokenTypes['StartTag']
+END_TAG = tokenTypes['EndTag']
+EMPTY_TAG = tokenTypes['EmptyTag']
+CHARACTERS = tokenTypes['Characters']
+SPACE_CHARACTERS = tokenTypes['SpaceCharacters']
+
+uri_pattern = re.compile(r'^[a-z0-9][-+.a-z0-9]*:')
+uri_junk_pattern = re.compile(u'[`\000-\040\177-\240\\s]+')
+
+
+def clean_attributes(attributes, allowed):
+    """
+    Returns the whitelisted ``attributes`` (a list of ``(name, value)``
+    pairs, as produced by the tokenizer) as a dictionary. Like bleach,
+    the first of repeated attributes wins, and URIs using protocols
+    other than html5lib's safe ones are dropped.
+    """
+    cleaned = dict((name, value) for name, value in attributes[::-1]
+                   if name in allowed and name != 'style')
+
+    for name in HTMLSanitizerMixin.attr_val_is_uri:
+        if name not in cleaned:
+            continue
+
+        value = uri_junk_pattern.sub(u'', unescape(cleaned[name])).lower()
+        value = value.replace(u'\ufffd', u'')
+
+        if uri_pattern.match(value) and value.split(u':')[0] not in \
+                HTMLSanitizerMixin.allowed_protocols:
+            del cleaned[name]
+
+    return cleaned
+
+
+class SanitizingFilter(object):
+    """
+    Turns the tokens from ``tokenizer`` into a stream of whitelisted
+    tokens for html5lib's serializer. If ``tags`` is None, every tag is
+    kept, with its attributes as they were.
+    """
+    def __init__(self, tokenizer, tags, attributes, strip_contents):
+        self.tokenizer = tokenizer
+        self.tags = frozenset(tags) if tags is not None else None
+        self.attributes = attributes
+        self.strip_contents = frozenset(strip_contents)
+
+        # [name, attributes, ended] for each open element. Attributes
+        # are None for elements which are open, but stripped from the
+        # output, and ended is True for formatting elements whose end
+        # tag has been read, but which are still open around a block.
+        self.open_elements = []
+        # Formatting elements which were closed implicitly, and will be
+        # re-opened before any more text.
+        self.pending_formatting = []
+        # The pending formatting elements from outside each open table
+        # cell, which aren't re-opened inside it.
+        self.cell_formatting = []
+        # The element whose contents we're dropping, if any.
+        self.stripping = None
+
+    def open_element(self, name, attributes):
+        self.open_elements.append([name, attributes, False])
+
+        if attributes is not None:
+            return [{'type': 'StartTag', 'name': name, 'namespace': None,
+                     'data': attributes}]
+
+        return []
+
+    def close_elements(self, index):
+        """
+        Closes the open elements from ``index`` upwards, and returns the
+        tokens to do so, and the elements closed above ``index``.
+        Formatting elements which have ended, but were kept open around
+        a block, close along with it. Elements inside a table cell which
+        closes aren't counted as being above ``index``, since formatting
+        doesn't carry on out of a cell.
+        """
+        above = self.open_elements[index + 1:]
+        while index > 0 and self.open_elements[index - 1][2]:
+            index -= 1
+
+        closed = self.open_elements[index:]
+        del self.open_elements[index:]
+
+        cells = [i for i, (name, attributes, ended) in enumerate(closed)
+                 if name in CELLS]
+        if cells:
+            self.pending_formatting = self.cell_formatting[-len(cells)]
+            del self.cell_formatting[-len(cells):]
+            above = closed[cells[-1] + 1:]
+
+        tokens = [{'type': 'EndTag', 'name': name, 'namespace': None,
+                   'data': []}
+                  for name, attributes, ended in reversed(closed)
+                  if attributes is not None]
+
+        return tokens, above
+
+    def close_implicitly(self, index):
+        tokens, above = self.close_elements(index)
+
+        for name, attributes, ended in above:
+            if name in FORMATTING and attributes is not None and not ended:
+                self.pending_formatting.append((name, attributes))
+
+        return tokens
+
+    def find_open(self, name, stop_at=()):
+        for index in xrange(len(self.open_elements) - 1, -1, -1):
+            open_name, attributes, ended = self.open_elements[index]
+
+            if open_name == name and not ended:
+                return index
+
+            if open_name in stop_at:
+                return None
+
+        return None
+
+    def reconstruct_formatting(self):
+        tokens = []
+
+        for name, attributes in self.pending_formatting:
+            tokens.extend(self.open_element(name, attributes))
+
+        self.pending_formatting = []
+        return tokens
+
+    def start_tag(self, token):
+        name = token['name']
+        tokens = []
+
+        if name in IGNORED:
+            return tokens
+
+        if name in self.strip_contents:
+            # Like the old pipeline, the contents of a self-closing
+            # <style /> aren't dropped.
+            if not token['selfClosing']:
+                self.stripping = name
+            return tokens
+
+        if name in CLOSES_P:
+            index = self.find_open('p', stop_at=SCOPE)
+            if index is not None:
+                tokens.extend(self.close_implicitly(index))
+
+        if name in headingElements and self.open_elements and \
+                self.open_elements[-1][0] in headingElements:
+            tokens.extend(self.close_implicitly(len(self.open_elements) - 1))
+
+        if name in ('li', 'dd', 'dt'):
+            index = self.find_open(name, stop_at=LIST_ITEM_SCOPE)
+            if index is not None:
+                tokens.extend(self.close_implicitly(index))
+
+        if name in TABLE_CONTEXTS:
+            index = self.find_open('table')
+            if index is None:
+                # Parts of a table are ignored outside one.
+                return tokens
+
+            context = [self.find_open(context_name, stop_at=('table', ))
+                       for context_name in TABLE_CONTEXTS[name]]
+            index = max(i for i in context + [index] if i is not None)
+            tokens.extend(self.close_implicitly(index + 1))
+
+            if name in CELLS:
+                self.cell_formatting.append(self.pending_formatting)
+                self.pending_formatting = []
+
+        if name == 'table':
+            # A table inside another one (but not in a cell) ends it.
+            index = self.find_open('table', stop_at=CELLS)
+            if index is not None:
+                tokens.extend(self.close_implicitly(index))
+
+        if name == 'a':
+            index = self.find_open('a')
+            if index is not None:
+                tokens.extend(self.end_formatting(index))
+            self.pending_formatting = [
+                (pending_name, attributes)
+                for pending_name, attributes in self.pending_formatting
+                if pending_name != 'a']
+
+        if name not in NO_RECONSTRUCT:
+            tokens.extend(self.reconstruct_formatting())
+
+        if self.tags is None:
+            attributes = token['data']
+        elif name in self.tags:
+            attributes = clean_attributes(token['data'],
+                                          self.attributes.get(name, ()))
+        else:
+            attributes = None
+
+        if name in voidElements:
+            if attributes is not None:
+                tokens.append({'type': 'EmptyTag', 'name': name,
+                               'namespace': None, 'data': attributes})
+        else:
+            tokens.extend(self.open_element(name, attributes))
+
+        if name in TEXT_STATES and isinstance(self.tokenizer, HTMLTokenizer):
+            self.tokenizer.state = getattr(self.tokenizer, TEXT_STATES[name])
+
+        return tokens
+
+    def end_tag(self, token):
+        name = token['name']
+
+        if name in IGNORED:
+            return []
+
+        if name == 'br':
+            # The tree builder treats </br> as <br>, which re-opens any
+            # formatting elements closed implicitly before it.
+            return self.start_tag({'name': 'br', 'data': [],
+                                   'selfClosing': False})
+
+        if name in headingElements:
+            # Any heading's end tag closes whichever heading is open.
+            open_headings = [index for index in
+                             (self.find_open(heading, stop_at=SCOPE)
+                              for heading in headingElements)
+                             if index is not None]
+            index = max(open_headings) if open_headings else None
+        elif name == 'li':
+            index = self.find_open(name, stop_at=SCOPE | set(['ol', 'ul']))
+        elif name in BLOCKS:
+            index = self.find_open(name, stop_at=SCOPE)
+        elif name in FORMATTING:
+            index = self.find_open(name)
+        else:
+            # Other end tags can't close a block they're outside of.
+            index = self.find_open(name, stop_at=BLOCKS)
+
+        if index is None:
+            self.pending_formatting = [
+                (pending_name, attributes)
+                for pending_name, attributes in self.pending_formatting
+                if pending_name != name]
+
+            # A stray </p> makes an empty paragraph.
+            if name == 'p' and (self.tags is None or 'p' in self.tags):
+                return self.open_element('p', {}) + \
+                    self.close_elements(len(self.open_elements) - 1)[0]
+
+            return []
+
+        if name not in FORMATTING:
+            return self.close_implicitly(index)
+
+        return self.end_formatting(index)
+
+    def end_formatting(self, index):
+        """
+        Ends the formatting element at ``index``, which may have other
+        elements open inside it.
+        """
+        if [name for name, attributes, ended in self.open_elements[index:]
+                if name in BLOCKS]:
+            # The tree builder would move the block out of the formatting
+            # element. We can't take back tags already written, so the
+            # formatting element stays open (but can't be ended again)
+            # until the block closes.
+            self.open_elements[index][2] = True
+            return []
+
+        # Formatting elements left open inside it carry on after it -
+        # "<b>1<i>2</b>3</i>" is "<b>1<i>2</i></b><i>3</i>".
+        return self.close_implicitly(index)
+
+    def __iter__(self):
+        for token in self.tokenizer:
+            token_type = token['type']
+
+            if self.stripping is not None:
+                if token_type == END_TAG and token['name'] == self.stripping:
+                    self.stripping = None
+                continue
+
+            if token_type in (CHARACTERS, SPACE_CHARACTERS):
+                for reopened in self.reconstruct_formatting():
+                    yield reopened
+                yield {'type': 'Characters', 'data': token['data']}
+            elif token_type in (START_TAG, EMPTY_TAG):
+                for tag_token in self.start_tag(token):
+                    yield tag_token
+            elif token_type == END_TAG:
+                for tag_token in self.end_tag(token):
+                    yield tag_token
+
+            # Comments, doctypes and parse errors are dropped.
+
+        for tag_token in self.close_elements(0)[0]:
+            yield tag_token
+
+
+def retokenize(stream, tags):
+    """
+    Turns the tokens from a ``SanitizingFilter`` back into tokenizer
+    tokens for another one, dropping tags other than ``tags``.
+    """
+    for token in stream:
+        token_type = token['type']
+
+        if token_type == 'Characters':
+            yield {'type': CHARACTERS, 'data': token['data']}
+        elif token['name'] in tags:
+            # Stray </p>s make paragraphs with no attributes.
+            attributes = token['data']
+            if isinstance(attributes, dict):
+                attributes = attributes.items()
+
+            yield {'type': tokenTypes[token_type], 'name': token['name'],
+                   'data': attributes, 'selfClosing': False}
+
+
+def sanitize_html(text, tags, attributes, strip_contents=('style',)):
+    """
+    Returns ``text`` with only the whitelisted ``tags`` and
+    ``attributes`` (a dictionary mapping tag names to lists of attribute
+    names). Other tags are stripped (but their text kept), except for
+    the elements in ``strip_contents``, which are dropped along with
+    their contents. Comments are always dropped.
+    """
+    if not text:
+        return u''
+
+    # Tags are only dropped in the second pass, after the first has
+    # nested them as the old strip_styles() tree did.
+    stream = SanitizingFilter(HTMLTokenizer(text), None, attributes,
+                              strip_contents)
+    stream = SanitizingFilter(retokenize(stream, tags), tags, attributes, ())
+    serializer = HTMLSerializer(quote_attr_values=True,
+                                omit_optional_tags=False)
+
+    return serializer.render(stream).strip()
@@ -1,18 +1,63 @@
 import bleach
-from style_stripper import strip_styles
+import hashlib
+from django.conf import settings
+from magazine.utils.lru import LRUCache
+from magazine.utils.sanitizer import sanitize_html
 
 
 allowed_tags = bleach.ALLOWED_TAGS + ['p', 'h1', 'h2', 'h3', 'h4', 'h5', ]
 allowed_attributes = bleach.ALLOWED_ATTRIBUTES.copy()
 allowed_attributes['a'] = bleach.ALLOWED_ATTRIBUTES['a'] + ['name']
 
+# Cleaned text, keyed by the hash of the raw text. Sized (and created)
+# on first use, from MAGAZINE_SANITIZER_CACHE_SIZE.
+cleaned_text_cache = LRUCache(0)
+
+# Version token (see magazine.utils.cache_versions) replaced whenever text
+# is cleaned again without its "updated" timestamp changing, as by the
+# magazine_resanitize command.
+CLEANED_TEXT_VERSION_KEY = 'magazine_cleaned_text_version'
+
+
+def hash_text(text):
+    """
+    Returns a hash of ``text``, to tell whether it has changed since it
+    was last cleaned.
+    """
+    if text is None:
+        return None
+
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def get_cleaned_text_cache():
+    size = getattr(settings, 'MAGAZINE_SANITIZER_CACHE_SIZE', 0)
+
+    if size != cleaned_text_cache.size:
+        cleaned_text_cache.size = size
+        cleaned_text_cache.clear()
+
+    return cleaned_text_cache
+
 
 def clean_word_text(text):
-    text = strip_styles(text)
+    cache = get_cleaned_text_cache()
+
+    if cache.size > 0:
+        key = hash_text(text)
+        cleaned = cache.get(key)
+
+        if cleaned is None:
+            cleaned = clean_word_text_uncached(text)
+            cache.set(key, cleaned)
+
+        return cleaned
+
+    return clean_word_text_uncached(text)
 
-    text = bleach.clean(text,
-                        tags=allowed_tags,
-                        strip=True,
-                        attributes=allowed_attributes)
 
-    return text
+def clean_word_text_uncached(text):
+    # Drops <style> blocks, and everything not in the whitelist, in a
+    # single pass (see magazine.utils.sanitizer).
+    return sanitize_html(text, tags=allowed_tags,
+                         attributes=allowed_attributes)
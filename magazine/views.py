@@ -1,66 +1,240 @@
+import hashlib
 from datetime import date
-from django.http import Http404
+from django.db.models import Count, Max
+from django.db.models.query import prefetch_related_objects
+from django.http import Http404, HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag, urlencode
 from django.views.generic.list import ListView
 from django.views.generic import DetailView
+from magazine.archive import get_archive, get_archive_years
+from magazine.author_summaries import (SUMMARY_ARTICLES,
+                                       SUMMARY_BOOK_REVIEWS,
+                                       get_author_summary)
+from magazine.bylines import get_byline_versions, prefetch_bylines
 from magazine.models import Article, Issue, Author, BookReview
+from magazine.pagination import cursor_pagination_enabled, paginate_by_cursor
+from magazine.search import search, get_result_objects
+from magazine.utils.cache_versions import get_version
+from magazine.utils.word_cleaner import CLEANED_TEXT_VERSION_KEY
 
 
-class CurrentIssueListView(ListView):
+def _latest_update(*querysets):
+    """
+    Returns the most recent ``updated`` timestamp of the objects in
+    ``querysets``, and a list of their counts (so that deletions, which
+    don't change the most recent timestamp, are still noticed).
+    """
+    latest = None
+    counts = []
+
+    for queryset in querysets:
+        result = queryset.order_by().aggregate(latest=Max('updated'),
+                                               count=Count('pk'))
+        counts.append(result['count'])
+
+        if result['latest'] and (latest is None or
+                                 result['latest'] > latest):
+            latest = result['latest']
+
+    return latest, counts
+
+
+class ConditionalGetMixin(object):
+    """
+    Sends an ``ETag`` header, and answers conditional GET requests with a
+    304 before anything is rendered (or any hits are counted).
+
+    Views implement ``get_etag_parts()``, returning a list of everything
+    the page's content depends on. There's no ``Last-Modified``, since
+    pages also depend on things which don't have a timestamp (embargoes
+    lifting, bylines, the date and so on), so ``If-Modified-Since`` is
+    ignored.
+    """
+    def get_etag_parts(self):
+        return None
+
+    def get_etag(self):
+        parts = self.get_etag_parts()
+
+        if parts is None:
+            return None
+
+        parts = [self.__class__.__name__, self.request.user.is_staff,
+                 self.request.GET.urlencode()] + list(parts)
+        return hashlib.md5(repr(parts)).hexdigest()
+
+    def is_not_modified(self, etag):
+        if_none_match = self.request.META.get('HTTP_IF_NONE_MATCH')
+
+        if not if_none_match or not etag:
+            return False
+
+        etags = parse_etags(if_none_match)
+        return etag in etags or '*' in etags
+
+    def get(self, request, *args, **kwargs):
+        etag = self.get_etag()
+
+        if self.is_not_modified(etag):
+            response = HttpResponseNotModified()
+        else:
+            response = super(ConditionalGetMixin, self).get(request, *args,
+                                                            **kwargs)
+
+        if etag:
+            response['ETag'] = quote_etag(etag)
+
+        return response
+
+
+class MagazineObjectMixin(object):
+    """
+    Looks up the issue, author and/or object (article, book review and
+    so on) a view is about at most once per request, however many times
+    ``get_issue()``, ``get_author()`` and ``get_object()`` are called.
+
+    Views provide the lookups themselves by implementing
+    ``lookup_issue()``, ``lookup_author()`` and ``lookup_object()``.
+    """
+    def __resolve(self, name, lookup, *args):
+        resolved = self.__dict__.setdefault('_magazine_resolved', {})
+
+        if name not in resolved:
+            resolved[name] = lookup(*args)
+
+        return resolved[name]
+
+    def get_issue(self):
+        return self.__resolve('issue', self.lookup_issue)
+
+    def get_author(self):
+        return self.__resolve('author', self.lookup_author)
+
+    def get_object(self, queryset=None):
+        return self.__resolve('object', self.lookup_object, queryset)
+
+    def lookup_issue(self):
+        raise NotImplementedError
+
+    def lookup_author(self):
+        raise NotImplementedError
+
+    def lookup_object(self, queryset=None):
+        raise NotImplementedError
+
+
+class IssueConditionalGetMixin(ConditionalGetMixin):
+    def get_etag_parts(self):
+        issue = self.get_issue()
+
+        if issue is None:
+            return [None]
+
+        parts = [issue.pk, issue.number, issue.issue_date, issue.published,
+                 issue.embargoed()]
+
+        for model in (Article, BookReview):
+            # Which objects there are and when they were last updated,
+            # and their teasers and bylines, which can change without
+            # either (when text is cleaned again, or authors change).
+            rows = sorted(model._base_manager.filter(issue=issue)
+                          .order_by().values_list('pk', 'updated',
+                                                  'teaser_text'))
+            parts.append(rows)
+            parts.append(get_byline_versions(model,
+                                             [row[0] for row in rows]))
+
+        return parts
+
+
+class CurrentIssueListView(IssueConditionalGetMixin, MagazineObjectMixin,
+                           ListView):
     template_name = 'magazine/current_issue.html'
     context_object_name = 'current_articles'
 
-    def get_current_issue(self):
-        if not hasattr(self, 'current_issue'):
-            self.current_issue = Issue.current_issue()
+    def lookup_issue(self):
+        return Issue.current_issue()
 
-        return self.current_issue
+    def get_current_issue(self):
+        return self.get_issue()
 
     def get_context_data(self, **kwargs):
         context = super(CurrentIssueListView, self).get_context_data(**kwargs)
-        context['current_issue'] = self.get_current_issue()
-        context['book_reviews'] = BookReview.objects\
-            .filter(issue=self.get_current_issue())
+        context['current_issue'] = self.get_issue()
+        context['book_reviews'] = BookReview.objects.for_listing()\
+            .filter(issue=self.get_issue())
+
+        prefetch_bylines(list(context['current_articles']) +
+                         list(context['book_reviews']))
 
         return context
 
     def get_queryset(self):
-        if not self.get_current_issue():
+        if not self.get_issue():
             return Article.objects.none()
 
-        return Article.objects.filter(issue=self.get_current_issue())
+        return Article.objects.for_listing().filter(issue=self.get_issue())
 
 
 class IssueListView(ListView):
+    """
+    The issue archive, paginated by year (see ``magazine.archive``).
+    """
     template_name = 'magazine/issues.html'
-    context_object_name = 'issues'
+    context_object_name = 'years'
+    paginate_by = 10
 
-    def get_queryset(self):
-        if self.request.user.is_staff:
-            return Issue.objects.all()
+    def get_paginate_by(self, queryset):
+        # Static pages can't be told apart by query string, so the static
+        # export gets every year on one page.
+        if getattr(self.request, 'magazine_static_export', False):
+            return None
 
-        return Issue.published_objects.all()
+        return super(IssueListView, self).get_paginate_by(queryset)
 
+    def get_context_data(self, **kwargs):
+        context = super(IssueListView, self).get_context_data(**kwargs)
+        context['archive'] = [
+            {'year': year, 'issues': issues}
+            for year, issues in get_archive(context['years'],
+                                            self.request.user.is_staff)]
+        context['issues'] = [issue for year in context['archive']
+                             for issue in year['issues']]
+
+        return context
 
-class IssueView(DetailView):
+    def get_queryset(self):
+        return get_archive_years(self.request.user.is_staff)
+
+
+class IssueView(IssueConditionalGetMixin, MagazineObjectMixin, DetailView):
     template_name = 'magazine/issue_detail.html'
     context_object_name = 'issue'
 
     def get_context_data(self, **kwargs):
         context = super(IssueView, self).get_context_data(**kwargs)
-        issue = self.get_object()
-        context['articles'] = Article.objects.filter(issue=issue)
-        context['book_reviews'] = BookReview.objects.filter(issue=issue)
+        issue = self.get_issue()
+        context['articles'] = Article.objects.for_listing()\
+            .filter(issue=issue)
+        context['book_reviews'] = BookReview.objects.for_listing()\
+            .filter(issue=issue)
+
+        prefetch_bylines(list(context['articles']) +
+                         list(context['book_reviews']))
 
         return context
 
     def get_queryset(self):
         if self.request.user.is_staff:
-            return Issue.objects.all()
+            return Issue.objects.with_embargo_status()
 
-        return Issue.published_objects.all()
+        return Issue.published_objects.with_embargo_status()
 
-    def get_object(self, queryset=None):
-        if not queryset:
+    def lookup_issue(self):
+        return self.get_object()
+
+    def lookup_object(self, queryset=None):
+        if queryset is None:
             queryset = self.get_queryset()
 
         try:
@@ -69,72 +243,138 @@ class IssueView(DetailView):
             raise Http404
 
 
-class ArticleView(DetailView):
+class ArticleView(ConditionalGetMixin, MagazineObjectMixin, DetailView):
+    model = Article
     template_name = 'magazine/article_detail.html'
     context_object_name = 'article'
 
     def get_issue_number(self):
         return int(self.kwargs['number'])
 
+    def get(self, request, *args, **kwargs):
+        response = super(ArticleView, self).get(request, *args, **kwargs)
+
+        # Pages rendered for the static export aren't visits.
+        if response.status_code == 200 and \
+                not getattr(request, 'magazine_static_export', False):
+            self.get_object().mark_visited()
+
+        return response
+
+    def get_etag_parts(self):
+        obj = self.get_object()
+        authors = [(author.pk, unicode(author), author.details,
+                    author.indexable) for author in obj.authors.all()]
+
+        # Cleaning the text again (see the magazine_resanitize command)
+        # doesn't change the updated timestamp, but does replace the
+        # cleaned text version, so there's no need to hash the text.
+        return [obj.pk, obj.updated, obj.text_hash, obj.issue.number,
+                obj.issue.embargoed(), authors, obj.sanitization_pending,
+                get_version(CLEANED_TEXT_VERSION_KEY), obj.teaser()]
+
     def get_context_data(self, **kwargs):
         context = super(ArticleView, self).get_context_data(**kwargs)
-        context['issue'] = Issue.objects.get(number=self.get_issue_number())
+        context['issue'] = self.get_issue()
         return context
 
-    def get_queryset(self):
-        try:
-            issue = Issue.objects.get(number=self.get_issue_number())
+    def lookup_issue(self):
+        return self.get_object().issue
 
-            if not issue.is_published() and not self.request.user.is_staff:
-                return Article.objects.none()
-
-            return Article.objects.filter(issue=issue)
-        except Issue.DoesNotExist:
-            return Article.objects.none()
-
-    def get_object(self, queryset=None):
-        if not queryset:
+    def lookup_object(self, queryset=None):
+        if queryset is None:
             queryset = self.get_queryset()
 
+        # The default manager selects the issue too, so this is a single
+        # query.
         try:
-            obj = queryset.get(pk=int(self.kwargs['pk']))
-            obj.mark_visited()
-            return obj
-        except Article.DoesNotExist:
+            obj = queryset.get(pk=int(self.kwargs['pk']),
+                               issue__number=self.get_issue_number())
+        except self.model.DoesNotExist:
             raise Http404
 
+        if not obj.issue.is_published() and not self.request.user.is_staff:
+            raise Http404
+
+        # Both the byline and "about the authors" need the authors.
+        prefetch_related_objects([obj], ['authors'])
+
+        return obj
+
+
+class AuthorConditionalGetMixin(ConditionalGetMixin):
+    def __get_latest_update(self):
+        if not hasattr(self, '_latest_update'):
+            author = self.get_author()
+            self._latest_update = _latest_update(author.article_set.all(),
+                                                 author.bookreview_set.all())
+
+        return self._latest_update
+
+    def get_etag_parts(self):
+        author = self.get_author()
 
-class AuthorDetailView(DetailView):
+        # Articles are published at the start of the day, so the date
+        # matters too.
+        return [author.pk, unicode(author), author.details, date.today()] + \
+            list(self.__get_latest_update())
+
+
+class AuthorDetailView(AuthorConditionalGetMixin, MagazineObjectMixin,
+                       DetailView):
     template_name = 'magazine/author_detail.html'
     context_object_name = 'author'
 
     def get_context_data(self, **kwargs):
         context = super(AuthorDetailView, self).get_context_data(**kwargs)
-        author = self.get_object()
-        qs = author.article_set.order_by('issue')
+        author = self.get_author()
+
+        if self.request.user.is_staff:
+            # Staff see unpublished articles too, which aren't in the
+            # cached summary.
+            qs = author.article_set.for_listing().order_by('issue')
+            context['num_articles'] = qs.count()
+            context['articles'] = qs[:SUMMARY_ARTICLES]
 
-        if not self.request.user.is_staff:
-            qs = qs.filter(issue__published=True,
-                           issue__issue_date__lte=date.today())
+            qs_reviews = author.bookreview_set.for_listing()\
+                .order_by('issue')
+            context['num_book_reviews'] = qs_reviews.count()
+            context['book_reviews'] = qs_reviews[:SUMMARY_BOOK_REVIEWS]
 
-        context['num_articles'] = qs.count()
-        context['articles'] = qs[:4]
+            return context
 
-        qs_reviews = author.bookreview_set.order_by('issue')
-        if not self.request.user.is_staff:
-            qs_reviews = qs_reviews.filter(issue__published=True,
-                                           issue__issue_date__lte=date.today())
+        summary = self.get_summary()
 
-        context['num_book_reviews'] = qs_reviews.count()
-        context['book_reviews'] = qs_reviews[:10]
+        for name in ('articles', 'book_reviews'):
+            context['num_' + name] = summary['num_' + name]
+            context[name] = summary[name]
 
         return context
 
+    def get_summary(self):
+        if not hasattr(self, '_summary'):
+            self._summary = get_author_summary(self.get_author())
+
+        return self._summary
+
+    def get_etag_parts(self):
+        if self.request.user.is_staff:
+            return super(AuthorDetailView, self).get_etag_parts()
+
+        # The summary's version changes whenever anything in it could
+        # have, and it's for today, so there's nothing else to check.
+        author = self.get_author()
+        return [author.pk, unicode(author), author.details,
+                self.get_summary()['version'], date.today()]
+
     def get_queryset(self):
         return Author.objects.filter(indexable=True)
 
-    def get_object(self, queryset=None):
-        if not queryset:
+    def lookup_author(self):
+        return self.get_object()
+
+    def lookup_object(self, queryset=None):
+        if queryset is None:
             queryset = self.get_queryset()
 
         try:
@@ -143,36 +383,56 @@ class AuthorDetailView(DetailView):
             raise Http404
 
 
-class AuthorListView(ListView):
+class CursorPaginationMixin(object):
+    """
+    Paginates by cursor rather than by page number (see
+    ``magazine.pagination``) if ``MAGAZINE_CURSOR_PAGINATION`` is
+    ``True``. ``cursor_ordering`` should order the queryset the same way
+    as it's usually ordered, ending with a unique field.
+    """
+    cursor_ordering = None
+
+    def paginate_queryset(self, queryset, page_size):
+        if not cursor_pagination_enabled():
+            return super(CursorPaginationMixin, self).paginate_queryset(
+                queryset, page_size)
+
+        page = paginate_by_cursor(queryset, self.cursor_ordering, page_size,
+                                  after=self.request.GET.get('after'),
+                                  before=self.request.GET.get('before'))
+
+        return (None, page, page.object_list, page.has_other_pages())
+
+
+class AuthorListView(CursorPaginationMixin, ListView):
     template_name = 'magazine/authors.html'
     context_object_name = 'authors'
     paginate_by = 20
+    cursor_ordering = ('-num_articles', 'pk')
 
     def get_queryset(self):
-        return Author.objects.order_by('-num_articles',)\
+        return Author.objects.order_by(*self.cursor_ordering)\
             .filter(num_articles__gt=0, indexable=True)
 
 
 class AuthorListViewAlphabetised(AuthorListView):
-    def get_queryset(self):
-        return Author.objects.order_by('surname', 'forename')\
-            .filter(num_articles__gt=0, indexable=True)
+    cursor_ordering = ('surname', 'forename', 'pk')
 
 
-class AuthorArticlesView(ListView):
+class AuthorArticlesView(AuthorConditionalGetMixin, MagazineObjectMixin,
+                         CursorPaginationMixin, ListView):
     template_name = 'magazine/author_articles.html'
     context_object_name = 'articles'
     paginate_by = 10
+    # Ordering by issue orders by the issue's default ordering.
+    cursor_ordering = ('-issue__issue_date', 'pk')
 
-    def get_author(self):
-        if not hasattr(self, 'author'):
-            try:
-                self.author = Author.objects.get(pk=int(self.kwargs['pk']),
-                                                 indexable=True)
-            except Author.DoesNotExist:
-                raise Http404
-
-        return self.author
+    def lookup_author(self):
+        try:
+            return Author.objects.get(pk=int(self.kwargs['pk']),
+                                      indexable=True)
+        except Author.DoesNotExist:
+            raise Http404
 
     def get_context_data(self, **kwargs):
         context = super(AuthorArticlesView, self).get_context_data(**kwargs)
@@ -180,45 +440,46 @@ class AuthorArticlesView(ListView):
         return context
 
     def get_queryset(self):
-        return self.get_author().article_set\
+        return self.get_author().article_set.for_listing()\
             .filter(issue__published=True,
                     issue__issue_date__lte=date.today()).order_by('issue')
 
 
-class AuthorBookReviewsView(ListView):
+class AuthorBookReviewsView(AuthorArticlesView):
     template_name = 'magazine/author_book_reviews.html'
     context_object_name = 'book_reviews'
-    paginate_by = 10
-
-    def get_author(self):
-        if not hasattr(self, 'author'):
-            self.author = Author.objects.get(pk=int(self.kwargs['pk']),
-                                             indexable=True)
-
-        return self.author
-
-    def get_context_data(self, **kwargs):
-        context = super(AuthorBookReviewsView, self).get_context_data(**kwargs)
-        context['author'] = self.get_author()
-        return context
 
     def get_queryset(self):
-        return self.get_author().bookreview_set\
+        return self.get_author().bookreview_set.for_listing()\
             .filter(issue__published=True,
                     issue__issue_date__lte=date.today()).order_by('issue')
 
 
 class BookReviewView(ArticleView):
+    model = BookReview
     template_name = 'magazine/bookreview_detail.html'
     context_object_name = 'bookreview'
 
-    def get_queryset(self):
-        try:
-            issue = Issue.objects.get(number=self.get_issue_number())
 
-            if not issue.is_published() and not self.request.user.is_staff:
-                return BookReview.objects.none()
+class SearchView(ListView):
+    template_name = 'magazine/search.html'
+    context_object_name = 'results'
+    paginate_by = 10
 
-            return BookReview.objects.filter(issue=issue)
-        except Issue.DoesNotExist:
-            return BookReview.objects.none()
+    def get_query(self):
+        return self.request.GET.get('q', u'').strip()
+
+    def get_context_data(self, **kwargs):
+        context = super(SearchView, self).get_context_data(**kwargs)
+        context['query'] = self.get_query()
+        context['page_query'] = urlencode({'q': self.get_query()}) + '&'
+
+        # Only fetch the articles and book reviews on this page.
+        context['results'] = get_result_objects(context['results'])
+        prefetch_bylines(context['results'])
+
+        return context
+
+    def get_queryset(self):
+        return search(self.get_query(),
+                      include_unpublished=self.request.user.is_staff)